@@ -2,7 +2,14 @@ from blacksheep import json, Request
 from blacksheep.server.controllers import APIController, get, post, put, delete
 from services.autumn_service import AutumnService
 from services.supabase_service import SupabaseService
+from services.credit_service import CreditService
+from services.autumn_webhook_service import AutumnWebhookService
 from utils.env import settings
+from utils.webhook_signature import verify_webhook_signature
+import asyncio
+import hashlib
+import uuid
+import orjson
 import json as pyjson
 
 # Map product IDs to credit amounts
@@ -12,9 +19,17 @@ PRODUCT_CREDITS = {
 }
 
 class Autumn(APIController):
-    def __init__(self, autumn_service: AutumnService, supabase_service: SupabaseService):
+    def __init__(
+        self,
+        autumn_service: AutumnService,
+        supabase_service: SupabaseService,
+        credit_service: CreditService,
+        autumn_webhook_service: AutumnWebhookService,
+    ):
         self.autumn_service = autumn_service
         self.supabase_service = supabase_service
+        self.credit_service = credit_service
+        self.autumn_webhook_service = autumn_webhook_service
 
     async def _get_customer_id(self, request: Request) -> str:
         """Extract customer_id from request (auth header, session, etc.)"""
@@ -34,10 +49,36 @@ class Autumn(APIController):
     async def autumn_webhook(self, request: Request):
         """
         Handle Autumn payment webhooks.
-        Called by Autumn when a payment succeeds.
+        Called by Autumn when a payment succeeds. The event is verified and queued, credits are
+        added by AutumnWebhookService in the background; redeliveries of an event are acknowledged
+        without being queued again.
         """
         try:
-            body = await request.json()
+            raw_body = await request.read() or b""
+            headers = {
+                name: (request.get_first_header(name.encode()) or b"").decode()
+                for name in ("svix-id", "svix-timestamp", "svix-signature")
+            }
+
+            if settings.AUTUMN_WEBHOOK_SECRET:
+                if not verify_webhook_signature(
+                    settings.AUTUMN_WEBHOOK_SECRET,
+                    headers["svix-id"],
+                    headers["svix-timestamp"],
+                    headers["svix-signature"],
+                    raw_body,
+                    settings.AUTUMN_WEBHOOK_TOLERANCE,
+                ):
+                    print("Rejected Autumn webhook with an invalid signature")
+                    return json({"error": "Invalid signature"}, status=401)
+            elif settings.AUTUMN_WEBHOOK_ALLOW_UNSIGNED:
+                print("AUTUMN_WEBHOOK_SECRET is not set, accepting an unsigned webhook (AUTUMN_WEBHOOK_ALLOW_UNSIGNED)")
+            else:
+                # webhooks grant credits, never take them unverified; 503 so Autumn redelivers once it's configured
+                print("AUTUMN_WEBHOOK_SECRET is not set, rejecting the webhook")
+                return json({"error": "Webhook verification is not configured"}, status=503)
+
+            body = orjson.loads(raw_body)
             print(f"Autumn webhook received: {body}")
             
             # Extract relevant data from webhook payload
@@ -54,24 +95,34 @@ class Autumn(APIController):
                 print(f"Missing customer_id or product_id in webhook")
                 return json({"error": "Missing required fields"}, status=400)
             
+            # customer ids are Supabase user ids, anything else would fail the ledger's uuid cast
+            try:
+                customer_id = str(uuid.UUID(customer_id))
+            except (TypeError, ValueError, AttributeError):
+                print(f"Invalid customer_id in webhook: {customer_id!r}")
+                return json({"error": "Invalid customer_id"}, status=400)
+            
             # Get credit amount for this product
             credits = PRODUCT_CREDITS.get(product_id, 0)
             if credits == 0:
                 print(f"Unknown product_id: {product_id}")
                 return json({"error": "Unknown product"}, status=400)
             
-            # Update user's credits
-            self.supabase_service.add_user_credits(customer_id, credits)
+            # Retries of a delivery keep its svix-id; fall back to the payload's id, then its content
+            event_id = headers["svix-id"] or body.get("id") or hashlib.sha256(raw_body).hexdigest()
+            queued = await self.autumn_webhook_service.ingest(event_id, customer_id, product_id, credits)
+            if not queued:
+                print(f"Duplicate Autumn webhook {event_id} for user {customer_id}, already accepted")
+                return json({"status": "duplicate"}, status=200)
             
-            # Update user's plan to paid
-            self.supabase_service.update_user_plan(customer_id, "paid")
+            # the customer's products changed upstream, drop cached customer/entitlement reads
+            await self.autumn_service.invalidate(customer_id)
             
-            # Log the transaction
-            self.supabase_service.log_credit_purchase(customer_id, credits, product_id)
-            
-            print(f"Successfully processed payment for user {customer_id}: +{credits} credits")
-            return json({"status": "success"}, status=200)
+            print(f"Accepted payment {event_id} for user {customer_id}: +{credits} credits")
+            return json({"status": "accepted"}, status=200)
             
+        except orjson.JSONDecodeError:
+            return json({"error": "Invalid JSON"}, status=400)
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -85,8 +136,8 @@ class Autumn(APIController):
             
             product_id = body.get("product_id", "")
             
-            # Get authenticated user ID from middleware
-            customer_id = request.scope.get("user_id")
+            # Billing route: also check the token with GoTrue so revoked sessions can't check out
+            customer_id = await self.supabase_service.get_user_id_from_request(request, verify_remote=True)
             if not customer_id:
                 return json({"error": "Unauthorized"}, status=401)
             
@@ -104,6 +155,8 @@ class Autumn(APIController):
                 }
             )
             print(f"Autumn response: {result}")
+            # the checkout may attach the product right away, cached customer reads would miss it
+            await self.autumn_service.invalidate(customer_id)
             return json(result["data"], status=result["status"])
         except Exception as e:
             import traceback
@@ -117,8 +170,8 @@ class Autumn(APIController):
         VERIFIES purchase with Autumn API before adding credits.
         """
         try:
-            # Get authenticated user ID
-            user_id = request.scope.get("user_id")
+            # Get authenticated user ID (billing route, so revocation is checked with GoTrue)
+            user_id = await self.supabase_service.get_user_id_from_request(request, verify_remote=True)
             if not user_id:
                 return json({"error": "Unauthorized"}, status=401)
             
@@ -154,18 +207,13 @@ class Autumn(APIController):
                     "verified": False
                 }, status=402)
             
-            # Add credits to Supabase
-            self.supabase_service.add_user_credits(user_id, credits)
-            
-            # Update user's plan to paid
-            self.supabase_service.update_user_plan(user_id, "paid")
-            
-            # Log the transaction
-            self.supabase_service.log_credit_purchase(user_id, credits, product_id)
-            
-            # Get updated balance
-            user_row = self.supabase_service.get_user_row(user_id)
-            new_balance = user_row.data.get("credits", 0) if user_row and user_row.data else 0
+            # Add credits, set the plan to paid and log the transaction; the RPC returns the new balance
+            # supabase-py is synchronous, keep the event loop free while the RPC runs
+            new_balance = await asyncio.to_thread(self.supabase_service.purchase_credits, user_id, credits)
+            if new_balance is None:
+                return json({"error": "Failed to add credits"}, status=500)
+            # the purchase went straight to Postgres, the next debit reloads the Redis mirror
+            await self.credit_service.invalidate(user_id)
             
             print(f"Successfully added {credits} credits for user {user_id}. New balance: {new_balance}")
             
@@ -1,24 +1,78 @@
-from blacksheep import Response, FromFiles, json
-from blacksheep.server.controllers import APIController, put
-from services.storage_service import StorageService
+import uuid
+from blacksheep import Request, json
+from blacksheep.exceptions import BadRequestFormat
+from blacksheep.server.controllers import APIController, post, put
+from services.storage_service import StorageService, UPLOADS_PREFIX
+from services.supabase_service import SupabaseService
+from utils.env import settings
+
+# content types clients may upload through signed URLs, with the object name extension
+UPLOAD_CONTENT_TYPES = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "video/mp4": ".mp4",
+    "video/quicktime": ".mov",
+    "video/webm": ".webm",
+}
 
 class Files(APIController):
-    def __init__(self, storage_service: StorageService):
+    def __init__(self, storage_service: StorageService, supabase_service: SupabaseService):
         self.storage_service = storage_service
+        self.supabase_service = supabase_service
+
+    @post("/upload-url")
+    async def create_upload_url(self, request: Request):
+        """
+        Issues a signed URL the client PUTs an image or video to, straight to GCS.
+        Input: JSON body with "content_type"
+        Return: upload_url, the headers to send with the PUT, and the gs:// uri to pass to
+        /api/jobs/video, /api/jobs/video/merge or /api/gemini/extract-context afterwards
+        """
+        user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
+        if not user_id:
+            return json({"error": "Unauthorized"}, status=401)
+
+        try:
+            body = await request.json()
+        except BadRequestFormat:
+            return json({"error": "Invalid JSON"}, status=400)
+        content_type = body.get("content_type") if isinstance(body, dict) else None
+        if content_type not in UPLOAD_CONTENT_TYPES:
+            return json({"error": f"content_type must be one of {', '.join(UPLOAD_CONTENT_TYPES)}"}, status=400)
+
+        max_bytes = settings.UPLOAD_MAX_IMAGE_BYTES if content_type.startswith("image/") else settings.UPLOAD_MAX_VIDEO_BYTES
+        item_name = f"{UPLOADS_PREFIX}{user_id}/{uuid.uuid4()}{UPLOAD_CONTENT_TYPES[content_type]}"
+        upload_url, headers = await self.storage_service.generate_upload_url(item_name, content_type, max_bytes)
+
+        return json({
+            "upload_url": upload_url,
+            "method": "PUT",
+            "headers": headers,
+            "gcs_uri": f"gs://{self.storage_service.bucket.name}/{item_name}",
+            "max_bytes": max_bytes,
+            "expires_in": settings.UPLOAD_URL_TTL,
+        })
 
     @put("/video/{item_name}")
-    async def update_video(self, bucket_name: str, item_name: str, files: FromFiles):
+    async def update_video(self, request: Request, item_name: str):
         """
-        Uploads a video to a specific bucket and item name.
-        Input: video object (as form data or blob)
-        Return: status codes
+        Uploads a video under the user's folder with the given item name.
+        Input: raw video bytes as the request body (streamed to storage, never held in memory)
+        Return: public URL of the video
         """
+        user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
+        if not user_id:
+            return json({"error": "Unauthorized"}, status=401)
 
-        if not files.value:
-            return json({"error": "No file provided"}, status=400)
+        if not item_name or item_name.startswith(".") or "/" in item_name:
+            return json({"error": "Invalid item name"}, status=400)
 
-        video_file = files.value[0]
-        
-        await self.storage_service.upload_file(bucket_name, item_name, video_file.data)
+        content_type = request.get_first_header(b"content-type")
+        video_url = await self.storage_service.upload_file(
+            f"videos/{user_id}/{item_name}",
+            request.stream(),
+            content_type=content_type.decode() if content_type else "video/mp4"
+        )
         
-        return Response(200)
+        return json({"video_url": video_url})
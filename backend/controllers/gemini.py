@@ -4,23 +4,49 @@ import json as pyjson
 
 from services.vertex_service import VertexService
 from services.supabase_service import SupabaseService
+from services.storage_service import StorageService
+from services.credit_service import CreditService
+from utils.image_normalizer import sniff_mime_type
 
 class Gemini(APIController):
     
-    def __init__(self, vertex_service: VertexService, supabase_service: SupabaseService):
+    def __init__(self, vertex_service: VertexService, supabase_service: SupabaseService, storage_service: StorageService, credit_service: CreditService):
         self.vertex_service = vertex_service
         self.supabase_service = supabase_service
+        self.storage_service = storage_service
+        self.credit_service = credit_service
 
     @post("/extract-context")
     async def extract_context(self, request: Request):
+        """
+        Input: multipart video file, or JSON {"video_uri": "gs://..."} for a video uploaded
+        through POST /api/files/upload-url (Gemini reads it from the bucket)
+        """
         try:
-            # Parse multipart form data manually
-            files = await request.files()
-            
-            if not files:
-                return json({"error": "No video file provided"}, status=400)
-            
-            video_data = files[0]
+            video_data = None
+            video_uri = None
+            mime_type = "video/mp4"
+            if request.declares_json():
+                user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
+                if not user_id:
+                    return json({"error": "Unauthorized"}, status=401)
+
+                video_uri = (await request.json()).get("video_uri") or ""
+                item_name = self.storage_service.user_object_name(video_uri, user_id)
+                if not item_name:
+                    return json({"error": "Invalid video reference"}, status=400)
+                blob = await self.storage_service.get_file_info(item_name)
+                if blob is None:
+                    return json({"error": "Uploaded video not found"}, status=400)
+                mime_type = blob.content_type or mime_type
+            else:
+                # Parse multipart form data manually
+                files = await request.files()
+                
+                if not files:
+                    return json({"error": "No video file provided"}, status=400)
+                
+                video_data = files[0]
             
             
             prompt = (
@@ -37,9 +63,11 @@ class Gemini(APIController):
                 "If information is missing, use empty strings.\n"
             )
             #use vertex service to analyze video
-            res = self.vertex_service.analyze_video_content(
+            res = await self.vertex_service.analyze_video_content(
                 prompt=prompt,
-                video_data=video_data
+                video_data=video_data,
+                video_uri=video_uri,
+                mime_type=mime_type
             )
 
             raw = res.text or res.candidates[0].content.parts[0].text
@@ -68,9 +96,10 @@ class Gemini(APIController):
 
     @post("/image")
     async def generate_image(self, request: Request):
+        reservation_id = None
         try:
             # get user token
-            user_id = request.scope.get("user_id") or self.supabase_service.get_user_id_from_request(request)
+            user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
             if not user_id:
                 return json({"error": "Unauthorized"}, status=401)
 
@@ -82,13 +111,13 @@ class Gemini(APIController):
             image_data = files[0]
 
             # Check and deduct credits BEFORE generating
-            success, error = self.supabase_service.do_transaction(
+            reservation_id, error = await self.credit_service.reserve(
                 user_id=user_id,
                 transaction_type="image_gen",
                 credit_usage=1 # TODO: adjust number later
             )
             
-            if not success:
+            if not reservation_id:
                 if error == "insufficient_credits":
                     return json({"error": "You don't have enough credits. Please purchase more credits to continue."}, status=402)
                 return json({"error": "Transaction failed"}, status=500)
@@ -97,13 +126,16 @@ class Gemini(APIController):
 
             res = await self.vertex_service.generate_image_content(
                 prompt=prompt,
-                image=image_data.data
+                image=image_data.data,
+                mime_type=sniff_mime_type(image_data.data)
             )
 
             return json({"image_bytes": res})
             
         except Exception as e:
             print(f"ERROR in generate_image: {e}")
+            if reservation_id:
+                await self.credit_service.refund(reservation_id)
             import traceback
             traceback.print_exc()
             return json({"error": str(e)}, status=500)
\ No newline at end of file
@@ -1,56 +1,96 @@
+import asyncio
 from blacksheep import json, Response, Request, FromForm
+from blacksheep.exceptions import BadRequestFormat
 from blacksheep.server.controllers import APIController, post, get
+from blacksheep.server.sse import ServerSentEvent, ServerSentEventsResponse
 from services.supabase_service import SupabaseService
 from models.job import JobStatus, VideoJobRequest, VideoGenerationInput
 from services.job_service import JobService
+from services.job_events_service import JobEventsService
 from services.video_merge_service import VideoMergeService
+from services.storage_service import StorageService
+from services.credit_service import CreditService
+from services.merge_scheduler import MergeQueueFull
+
+# how often an idle SSE stream sends a keep-alive comment (and checks for a disconnected client or a missed transition)
+SSE_KEEPALIVE_SECONDS = 15
+# how often a pending merge request checks whether its client is still connected
+MERGE_DISCONNECT_CHECK_SECONDS = 1
 
 class Jobs(APIController):
-    def __init__(self, job_service: JobService, supabase_service: SupabaseService, video_merge_service: VideoMergeService):
+    def __init__(self, job_service: JobService, supabase_service: SupabaseService, video_merge_service: VideoMergeService, job_events_service: JobEventsService, storage_service: StorageService, credit_service: CreditService):
         self.job_service = job_service
         self.supabase_service = supabase_service
         self.video_merge_service = video_merge_service
+        self.job_events_service = job_events_service
+        self.storage_service = storage_service
+        self.credit_service = credit_service
 
     @post("/video")
     async def add_video_job(self, request: Request, input: FromForm[VideoGenerationInput]):
         """
         Starts a video generation job.
-        Input: starting image (file), context, any other user-prompt
+        Input: starting image (file, or starting_image_uri / ending_image_uri gs:// references from
+        POST /api/files/upload-url), context, any other user-prompt
         Return: jobId
         """
-        user_id = request.scope.get("user_id") or self.supabase_service.get_user_id_from_request(request)
+        user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
         if not user_id:
             return json({"error": "Unauthorized"}, status=401)
 
-        # FromForm parses the body, so request.files should be populated if multipart
-        # request.files is a method that returns the list of files
-        files = await request.files()
-        
-        if not files:
-            return json({"error": "No image file provided"}, status=400)
+        if input.value.starting_image_uri:
+            # uploaded straight to GCS, only the references go through here
+            for uri in (input.value.starting_image_uri, input.value.ending_image_uri):
+                if not uri:
+                    continue
+                item_name = self.storage_service.user_object_name(uri, user_id)
+                if not item_name:
+                    return json({"error": f"Invalid image reference {uri}"}, status=400)
+                if await self.storage_service.get_generation(item_name) is None:
+                    return json({"error": f"Uploaded image {uri} not found"}, status=400)
 
-        image_file = files[0]
-        ending_image_file = files[1] if len(files) > 1 else None
-        
-        data = VideoJobRequest(
-            starting_image=image_file.data,
-            ending_image=ending_image_file.data if ending_image_file else None,
-            global_context=input.value.global_context,
-            custom_prompt=input.value.custom_prompt
-        )
+            data = VideoJobRequest(
+                starting_image=None,
+                starting_image_uri=input.value.starting_image_uri,
+                ending_image_uri=input.value.ending_image_uri,
+                global_context=input.value.global_context,
+                custom_prompt=input.value.custom_prompt
+            )
+        else:
+            # FromForm parses the body, so request.files should be populated if multipart
+            # request.files is a method that returns the list of files
+            files = await request.files()
+            
+            if not files:
+                return json({"error": "No image file provided"}, status=400)
+
+            image_file = files[0]
+            ending_image_file = files[1] if len(files) > 1 else None
+            
+            data = VideoJobRequest(
+                starting_image=image_file.data,
+                ending_image=ending_image_file.data if ending_image_file else None,
+                global_context=input.value.global_context,
+                custom_prompt=input.value.custom_prompt
+            )
 
-        success, error = self.supabase_service.do_transaction(
+        reservation_id, error = await self.credit_service.reserve(
             user_id=user_id,
             transaction_type="video_gen",
             credit_usage=10 # TODO: adjust number later
         )
         
-        if not success:
+        if not reservation_id:
             if error == "insufficient_credits":
                 return json({"error": "You don't have enough credits. Please purchase more credits to continue."}, status=402)
             return json({"error": "Transaction failed"}, status=500)
         
-        job_id = await self.job_service.create_video_job(data)
+        data.reservation_id = reservation_id
+        try:
+            job_id = await self.job_service.create_video_job(data)
+        except Exception:
+            await self.credit_service.refund(reservation_id)
+            raise
         return json({"job_id": job_id})
 
     @get("/video/{job_id}")
@@ -64,30 +104,69 @@ class Jobs(APIController):
             return json({"error": "Job not found"}, status=404)
 
         if jobStatus.status == "error":
-            return json({
-                "status": "error",
-                "error_message": jobStatus.error
-            }, status=500)
+            return json(jobStatus.to_dict(), status=500)
         
         if jobStatus.status == "waiting":
-            return json({
-                "status": "waiting",
-                "job_start_time": jobStatus.job_start_time.isoformat()
-            }, status=202)
+            return json(jobStatus.to_dict(), status=202)
         
-        return json({
-            "status": jobStatus.status,
-            "job_start_time": jobStatus.job_start_time.isoformat(),
-            "job_end_time": jobStatus.job_end_time.isoformat() if jobStatus.job_end_time else None,
-            "video_url": jobStatus.video_url,
-            "metadata": jobStatus.metadata
-        }, status=200)
+        return json(jobStatus.to_dict(), status=200)
+
+    @get("/video/{job_id}/events")
+    async def video_job_events(self, request: Request, job_id: str):
+        """
+        Server-Sent Events stream of a job's status.
+        Sends the current status right away, then every transition until the job is done or failed
+        (the stream also ends if the job record expires).
+        Event data has the same shape as GET /video/{job_id}, the event name is the status.
+        """
+        if not await self.job_service.get_video_job_status(job_id):
+            return json({"error": "Job not found"}, status=404)
+
+        async def events():
+            async with self.job_events_service.watch(job_id) as queue:
+                # read the status after subscribing so a transition in between isn't missed
+                job_status = await self.job_service.get_video_job_status(job_id)
+                if not job_status:
+                    return
+                event = job_status.to_dict()
+                yield ServerSentEvent(event, event=event["status"])
+
+                while event["status"] == "waiting":
+                    try:
+                        event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected():
+                            return
+                        # a transition published while the subscriber was reconnecting is lost and
+                        # an expired record publishes nothing, so check the stored status as well
+                        job_status = await self.job_service.get_video_job_status(job_id)
+                        if not job_status:
+                            return
+                        if job_status.status == "waiting":
+                            yield ServerSentEvent(None, comment="keep-alive")
+                            continue
+                        event = job_status.to_dict()
+                    yield ServerSentEvent(event, event=event["status"])
+                if event["status"] == "done":
+                    await self.job_service.mark_url_served(job_id)
+
+        return ServerSentEventsResponse(events)
+
+    @get("/stage-stats")
+    async def get_stage_stats(self, request: Request):
+        """p50/p95 per job stage over recent jobs, to see where video generation time goes (operators only)"""
+        user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
+        if not user_id:
+            return json({"error": "Unauthorized"}, status=401)
+        if not self.supabase_service.is_operator(user_id):
+            return json({"error": "Forbidden"}, status=403)
+        return json(await self.job_service.stage_stats())
 
     # DEV MOCK ENDPOINTS
     @post("/video/mock")
     async def add_video_job_mock(self, request: Request, input: FromForm[VideoGenerationInput]):
 
-        user_id = request.scope.get("user_id") or self.supabase_service.get_user_id_from_request(request)
+        user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
         if not user_id:
             return json({"error": "Unauthorized"}, status=401)
         
@@ -105,13 +184,13 @@ class Jobs(APIController):
             custom_prompt=input.value.custom_prompt
         )
 
-        success, error = self.supabase_service.do_transaction(
+        reservation_id, error = await self.credit_service.reserve(
             user_id=user_id,
             transaction_type="video_gen",
             credit_usage=10 # TODO: adjust number later
         )
         
-        if not success:
+        if not reservation_id:
             if error == "insufficient_credits":
                 return json({"error": "You don't have enough credits. Please purchase more credits to continue."}, status=402)
             return json({"error": "Transaction failed"}, status=500)
@@ -140,26 +219,48 @@ class Jobs(APIController):
     async def merge_videos(self, request: Request):
         """
         Merges multiple videos from URLs into a single video.
-        Input: JSON body with "video_urls" array (ordered from root to end frame)
+        Input: JSON body with "video_urls" array (ordered from root to end frame), entries may be
+        gs:// references to the user's uploads
         Return: merged video URL
         """     
-        user_id = request.scope.get("user_id") or self.supabase_service.get_user_id_from_request(request)
+        user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
         if not user_id:
             return json({"error": "Unauthorized"}, status=401)
         
         try:
-            body = await request.json()
-            video_urls = body.get("video_urls", [])
+            try:
+                body = await request.json()
+            except BadRequestFormat:
+                return json({"error": "Invalid JSON"}, status=400)
+            video_urls = body.get("video_urls", []) if isinstance(body, dict) else None
             
             if not video_urls or not isinstance(video_urls, list):
                 return json({"error": "video_urls array is required"}, status=400)
             
             if len(video_urls) < 2:
                 return json({"error": "At least 2 video URLs are required for merging"}, status=400)
+
+            if not all(isinstance(url, str) and url for url in video_urls):
+                return json({"error": "video_urls entries must be non-empty strings"}, status=400)
+
+            for url in video_urls:
+                if url.startswith("gs://") and not self.storage_service.user_object_name(url, user_id):
+                    return json({"error": f"Invalid video reference {url}"}, status=400)
             
-            merged_video_url = await self.video_merge_service.merge_videos(video_urls, user_id)
+            merge = asyncio.create_task(self.video_merge_service.merge_videos(video_urls, user_id))
+            # a queued merge can wait a while, give up on it if the client goes away
+            while not merge.done():
+                await asyncio.wait({merge}, timeout=MERGE_DISCONNECT_CHECK_SECONDS)
+                if not merge.done() and await request.is_disconnected():
+                    merge.cancel()
+                    return Response(499)
+            merged_video_url = merge.result()
             
             return json({"video_url": merged_video_url})
+        except MergeQueueFull as e:
+            response = json({"error": str(e)}, status=429)
+            response.add_header(b"Retry-After", str(e.retry_after).encode())
+            return response
         except Exception as e:
             import traceback
             traceback.print_exc()
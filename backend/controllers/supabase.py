@@ -1,47 +1,76 @@
+import asyncio
 from blacksheep import json, Request
 from blacksheep.server.controllers import APIController, get
 
 from services.supabase_service import SupabaseService
+from services.profile_cache_service import ProfileCacheService
+
+TRANSACTION_PAGE_DEFAULT = 20
+TRANSACTION_PAGE_MAX = 100
 
 class Supabase(APIController):
     
-    def __init__(self, supabase_service: SupabaseService):
+    def __init__(self, supabase_service: SupabaseService, profile_cache_service: ProfileCacheService):
         self.supabase_service = supabase_service
+        self.profile_cache_service = profile_cache_service
 
     @get("/user")
     async def get_user_row(self, request: Request):
         try:
-            user_id = request.scope.get("user_id") or self.supabase_service.get_user_id_from_request(request)
+            user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
             if not user_id:
                 return json({"error": "Unauthorized"}, status=401)
             
-            res = self.supabase_service.get_user_row(user_id=user_id)
+            profile = await self.profile_cache_service.get(user_id)
 
-            if not res or not res.data:
+            if not profile:
                 return json({"error": "Row not found"}, status=404)
 
-            return json(res.data)
+            return json(profile)
         
         except Exception as e:
             print("supabase error:", e) # log it cuz why not
             return json({"error": str(e)}, status=500)
+
+    @get("/user/cache-stats")
+    async def get_profile_cache_stats(self, request: Request):
+        """Hit/miss counters of this instance's profile cache, for tuning PROFILE_CACHE_* (operators only)"""
+        user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
+        if not user_id:
+            return json({"error": "Unauthorized"}, status=401)
+        if not self.supabase_service.is_operator(user_id):
+            return json({"error": "Forbidden"}, status=403)
+        return json(self.profile_cache_service.stats())
         
     @get("/transactions")
     async def get_transaction_log(self, request: Request):
+        """
+        Query: limit (default 20, max 100), cursor (next_cursor of the previous page)
+        Return: {transactions, next_cursor, summary}, summary is the per-type totals (first page only)
+        """
         try:
-            user_id = request.scope.get("user_id") or self.supabase_service.get_user_id_from_request(request)
+            user_id = request.scope.get("user_id") or await self.supabase_service.get_user_id_from_request(request)
             if not user_id:
                 return json({"error": "Unauthorized"}, status=401)
-            
-            res = self.supabase_service.get_transaction_log(user_id=user_id)
 
-            if not res or not res.data:
-                return json([])
+            try:
+                limit = int(request.query.get("limit", [TRANSACTION_PAGE_DEFAULT])[0])
+            except ValueError:
+                return json({"error": "Invalid limit"}, status=400)
+            limit = min(max(limit, 1), TRANSACTION_PAGE_MAX)
+            cursor = request.query.get("cursor", [None])[0]
 
-            return json(res.data)
+            try:
+                # supabase-py is synchronous, keep the event loop free while it waits
+                page = await asyncio.to_thread(self.supabase_service.get_transaction_page, user_id, limit, cursor)
+            except ValueError:
+                return json({"error": "Invalid cursor"}, status=400)
+
+            if page is None:
+                return json({"error": "Failed to fetch transactions"}, status=500)
+
+            return json(page)
         
         except Exception as e:
             print("supabase error:", e) # log it cuz why not
             return json({"error": str(e)}, status=500)
-        
-    
\ No newline at end of file
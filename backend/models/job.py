@@ -7,14 +7,24 @@ class VideoGenerationInput:
     custom_prompt: str
     global_context: str
     duration_seconds: int = 6
+    # gs:// references to images uploaded through a signed URL, instead of multipart files
+    starting_image_uri: Optional[str] = None
+    ending_image_uri: Optional[str] = None
 
 @dataclass
 class VideoJobRequest:
-    starting_image: bytes
+    starting_image: Optional[bytes]
     global_context: str
     custom_prompt: str
     duration_seconds: int = 6
     ending_image: Optional[bytes] = None
+    # set instead of the bytes for uploaded images, the worker downloads them
+    starting_image_uri: Optional[str] = None
+    ending_image_uri: Optional[str] = None
+    # CreditService reservation of the job's debit, refunded if the job fails
+    reservation_id: Optional[str] = None
+    # epoch ms the job was created, first entry of its stage timeline
+    queued_at: Optional[int] = None
 
 @dataclass
 class JobStatus:
@@ -25,9 +35,30 @@ class JobStatus:
     error: Optional[str] = None
     metadata: Optional[dict] = None
 
+    def to_dict(self) -> dict:
+        """JSON body returned by GET /api/jobs/video/{job_id} (and pushed as SSE event data)"""
+        if self.status == "error":
+            return {
+                "status": "error",
+                "error_message": self.error
+            }
+        if self.status == "waiting":
+            return {
+                "status": "waiting",
+                "job_start_time": self.job_start_time.isoformat()
+            }
+        return {
+            "status": self.status,
+            "job_start_time": self.job_start_time.isoformat(),
+            "job_end_time": self.job_end_time.isoformat() if self.job_end_time else None,
+            "video_url": self.video_url,
+            "metadata": self.metadata
+        }
+
 class VideoJob(TypedDict):
     """Type hint for video job stored in Redis"""
     job_id: str
     operation_name: str
     job_start_time: str  # ISO format datetime string
     metadata: dict
+    timeline: dict  # mark -> epoch ms, see job_service.STAGE_INTERVALS
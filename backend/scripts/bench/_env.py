@@ -0,0 +1,31 @@
+"""
+Shared setup for the benchmark scripts: puts backend/ on sys.path and fills in placeholder
+values for the required settings (utils/env.py), so the scripts run without a developer .env.
+Values already in the environment win.
+
+    import _env
+    _env.setup(AUTUMN_RETRY_BASE_DELAY="0.01")  # before importing backend modules
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+DEFAULTS = {
+    "GOOGLE_CLOUD_PROJECT": "bench",
+    "GOOGLE_CLOUD_LOCATION": "us-central1",
+    "GOOGLE_GENAI_USE_VERTEXAI": "true",
+    "GOOGLE_CLOUD_BUCKET_NAME": "bench",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "SUPABASE_URL": "http://localhost",
+    "SUPABASE_SECRET_KEY": "bench",
+    "AUTUMN_SECRET_KEY": "bench",
+}
+
+
+def setup(**overrides: str):
+    """Make backend modules importable and default the settings (plus per-script overrides)"""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    for key, value in {**DEFAULTS, **overrides}.items():
+        os.environ.setdefault(key, value)
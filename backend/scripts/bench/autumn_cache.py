@@ -0,0 +1,106 @@
+"""
+Benchmark: Autumn proxy GETs and entitlement checks with and without the AutumnService response cache.
+
+An in-process stub of the Autumn API (httpx.MockTransport, 40 ms per request) serves /products,
+/customers/{id} and /entitled. 100 users each load the pricing page 5 times (products + customer +
+entitled, 3 of each at once as separate components would), then pay and call sync-credits, which
+checks the purchase. The uncached run is the same AutumnService with caching turned off (no
+cacheable paths). Reports upstream requests, request latency, and that every post-payment check
+sees the purchase.
+
+Run from backend/:  python scripts/bench/autumn_cache.py
+"""
+import asyncio
+import statistics
+import time
+
+import _env
+_env.setup()
+
+import contextlib
+import io
+
+import httpx
+
+import services.autumn_service as autumn_module
+from services.autumn_service import AutumnService
+
+RTT = 0.04  # seconds per Autumn API request
+USERS = 100
+PAGE_LOADS = 5
+PARALLEL_COMPONENTS = 3
+PRODUCTS = [{"id": "starter-pack"}, {"id": "pro-pack"}]
+
+
+class _AutumnStub:
+    def __init__(self):
+        self.purchases: dict[str, list] = {}
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(RTT)
+        path = request.url.path.removeprefix("/v1/")
+        if path == "products":
+            return httpx.Response(200, json={"list": PRODUCTS})
+        if path == "entitled":
+            return httpx.Response(200, json={"allowed": True})
+        customer_id = path.removeprefix("customers/")
+        return httpx.Response(200, json={"id": customer_id, "products": self.purchases.get(customer_id, [])})
+
+
+async def run(cacheable_paths: dict):
+    autumn_module.CACHEABLE_PATHS = cacheable_paths
+    stub = _AutumnStub()
+    service = AutumnService(base_url="https://autumn.stub/v1")
+    await service.http_client.aclose()
+    service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(stub))
+    latencies = []
+    verified = 0
+
+    async def timed(call):
+        start = time.perf_counter()
+        result = await call
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    async def user(i):
+        nonlocal verified
+        customer_id = f"user-{i}"
+        for _ in range(PAGE_LOADS):
+            await asyncio.gather(*(
+                timed(service.proxy_request(path, "GET", customer_id, {}))
+                for path in ("products", f"customers/{customer_id}", "entitled")
+                for _ in range(PARALLEL_COMPONENTS)
+            ))
+            await asyncio.sleep(0.05)
+        # checkout, then the webhook / redirect
+        stub.purchases[customer_id] = [{"id": "starter-pack", "status": "active"}]
+        await service.invalidate(customer_id)
+        seen = await timed(service.check_product_purchased(customer_id, "starter-pack"))
+        verified += seen
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(user(i) for i in range(USERS)))
+    elapsed = time.perf_counter() - start
+    await service.aclose()
+    return elapsed, latencies, stub.requests, verified
+
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return f"p50 {statistics.median(latencies) * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms"
+
+
+async def main():
+    cacheable_paths = dict(autumn_module.CACHEABLE_PATHS)
+    for label, paths in (("no cache", {}), ("cached", cacheable_paths)):
+        elapsed, latencies, requests, verified = await run(paths)
+        print(f"{label:<9} {len(latencies)} calls in {elapsed:5.2f} s | {_summary(latencies)} | "
+              f"{requests:5d} Autumn requests | purchase seen after payment {verified}/{USERS}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
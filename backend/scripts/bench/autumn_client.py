@@ -0,0 +1,146 @@
+"""
+Benchmark: Autumn proxy latency with a client per call (old) vs the shared pooled AutumnService client.
+
+A local HTTPS stub of api.useautumn.com (uvicorn in a separate process, self-signed cert) answers
+GET /v1/customers/{id}. Each variant makes 200 sequential calls and then 200 calls 20 at a time,
+reporting p50/p99 latency and wall time. Finally a stub endpoint that fails every other request
+with a 503 shows the retry path. uvicorn speaks HTTP/1.1 only, so this measures keep-alive reuse;
+against the real API every saved handshake is also 2 network round trips (TCP + TLS 1.3).
+
+Run from backend/:  python scripts/bench/autumn_client.py
+"""
+import asyncio
+import datetime
+import multiprocessing
+import os
+import socket
+import statistics
+import tempfile
+import time
+
+import _env
+_env.setup(
+    AUTUMN_RETRY_BASE_DELAY="0.01",
+)
+
+import httpx
+import orjson
+import uvicorn
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+CALLS = 200
+CONCURRENCY = 20
+CUSTOMER = orjson.dumps({"id": "user-1", "products": [{"id": "starter-pack", "status": "active"}]})
+
+
+def _write_certificate(directory: str) -> tuple[str, str]:
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1)).not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+async def _stub(scope, receive, send):
+    if scope["type"] != "http":
+        return
+    status, body = 200, CUSTOMER
+    if scope["path"] == "/v1/flaky":
+        _stub.calls = getattr(_stub, "calls", 0) + 1
+        if _stub.calls % 2:
+            status, body = 503, b'{"error": "unavailable"}'
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _serve(port: int, cert_path: str, key_path: str):
+    uvicorn.run(_stub, host="127.0.0.1", port=port, ssl_certfile=cert_path, ssl_keyfile=key_path, log_level="error")
+
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return f"p50 {statistics.median(latencies) * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms"
+
+
+async def _measure(call) -> tuple[list, list, float]:
+    sequential = []
+    for _ in range(CALLS):
+        start = time.perf_counter()
+        await call()
+        sequential.append(time.perf_counter() - start)
+
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    concurrent = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            concurrent.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(CALLS)))
+    return sequential, concurrent, time.perf_counter() - start
+
+
+async def main(base_url: str):
+    from services.autumn_service import AutumnService
+
+    async def client_per_call():
+        # what every AutumnService method did before
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"{base_url}/customers/user-1", headers={"Authorization": "Bearer bench"})
+            response.json()
+
+    autumn_service = AutumnService(base_url=base_url)
+
+    async def shared_client():
+        await autumn_service.check_product_purchased("user-1", "starter-pack")
+
+    for label, call in (("client per call", client_per_call), ("shared client", shared_client)):
+        await call()  # warm up imports / the pool
+        sequential, concurrent, wall = await _measure(call)
+        print(f"{label:<16} sequential {_summary(sequential)} | {CONCURRENCY} at a time {_summary(concurrent)}, {wall * 1000:6.0f} ms wall")
+
+    start = time.perf_counter()
+    response = await autumn_service._request("GET", f"{base_url}/flaky")
+    print(f"flaky endpoint: {response.status_code} after a retry in {(time.perf_counter() - start) * 1000:.1f} ms")
+    await autumn_service.aclose()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = _write_certificate(directory)
+        os.environ["SSL_CERT_FILE"] = cert_path  # trust the stub's certificate in every client
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        server = multiprocessing.Process(target=_serve, args=(port, cert_path, key_path), daemon=True)
+        server.start()
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        try:
+            asyncio.run(main(f"https://localhost:{port}/v1"))
+        finally:
+            server.terminate()
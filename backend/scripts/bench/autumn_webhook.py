@@ -0,0 +1,227 @@
+"""
+Benchmark: Autumn webhook handling inline (old) vs verified, deduplicated and queued (AutumnWebhookService).
+
+200 payments for 50 users are each delivered 5 times (the provider retrying deliveries it timed
+out on), 50 deliveries in flight at a time, in random order. The old handler is modelled as what
+autumn_webhook did before: purchase_credits (one synchronous PostgREST round trip, RTT) on the event
+loop for every delivery. The new path calls the real controller with signed requests on fakeredis,
+AutumnWebhookService applying the queue to an in-memory Postgres stub with apply_credit_ledger.
+Reports webhook response latency, Postgres round trips and credits granted vs credits paid for.
+One event for a user without a profile is queued ahead of the deliveries, the Postgres stub fails
+any call containing it, it must end up on the dead-letter stream without holding back the others.
+
+Run from backend/:  python scripts/bench/autumn_webhook.py
+Requires fakeredis with Lua support (pip install fakeredis lupa).
+"""
+import asyncio
+import base64
+import contextlib
+import hashlib
+import hmac
+import io
+import random
+import statistics
+import time
+import uuid
+from types import SimpleNamespace
+
+SECRET = "whsec_" + base64.b64encode(b"bench-signing-key").decode()
+import _env
+_env.setup(
+    AUTUMN_WEBHOOK_SECRET=SECRET,
+    AUTUMN_WEBHOOK_FLUSH_INTERVAL="0.05",
+    AUTUMN_WEBHOOK_MAX_ATTEMPTS="3",
+)
+
+import fakeredis
+import fakeredis.aioredis
+import orjson
+import redis.asyncio as redis
+from blacksheep import Content, Request
+from postgrest.exceptions import APIError
+
+from controllers.autumn import PRODUCT_CREDITS, Autumn
+from services.autumn_service import AutumnService
+import services.autumn_webhook_service as autumn_webhook_module
+from services.autumn_webhook_service import AutumnWebhookService
+from services.credit_service import CreditService
+from utils.env import settings
+
+RTT = 0.02  # seconds per PostgREST round trip
+USERS = 50
+PAYMENTS = 200
+DELIVERIES = 5
+IN_FLIGHT = 50
+
+
+class _PostgresStub:
+    """profiles + transaction_log with the semantics of the SQL functions, counting round trips"""
+
+    def __init__(self, user_ids):
+        self.credits = {user_id: 0 for user_id in user_ids}
+        self.ledger_ids = set()
+        self.calls = 0
+
+    def get_user_row(self, user_id):
+        self.calls += 1
+        time.sleep(RTT)
+        return None
+
+    def purchase_credits(self, user_id, credits, plan="paid"):
+        self.calls += 1
+        time.sleep(RTT)
+        self.credits[user_id] += credits
+        return self.credits[user_id]
+
+    def apply_credit_ledger(self, entries):
+        self.calls += 1
+        time.sleep(RTT)
+        # like the uuid cast / missing profile row, one unknown user fails the whole call
+        for entry in entries:
+            if entry["user_id"] not in self.credits:
+                raise APIError({"code": "23503", "message": f"no profile for user {entry['user_id']}"})
+        touched = set()
+        for entry in entries:
+            if entry["ledger_entry_id"] not in self.ledger_ids:
+                self.ledger_ids.add(entry["ledger_entry_id"])
+                self.credits[entry["user_id"]] -= entry["credit_usage"]
+                touched.add(entry["user_id"])
+        return {user_id: self.credits[user_id] for user_id in touched}
+
+
+class _NoopCreditService:
+    async def invalidate(self, user_id):
+        pass
+
+
+def _deliveries(user_ids):
+    payments = []
+    for _ in range(PAYMENTS):
+        body = orjson.dumps({
+            "id": f"evt_{uuid.uuid4().hex}",
+            "type": "checkout.completed",
+            "customer_id": random.choice(user_ids),
+            "product_id": random.choice(list(PRODUCT_CREDITS)),
+        })
+        payments.append((f"msg_{uuid.uuid4().hex}", body))
+    deliveries = [payment for payment in payments for _ in range(DELIVERIES)]
+    random.shuffle(deliveries)
+    paid = sum(PRODUCT_CREDITS[orjson.loads(body)["product_id"]] for _, body in payments)
+    return deliveries, paid
+
+
+def _signed_request(message_id: str, body: bytes) -> Request:
+    timestamp = str(int(time.time()))
+    key = base64.b64decode(SECRET.removeprefix("whsec_"))
+    signature = base64.b64encode(hmac.new(key, f"{message_id}.{timestamp}.".encode() + body, hashlib.sha256).digest())
+    request = Request("POST", b"/api/autumn/webhook", [
+        (b"content-type", b"application/json"),
+        (b"svix-id", message_id.encode()),
+        (b"svix-timestamp", timestamp.encode()),
+        (b"svix-signature", b"v1," + signature),
+    ])
+    request.with_content(Content(b"application/json", body))
+    return request
+
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return f"p50 {statistics.median(latencies) * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms"
+
+
+async def _deliver(deliveries, handle) -> list:
+    semaphore = asyncio.Semaphore(IN_FLIGHT)
+    latencies = []
+
+    async def one(message_id, body):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await handle(message_id, body)
+            latencies.append(time.perf_counter() - start)
+            assert response.status == 200, response.status
+
+    await asyncio.gather(*(one(message_id, body) for message_id, body in deliveries))
+    return latencies
+
+
+async def run_inline(user_ids, deliveries):
+    postgres = _PostgresStub(user_ids)
+    credit_service = _NoopCreditService()
+
+    async def handle(message_id, body):
+        # what autumn_webhook did: no signature, no dedup, a synchronous RPC on the event loop
+        request = _signed_request(message_id, body)
+        payload = await request.json()
+        credits = PRODUCT_CREDITS[payload["product_id"]]
+        postgres.purchase_credits(payload["customer_id"], credits)
+        await credit_service.invalidate(payload["customer_id"])
+        return SimpleNamespace(status=200)
+
+    start = time.perf_counter()
+    latencies = await _deliver(deliveries, handle)
+    return time.perf_counter() - start, latencies, postgres
+
+
+async def run_queued(user_ids, deliveries, paid):
+    pool = redis.BlockingConnectionPool(
+        connection_class=fakeredis.aioredis.FakeConnection, server=fakeredis.FakeServer(), max_connections=50
+    )
+    redis_client = redis.Redis(connection_pool=pool)
+    postgres = _PostgresStub(user_ids)
+    credit_service = CreditService(redis_client, postgres)
+    autumn_webhook_module.RETRY_IDLE_MS = 500
+    webhook_service = AutumnWebhookService(redis_client, postgres, credit_service)
+    autumn_service = AutumnService()
+    controller = Autumn(autumn_service, postgres, credit_service, webhook_service)
+    await webhook_service.start()
+    # an event for a user without a profile, queued ahead of the real deliveries
+    await webhook_service.ingest("evt_orphan", str(uuid.uuid4()), "starter-pack", PRODUCT_CREDITS["starter-pack"])
+
+    async def handle(message_id, body):
+        return await controller.autumn_webhook(_signed_request(message_id, body))
+
+    start = time.perf_counter()
+    latencies = await _deliver(deliveries, handle)
+    accepted = time.perf_counter() - start
+    # the orphan event is retried in the background while the purchases behind it go through
+    while sum(postgres.credits.values()) != paid:
+        await asyncio.sleep(0.01)
+    applied = time.perf_counter() - start
+    while not await redis_client.xlen("autumn:webhooks:dead"):
+        await asyncio.sleep(0.01)
+    dead_lettered = time.perf_counter() - start
+
+    forged = _signed_request("msg_forged", deliveries[0][1])
+    forged.headers[b"svix-signature"] = b"v1,AAAA"
+    rejected = (await controller.autumn_webhook(forged)).status
+    not_a_uuid = orjson.dumps({"id": "evt_bad", "type": "checkout.completed", "customer_id": "x'; --", "product_id": "pro-pack"})
+    invalid_customer = (await controller.autumn_webhook(_signed_request("msg_bad", not_a_uuid))).status
+
+    await webhook_service.stop()
+    await autumn_service.aclose()
+    await redis_client.aclose()
+    return accepted, applied, dead_lettered, latencies, postgres, rejected, invalid_customer
+
+
+async def main():
+    user_ids = [str(uuid.uuid4()) for _ in range(USERS)]
+    deliveries, paid = _deliveries(user_ids)
+    print(f"{PAYMENTS} payments x {DELIVERIES} deliveries, {IN_FLIGHT} in flight, {paid} credits paid for")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed, latencies, postgres = await run_inline(user_ids, deliveries)
+    print(f"inline  {elapsed:5.2f} s wall | {_summary(latencies)} | {postgres.calls:4d} Postgres round trips | "
+          f"{sum(postgres.credits.values())} credits granted")
+
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        accepted, applied, dead_lettered, latencies, postgres, rejected, invalid_customer = await run_queued(user_ids, deliveries, paid)
+    print(f"queued  {accepted:5.2f} s wall ({applied:.2f} s until applied) | {_summary(latencies)} | "
+          f"{postgres.calls:4d} Postgres round trips | {sum(postgres.credits.values())} credits granted")
+    print(f"  forged signature -> {rejected}, non-uuid customer_id -> {invalid_customer}, "
+          f"event for an unknown user -> autumn:webhooks:dead after {dead_lettered:.2f} s "
+          f"(retried every {autumn_webhook_module.RETRY_IDLE_MS} ms, {settings.AUTUMN_WEBHOOK_MAX_ATTEMPTS} attempts)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""
+Benchmark: bytes sent to Vertex and preprocessing latency of the image normalization stage.
+
+Corpus: the sample frames shipped with the frontend (frontend/public) plus a few synthetic
+uploads typical of users (a 4K PNG screenshot, a 12 MP camera JPEG, a 1440p PNG with a
+transparent annotation layer). For each frame it reports the original vs normalized size and
+format. Then 8 jobs are normalized concurrently (starting + ending frame each), once with
+normalize_image called inline on the event loop and once through the ImageNormalizer process
+pool, reporting wall time and the worst event loop stall seen by a 5 ms ticker.
+
+Run from backend/:  python scripts/bench/image_normalize.py
+"""
+import asyncio
+import glob
+import io
+import os
+import time
+
+import _env
+_env.setup()
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from utils.image_normalizer import ImageNormalizer, normalize_image
+
+MAX_WIDTH, MAX_HEIGHT, JPEG_QUALITY = 1344, 768, 90
+FRONTEND_PUBLIC = os.path.join(os.path.dirname(__file__), "..", "..", "..", "frontend", "public")
+JOBS = 8
+
+
+def _encode(image: Image.Image, fmt: str, **kwargs) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format=fmt, **kwargs)
+    return output.getvalue()
+
+
+def load_corpus() -> dict[str, bytes]:
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(FRONTEND_PUBLIC, "**", "*.*"), recursive=True)):
+        if path.lower().endswith((".png", ".jpg", ".jpeg")):
+            with open(path, "rb") as f:
+                corpus[os.path.relpath(path, FRONTEND_PUBLIC)] = f.read()
+
+    base = Image.open(io.BytesIO(corpus["demo/demo.png"])).convert("RGB")
+    corpus["synthetic/4k-screenshot.png"] = _encode(base.resize((3840, 2160)), "PNG")
+    camera = base.resize((4032, 3024)).filter(ImageFilter.DETAIL)
+    corpus["synthetic/12mp-camera.jpg"] = _encode(camera, "JPEG", quality=95)
+
+    sketch = base.resize((2560, 1440)).convert("RGBA")
+    layer = Image.new("RGBA", sketch.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    draw.line([(200, 1200), (1400, 400)], fill=(255, 0, 0, 255), width=24)
+    draw.ellipse([(1800, 200), (2300, 700)], outline=(255, 255, 0, 255), width=16)
+    sketch.putalpha(200)
+    corpus["synthetic/annotated-1440p.png"] = _encode(Image.alpha_composite(sketch, layer), "PNG")
+    return corpus
+
+
+async def _measure(run_job, corpus: list[bytes]) -> tuple[float, float]:
+    worst_stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst_stall
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            worst_stall = max(worst_stall, time.perf_counter() - start - 0.005)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_job(corpus[i % len(corpus)], corpus[(i + 1) % len(corpus)]) for i in range(JOBS)
+    ))
+    elapsed = time.perf_counter() - start
+    done = True
+    await tick
+    return elapsed, worst_stall
+
+
+async def main():
+    corpus = load_corpus()
+
+    print(f"{'frame':<32} {'original':>22} {'normalized':>22} {'ms':>7}")
+    total_in = total_out = 0
+    for name, data in corpus.items():
+        with Image.open(io.BytesIO(data)) as image:
+            original = f"{image.format} {image.width}x{image.height} {len(data) / 1024:7.0f}K"
+        start = time.perf_counter()
+        result = normalize_image(data, MAX_WIDTH, MAX_HEIGHT, JPEG_QUALITY)
+        elapsed = (time.perf_counter() - start) * 1000
+        with Image.open(io.BytesIO(result.data)) as image:
+            normalized = f"{result.mime_type.split('/')[1].upper()} {image.width}x{image.height} {len(result.data) / 1024:7.0f}K"
+        total_in += len(data)
+        total_out += len(result.data)
+        print(f"{name:<32} {original:>22} {normalized:>22} {elapsed:7.1f}")
+    print(f"bytes sent per frame: {total_in / len(corpus) / 1024:.0f}K -> {total_out / len(corpus) / 1024:.0f}K "
+          f"({100 * (1 - total_out / total_in):.0f}% less)\n")
+
+    frames = list(corpus.values())
+
+    async def inline_job(starting, ending):
+        normalize_image(starting, MAX_WIDTH, MAX_HEIGHT, JPEG_QUALITY)
+        normalize_image(ending, MAX_WIDTH, MAX_HEIGHT, JPEG_QUALITY)
+
+    normalizer = ImageNormalizer(2, MAX_WIDTH, MAX_HEIGHT, JPEG_QUALITY)
+    await normalizer.normalize(frames[0])  # start the worker processes outside the measurement
+
+    async def pool_job(starting, ending):
+        await asyncio.gather(normalizer.normalize(starting), normalizer.normalize(ending))
+
+    for label, job in (("inline on loop", inline_job), ("process pool", pool_job)):
+        elapsed, stall = await _measure(job, frames)
+        print(f"{label:<15} {JOBS} jobs: {elapsed * 1000:7.0f} ms wall, worst loop stall {stall * 1000:7.1f} ms")
+    normalizer.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: job record codec vs the previous lzma(pickle(...)) format.
+
+Encodes/decodes realistic VideoJob records (pending, error and in-flight jobs with an
+annotation description) and reports per-record encode/decode time and stored bytes.
+
+Run from backend/:  python scripts/bench/job_codec.py
+"""
+import lzma
+import pickle
+import timeit
+import uuid
+from datetime import datetime
+
+import _env
+_env.setup()
+
+from utils.job_codec import JobRecordCodec
+
+ANNOTATION = (
+    "There is a red arrow in the lower left corner pointing to the right, indicating the fox "
+    "should run across the frame towards the river. A dashed circle around the tree on the right "
+    "suggests the camera should slowly zoom into the canopy. Handwritten text near the top reads "
+    "'sunset, warm light' which describes the desired lighting. A small squiggle under the bird "
+    "implies it should flap its wings and take off towards the upper edge of the frame. "
+)
+
+RECORDS = {
+    "pending": {"status": "pending", "job_start_time": datetime.now().isoformat()},
+    "error": {
+        "status": "error",
+        "error": "429 RESOURCE_EXHAUSTED. Quota exceeded for aiplatform.googleapis.com/generate_content_requests",
+        "job_start_time": datetime.now().isoformat(),
+    },
+    "job": {
+        "job_id": str(uuid.uuid4()),
+        "operation_name": f"projects/123456789/locations/us-central1/publishers/google/models/veo-3.1-fast-generate-001/operations/{uuid.uuid4()}",
+        "job_start_time": datetime.now().isoformat(),
+        "metadata": {"annotation_description": ANNOTATION},
+    },
+    "job (long annotation)": {
+        "job_id": str(uuid.uuid4()),
+        "operation_name": f"projects/123456789/locations/us-central1/publishers/google/models/veo-3.1-fast-generate-001/operations/{uuid.uuid4()}",
+        "job_start_time": datetime.now().isoformat(),
+        "metadata": {"annotation_description": ANNOTATION * 4},
+    },
+}
+
+N = 2_000
+
+
+def _bench(encode, decode, record):
+    data = encode(record)
+    assert decode(data) == record
+    encode_us = timeit.timeit(lambda: encode(record), number=N) / N * 1e6
+    decode_us = timeit.timeit(lambda: decode(data), number=N) / N * 1e6
+    return encode_us, decode_us, len(data)
+
+
+def main():
+    codec = JobRecordCodec()
+    formats = {
+        "lzma+pickle": (lambda r: lzma.compress(pickle.dumps(r)), lambda d: pickle.loads(lzma.decompress(d))),
+        "codec": (codec.encode, codec.decode),
+    }
+    print(f"{'record':<22} {'format':<12} {'encode us':>10} {'decode us':>10} {'bytes':>7}")
+    for name, record in RECORDS.items():
+        for label, (encode, decode) in formats.items():
+            encode_us, decode_us, size = _bench(encode, decode, record)
+            print(f"{name:<22} {label:<12} {encode_us:>10.2f} {decode_us:>10.2f} {size:>7}")
+
+
+if __name__ == "__main__":
+    main()
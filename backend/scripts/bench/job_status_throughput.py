@@ -0,0 +1,71 @@
+"""
+Benchmark: throughput of GET /api/jobs/video/{job_id} against fakeredis (or a real Redis).
+
+Drives the Jobs controller directly with N concurrent clients polling a mix of pending,
+failed and unknown jobs, and reports requests/second and latency percentiles.
+
+Run from backend/:  python scripts/bench/job_status_throughput.py [--redis-url redis://...]
+Requires fakeredis (pip install fakeredis) unless --redis-url is given.
+"""
+import argparse
+import asyncio
+import time
+
+import _env
+_env.setup()
+
+from controllers.jobs import Jobs
+from services.job_service import JobService
+
+JOBS = 200
+DURATION = 3.0
+
+
+async def _run(redis_client, concurrency: int):
+    job_service = JobService(vertex_service=None, redis_client=redis_client, job_events_service=None, job_queue=None, frame_cache_service=None, storage_service=None)
+    controller = Jobs(job_service, supabase_service=None, video_merge_service=None, job_events_service=None, storage_service=None, credit_service=None)
+
+    job_ids = [f"bench-{i}" for i in range(JOBS)]
+    for i, job_id in enumerate(job_ids):
+        state = "pending" if i % 4 else "error"
+        record = {"status": state, "error": "boom", "job_start_time": "2025-01-01T00:00:00"}
+        await redis_client.set(f"job:{job_id}:{state}", job_service._serialize(record), ex=300)
+    job_ids.append("bench-missing")
+
+    latencies = []
+    deadline = time.perf_counter() + DURATION
+
+    async def client(offset: int):
+        i = offset
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            await controller.get_video_job_status(job_ids[i % len(job_ids)])
+            latencies.append(time.perf_counter() - t0)
+            i += concurrency
+
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    latencies.sort()
+    pct = lambda p: latencies[max(0, int(len(latencies) * p) - 1)] * 1000
+    print(
+        f"concurrency {concurrency:>3}: {len(latencies) / DURATION:9.0f} req/s | "
+        f"p50 {pct(0.50):6.2f} ms  p99 {pct(0.99):6.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    for concurrency in (1, 10, 80):
+        if args.redis_url:
+            import redis.asyncio as redis
+            redis_client = redis.Redis.from_url(args.redis_url)
+        else:
+            import fakeredis
+            redis_client = fakeredis.FakeAsyncRedis()
+        asyncio.run(_run(redis_client, concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark: per-job stage timelines and GET /api/jobs/stage-stats on stubbed Vertex calls.
+
+40 two-frame jobs go through the real JobService / JobWorker / OperationPoller on fakeredis.
+Stub latencies are randomized per call: annotation analysis ~0.3 s, frame cleaning ~0.6 s,
+generate_videos submit ~0.2 s, Veo ~2 s. Clients poll GET status every 100 ms until done.
+Prints one job's metadata.timeline, the aggregated p50/p95 per stage (which should single out
+the stubbed Veo stage as the slowest), and what recording costs: job record size with and without
+the timeline and the latency of the first (recording) vs later status reads.
+
+Run from backend/:  python scripts/bench/job_timeline.py
+Requires fakeredis with Lua support (pip install fakeredis lupa).
+"""
+import asyncio
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import _env
+_env.setup(
+    VEO_POLL_INITIAL_DELAY="0.5",
+    VEO_POLL_MIN_INTERVAL="0.25",
+)
+
+import contextlib
+import io
+
+import fakeredis
+import orjson
+
+from models.job import VideoJobRequest
+from services.job_events_service import JobEventsService
+from services.job_queue import JobQueue
+from services.job_service import JobService
+from services.job_worker import JobWorker
+from services.operation_poller import OperationPoller
+from services.vertex_service import VertexService
+from utils.image_normalizer import NormalizedImage
+
+JOBS = 40
+VEO_SECONDS = 2.0
+
+
+def _jitter(seconds: float) -> float:
+    return random.uniform(seconds * 0.5, seconds * 1.5)
+
+
+class _StubModels:
+    def __init__(self):
+        self.operations = {}
+
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(_jitter(0.6 if model == VertexService.IMAGE_MODEL else 0.3))
+        part = SimpleNamespace(text="an arrow pointing left", inline_data=SimpleNamespace(data=b"frame", mime_type="image/png"))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    async def generate_videos(self, model, prompt, image, config):
+        await asyncio.sleep(_jitter(0.2))
+        name = f"projects/bench/operations/{len(self.operations)}"
+        self.operations[name] = time.monotonic() + _jitter(VEO_SECONDS)
+        return SimpleNamespace(name=name)
+
+
+class _StubOperations:
+    def __init__(self, models: _StubModels):
+        self.models = models
+
+    async def get(self, operation):
+        if time.monotonic() < self.models.operations[operation.name]:
+            return SimpleNamespace(done=False, result=None, error=None)
+        video = SimpleNamespace(video=SimpleNamespace(uri=f"gs://bench/{operation.name}.mp4"))
+        return SimpleNamespace(done=True, result=SimpleNamespace(generated_videos=[video]), error=None)
+
+
+class _PassthroughNormalizer:
+    async def normalize(self, data, flatten=False):
+        return NormalizedImage(data, "image/png")
+
+
+class _NoFrameCache:
+    async def get_annotation(self, *args):
+        return None
+
+    async def get_frame(self, *args):
+        return None
+
+    async def set_annotation(self, *args):
+        pass
+
+    async def set_frame(self, *args):
+        pass
+
+
+def _request() -> VideoJobRequest:
+    return VideoJobRequest(starting_image=b"start", ending_image=b"end", global_context="a forest", custom_prompt="the fox runs left")
+
+
+async def main():
+    models = _StubModels()
+    vertex_service = VertexService.__new__(VertexService)
+    vertex_service.bucket_name = "bench"
+    vertex_service.client = SimpleNamespace(aio=SimpleNamespace(models=models, operations=_StubOperations(models)))
+    redis_client = fakeredis.FakeAsyncRedis()
+    job_queue = JobQueue(redis_client)
+    job_service = JobService(
+        vertex_service, redis_client, JobEventsService(redis_client), job_queue, _NoFrameCache(),
+        storage_service=None, image_normalizer=_PassthroughNormalizer(),
+    )
+    job_worker = JobWorker(job_service, job_queue, concurrency=8)
+    operation_poller = OperationPoller(job_service, redis_client)
+    first_reads, later_reads = [], []
+
+    async def client():
+        await asyncio.sleep(random.uniform(0, 3))
+        job_id = await job_service.create_video_job(_request())
+        while (await job_service.get_video_job_status(job_id)).status == "waiting":
+            await asyncio.sleep(0.1)
+        # the read that saw "done" recorded url_served, time a fresh first read on a copy of the record
+        record = job_service._deserialize(await redis_client.get(f"job:{job_id}"))
+        del record["timeline"]["url_served"]
+        await redis_client.set(f"job:{job_id}:copy", job_service._serialize(record), ex=300)
+        start = time.perf_counter()
+        await job_service.get_video_job_status(f"{job_id}:copy")
+        first_reads.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        await job_service.get_video_job_status(f"{job_id}:copy")
+        later_reads.append(time.perf_counter() - start)
+        return job_id
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await job_worker.start()
+        await operation_poller.start()
+        job_ids = await asyncio.gather(*(client() for _ in range(JOBS)))
+        await job_worker.stop()
+        await operation_poller.stop()
+
+    status = await job_service.get_video_job_status(job_ids[0])
+    print("metadata.timeline of one job (ms since queued):")
+    print(f"  {status.metadata['timeline']}")
+
+    # the copies were sampled too, drop them before aggregating
+    await redis_client.ltrim("jobs:timelines", JOBS, -1)
+    stats = await job_service.stage_stats()
+    print(f"stage-stats over {stats['jobs']} jobs (ms):")
+    for name, stage in sorted(stats["stages_ms"].items(), key=lambda item: -item[1]["p95"]):
+        print(f"  {name:<11} p50 {stage['p50']:6d}  p95 {stage['p95']:6d}  (n={stage['count']})")
+
+    record = job_service._deserialize(await redis_client.get(f"job:{job_ids[0]}"))
+    sizes = [(len(orjson.dumps(record)), len(job_service._serialize(record)))]
+    del record["timeline"]
+    sizes.insert(0, (len(orjson.dumps(record)), len(job_service._serialize(record))))
+    print(f"job record json {sizes[0][0]} -> {sizes[1][0]} bytes with the timeline, "
+          f"stored {sizes[0][1]} -> {sizes[1][1]} bytes (zstd above JOB_CODEC_ZSTD_THRESHOLD)")
+    print(f"status read: first (records url_served) p50 {statistics.median(first_reads) * 1000:.2f} ms, "
+          f"later p50 {statistics.median(later_reads) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,171 @@
+"""
+Benchmark: peak memory of a 10-segment merge, buffered vs streamed to GCS.
+
+Generates 10 short test clips with ffmpeg, serves them from a local HTTP server and merges them
+with the concat demuxer, either the previous way (all of ffmpeg's stdout joined into one bytes
+object, then handed to upload_file) or through VideoMergeService's streaming path into
+StorageService.upload_file. The bucket is a stand-in whose writer discards what it receives,
+so only the merge side's memory is measured. Each mode runs in its own process and reports its
+peak RSS.
+
+Run from backend/:  python scripts/bench/merge_memory.py [--segments 10] [--seconds 8]
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import _env
+_env.setup()
+
+
+class _DiscardWriter:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+    def close(self):
+        pass
+
+
+class _Blob:
+    def __init__(self, name):
+        self.name = name
+        self.public_url = f"https://storage.googleapis.com/bench/{name}"
+
+    def open(self, mode, chunk_size=None, content_type=None, **kwargs):
+        return _DiscardWriter()
+
+    def upload_from_string(self, data, content_type=None):
+        pass
+
+    def make_public(self):
+        pass
+
+
+class _Bucket:
+    name = "bench"
+
+    def blob(self, name):
+        return _Blob(name)
+
+
+def make_segments(directory: str, count: int, seconds: int):
+    for i in range(count):
+        subprocess.run([
+            "ffmpeg", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=24:duration={seconds}",
+            "-f", "lavfi", "-i", f"sine=frequency={220 + 40 * i}:duration={seconds}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "8M", "-c:a", "aac", "-shortest",
+            # http.server has no Range support, keep the moov atom up front so ffmpeg never seeks
+            "-movflags", "+faststart",
+            os.path.join(directory, f"segment_{i}.mp4"),
+        ], check=True)
+
+
+def serve(directory: str) -> str:
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+async def merge_buffered(urls: list[str]) -> int:
+    """The previous implementation: collect all of stdout, then upload the bytes"""
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-protocol_whitelist", "file,http,https,tcp,tls,fd",
+        "-f", "concat", "-safe", "0", "-i", "-", "-c", "copy",
+        "-f", "mp4", "-movflags", "frag_keyframe+empty_moov", "-",
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    process.stdin.write("".join(f"file '{url}'\n" for url in urls).encode())
+    await process.stdin.drain()
+    process.stdin.close()
+
+    stdout_chunks = []
+    stderr_chunks = []
+
+    async def read_stdout():
+        while chunk := await process.stdout.read(1024 * 1024):
+            stdout_chunks.append(chunk)
+
+    async def read_stderr():
+        while chunk := await process.stderr.read(4096):
+            stderr_chunks.append(chunk)
+
+    await asyncio.gather(read_stdout(), read_stderr())
+    await process.wait()
+    video_data = b"".join(stdout_chunks)
+    _Bucket().blob("merged.mp4").upload_from_string(video_data, content_type="video/mp4")
+    return len(video_data)
+
+
+async def merge_streamed(urls: list[str]) -> int:
+    from services.storage_service import StorageService
+    from services.video_merge_service import VideoMergeService
+
+    storage_service = StorageService.__new__(StorageService)
+    storage_service.bucket = _Bucket()
+    written = 0
+
+    async def counted(chunks):
+        nonlocal written
+        async for chunk in chunks:
+            written += len(chunk)
+            yield chunk
+
+    merge_service = VideoMergeService(storage_service)
+    await storage_service.upload_file("merged.mp4", counted(merge_service._merge_with_ffmpeg_http(urls)), content_type="video/mp4")
+    return written
+
+
+def run_mode(mode: str, base_url: str, count: int):
+    urls = [f"{base_url}/segment_{i}.mp4" for i in range(count)]
+    merge = merge_buffered if mode == "buffered" else merge_streamed
+    start = time.perf_counter()
+    size = asyncio.run(merge(urls))
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:<9} output {size / 2**20:7.1f} MiB   peak RSS {peak_mib:7.1f} MiB   {elapsed:5.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segments", type=int, default=10)
+    parser.add_argument("--seconds", type=int, default=8)
+    parser.add_argument("--mode", choices=["buffered", "streamed"])
+    parser.add_argument("--base-url")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.base_url, args.segments)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Generating {args.segments} x {args.seconds}s segments...")
+        make_segments(directory, args.segments, args.seconds)
+        base_url = serve(directory)
+        for mode in ("buffered", "streamed"):
+            subprocess.run([
+                sys.executable, __file__, "--mode", mode, "--base-url", base_url,
+                "--segments", str(args.segments),
+            ], check=True)
+
+
+if __name__ == "__main__":
+    main()
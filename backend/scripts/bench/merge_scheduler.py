@@ -0,0 +1,89 @@
+"""
+Regression check: MergeScheduler when a queued merge is cancelled in the same loop iteration
+as a slot release.
+
+With concurrency=1, merge A holds the slot and merge B waits for it. B's task is cancelled and
+A leaves its slot before B's task runs again, so _release finds B's future already cancelled.
+A must finish cleanly, the slot must not leak, and a later merge must get it right away.
+Then 200 merges from 20 users with random cancellations run through concurrency=4 and the
+scheduler must end up idle.
+
+Run from backend/:  python scripts/bench/merge_scheduler.py
+"""
+import asyncio
+import random
+
+import _env
+_env.setup()
+
+from services.merge_scheduler import MergeScheduler
+
+
+async def cancel_during_release():
+    scheduler = MergeScheduler(concurrency=1, max_queue_depth=10, max_queued_per_user=5)
+    release = asyncio.Event()
+
+    async def merge_a():
+        async with scheduler.slot("a"):
+            await release.wait()
+        return "uploaded"
+
+    async def merge_b():
+        async with scheduler.slot("b"):
+            return "uploaded"
+
+    task_a = asyncio.create_task(merge_a())
+    await asyncio.sleep(0)
+    task_b = asyncio.create_task(merge_b())
+    await asyncio.sleep(0)
+    assert scheduler._waiting == 1
+
+    # same iteration: A is woken first, then B's future is cancelled, so A releases its slot
+    # before B's task gets to handle the cancellation
+    release.set()
+    task_b.cancel()
+    assert await task_a == "uploaded"
+    try:
+        await task_b
+    except asyncio.CancelledError:
+        pass
+    assert (scheduler._running, scheduler._waiting) == (0, 0), (scheduler._running, scheduler._waiting)
+
+    await asyncio.wait_for(merge_b(), timeout=1)
+    print("cancel during release: A returned, slot freed, next merge admitted")
+
+
+async def random_cancellations():
+    scheduler = MergeScheduler(concurrency=4, max_queue_depth=1000, max_queued_per_user=100)
+    running = 0
+    peak = 0
+
+    async def merge(user_id):
+        nonlocal running, peak
+        async with scheduler.slot(user_id):
+            running += 1
+            peak = max(peak, running)
+            try:
+                await asyncio.sleep(random.uniform(0, 0.005))
+            finally:
+                running -= 1
+
+    tasks = [asyncio.create_task(merge(f"user-{i % 20}")) for i in range(200)]
+    for _ in range(60):
+        await asyncio.sleep(random.uniform(0, 0.003))
+        random.choice(tasks).cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    cancelled = sum(isinstance(result, asyncio.CancelledError) for result in results)
+    assert not [result for result in results if result is not None and not isinstance(result, asyncio.CancelledError)]
+    assert (scheduler._running, scheduler._waiting, scheduler._queues) == (0, 0, {})
+    assert peak <= scheduler.concurrency
+    print(f"random cancellations: 200 merges, {cancelled} cancelled, peak {peak} running, scheduler idle")
+
+
+async def main():
+    await cancel_during_release()
+    await random_cancellations()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
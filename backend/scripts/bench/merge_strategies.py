@@ -0,0 +1,103 @@
+"""
+Benchmark: HTTP-input vs prefetch merge strategies against a throttled origin.
+
+Generates test segments with ffmpeg and serves them from a local HTTP server that adds a
+time-to-first-byte delay and caps each connection's bandwidth (one segment can be made extra
+slow), roughly what reading Veo outputs from storage.googleapis.com looks like. Both strategies
+of VideoMergeService are drained to completion and their wall time is reported.
+
+Run from backend/:  python scripts/bench/merge_strategies.py [--segments 10] [--ttfb 0.15] [--mbps 80]
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+import _env
+_env.setup()
+
+from services.video_merge_service import VideoMergeService
+
+
+class _ThrottledHandler(http.server.SimpleHTTPRequestHandler):
+    ttfb = 0.15
+    bytes_per_second = 10 * 1024 * 1024
+    slow_path = None
+
+    def log_message(self, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        rate = self.bytes_per_second / (4 if self.path == self.slow_path else 1)
+        time.sleep(self.ttfb)
+        block = 64 * 1024
+        while data := source.read(block):
+            outputfile.write(data)
+            time.sleep(len(data) / rate)
+
+
+def make_segments(directory: str, count: int, seconds: int):
+    for i in range(count):
+        subprocess.run([
+            "ffmpeg", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=24:duration={seconds}",
+            "-f", "lavfi", "-i", f"sine=frequency={220 + 40 * i}:duration={seconds}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "4M", "-c:a", "aac", "-shortest",
+            # the bench server has no Range support, keep the moov atom up front so ffmpeg never seeks
+            "-movflags", "+faststart",
+            os.path.join(directory, f"segment_{i}.mp4"),
+        ], check=True)
+
+
+def serve(directory: str, ttfb: float, mbps: float, slow_segment) -> str:
+    _ThrottledHandler.ttfb = ttfb
+    _ThrottledHandler.bytes_per_second = mbps * 1_000_000 / 8
+    _ThrottledHandler.slow_path = f"/segment_{slow_segment}.mp4" if slow_segment is not None else None
+    handler = functools.partial(_ThrottledHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def drain(chunks) -> int:
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+    return size
+
+
+async def run(urls: list[str], label: str):
+    service = VideoMergeService(storage_service=None)
+    try:
+        for name, strategy in (("http-input", service._merge_with_ffmpeg_http), ("prefetch", service._merge_with_prefetch)):
+            start = time.perf_counter()
+            size = await drain(strategy(urls))
+            print(f"{label:<14} {name:<10} {size / 2**20:6.1f} MiB  {time.perf_counter() - start:6.2f}s")
+    finally:
+        await service.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segments", type=int, default=10)
+    parser.add_argument("--seconds", type=int, default=8)
+    parser.add_argument("--ttfb", type=float, default=0.15, help="seconds before the first byte of each response")
+    parser.add_argument("--mbps", type=float, default=80, help="bandwidth per connection")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Generating {args.segments} x {args.seconds}s segments...")
+        make_segments(directory, args.segments, args.seconds)
+        urls = lambda base: [f"{base}/segment_{i}.mp4" for i in range(args.segments)]
+
+        asyncio.run(run(urls(serve(directory, args.ttfb, args.mbps, None)), "uniform"))
+        asyncio.run(run(urls(serve(directory, args.ttfb, args.mbps, args.segments // 2)), "one slow"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: cost of the Prometheus instrumentation on the hot paths.
+
+1. 20000 requests through a blacksheep app (in-process TestClient, two routes plus the controllers'
+   route table) with and without metrics_middleware, per-request time.
+2. 200000 calls of a no-op async function, bare vs wrapped with @timed.
+3. 20000 Redis GETs on fakeredis through redis.asyncio.Redis vs InstrumentedRedis.
+4. Size and render time of /metrics after all of the above.
+
+Run from backend/:  python scripts/bench/metrics_overhead.py
+Requires fakeredis (pip install fakeredis).
+"""
+import asyncio
+import time
+
+import _env
+_env.setup()
+
+import fakeredis
+import fakeredis.aioredis
+import redis.asyncio as redis
+from blacksheep import Application
+from blacksheep.testing import TestClient
+
+from utils.metrics import InstrumentedRedis, metrics_middleware, render_metrics, timed
+
+REQUESTS = 20_000
+CALLS = 200_000
+REDIS_COMMANDS = 20_000
+
+
+def _app(instrumented: bool) -> Application:
+    app = Application()
+
+    @app.router.get("/api/jobs/video/{job_id}")
+    async def job_status(job_id: str):
+        return {"job_id": job_id}
+
+    @app.router.get("/")
+    def hello_world():
+        return "Hello World"
+
+    if instrumented:
+        app.middlewares.insert(0, metrics_middleware(app.router))
+    return app
+
+
+async def bench_http() -> dict:
+    results = {}
+    for instrumented in (False, True):
+        app = _app(instrumented)
+        await app.start()
+        client = TestClient(app)
+        for i in range(500):
+            await client.get(f"/api/jobs/video/{i}")
+        start = time.perf_counter()
+        for i in range(REQUESTS):
+            await client.get(f"/api/jobs/video/{i}")
+        results[instrumented] = (time.perf_counter() - start) / REQUESTS
+    return results
+
+
+async def bench_timed() -> dict:
+    async def call():
+        return None
+
+    results = {}
+    for label, fn in (("bare", call), ("timed", timed("bench", "noop")(call))):
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            await fn()
+        results[label] = (time.perf_counter() - start) / CALLS
+    return results
+
+
+async def bench_redis() -> dict:
+    server = fakeredis.FakeServer()
+    results = {}
+    for label, client_class in (("redis.Redis", redis.Redis), ("InstrumentedRedis", InstrumentedRedis)):
+        pool = redis.ConnectionPool(connection_class=fakeredis.aioredis.FakeConnection, server=server)
+        client = client_class(connection_pool=pool)
+        await client.set("key", "value")
+        start = time.perf_counter()
+        for _ in range(REDIS_COMMANDS):
+            await client.get("key")
+        results[label] = (time.perf_counter() - start) / REDIS_COMMANDS
+        await client.aclose()
+    return results
+
+
+async def main():
+    http = await bench_http()
+    overhead = http[True] - http[False]
+    print(f"HTTP request     plain {http[False] * 1e6:7.1f} us  instrumented {http[True] * 1e6:7.1f} us  "
+          f"(+{overhead * 1e6:.1f} us, {overhead / http[False] * 100:.1f}%)")
+
+    calls = await bench_timed()
+    print(f"async call       bare {calls['bare'] * 1e6:7.2f} us  @timed {calls['timed'] * 1e6:7.2f} us  "
+          f"(+{(calls['timed'] - calls['bare']) * 1e6:.2f} us)")
+
+    commands = await bench_redis()
+    plain, instrumented = commands["redis.Redis"], commands["InstrumentedRedis"]
+    print(f"Redis GET        plain {plain * 1e6:7.1f} us  instrumented {instrumented * 1e6:7.1f} us  "
+          f"(+{(instrumented - plain) * 1e6:.1f} us; a real round trip is 100+ us)")
+
+    start = time.perf_counter()
+    _, body = render_metrics()
+    print(f"/metrics         {len(body) / 1024:.1f} KiB rendered in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
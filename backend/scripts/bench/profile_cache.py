@@ -0,0 +1,133 @@
+"""
+Benchmark: GET /api/supabase/user reads through ProfileCacheService vs a profiles select per call.
+
+Two API instances share one (fake) Redis. 50 users poll their profile every 100 ms-ish from
+both instances while every user spends credits through CreditService on instance A.
+Reports read latency, how many reads reached Postgres, and whether any read returned a balance
+older than the last debit that had completed (and been broadcast) before the read started.
+
+Run from backend/:  python scripts/bench/profile_cache.py
+Requires fakeredis with Lua support (pip install fakeredis lupa).
+"""
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from types import SimpleNamespace
+
+import _env
+_env.setup()
+
+import fakeredis
+import fakeredis.aioredis
+import redis.asyncio as redis
+
+from services.credit_service import CreditService
+from services.profile_cache_service import ProfileCacheService
+
+RTT = 0.02  # seconds per PostgREST round trip
+USERS = 50
+READS_PER_USER = 40
+DEBITS_PER_USER = 8
+PROPAGATION = 0.005  # seconds allowed for the invalidation broadcast to reach the other instance
+
+
+class _PostgresStub:
+    def __init__(self, user_ids):
+        self.rows = {
+            user_id: {"user_id": user_id, "credits": 1000, "billing_type": "free", "created_at": "2026-01-01T00:00:00+00:00"}
+            for user_id in user_ids
+        }
+        self.selects = 0
+
+    def get_user_row(self, user_id):
+        self.selects += 1
+        time.sleep(RTT)
+        return SimpleNamespace(data=dict(self.rows[user_id]))
+
+
+def _summary(latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return f"p50 {statistics.median(latencies) * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms"
+
+
+async def run_uncached(user_ids):
+    postgres = _PostgresStub(user_ids)
+    latencies = []
+
+    async def poll(user_id):
+        for _ in range(READS_PER_USER):
+            start = time.perf_counter()
+            postgres.get_user_row(user_id)  # what the controller did, synchronously on the loop
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(random.uniform(0.05, 0.15))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(poll(user_id) for user_id in user_ids))
+    return time.perf_counter() - start, latencies, postgres.selects
+
+
+async def run_cached(user_ids):
+    pool = redis.BlockingConnectionPool(
+        connection_class=fakeredis.aioredis.FakeConnection, server=fakeredis.FakeServer(), max_connections=50
+    )
+    redis_client = redis.Redis(connection_pool=pool)
+    postgres = _PostgresStub(user_ids)
+    instances = [ProfileCacheService(redis_client, postgres) for _ in range(2)]
+    for instance in instances:
+        await instance.start()
+    await asyncio.sleep(0.05)  # let the listeners subscribe
+    credit_service = CreditService(redis_client, postgres, instances[0])
+    latencies = []
+    committed = {}  # user -> balance after the last debit that finished
+    stale_reads = 0
+
+    async def poll(user_id):
+        nonlocal stale_reads
+        for i in range(READS_PER_USER):
+            expected = committed.get(user_id)
+            start = time.perf_counter()
+            profile = await instances[i % 2].get(user_id)
+            latencies.append(time.perf_counter() - start)
+            if expected is not None and profile["credits"] > expected:
+                stale_reads += 1
+            await asyncio.sleep(random.uniform(0.05, 0.15))
+
+    async def spend(user_id):
+        for _ in range(DEBITS_PER_USER):
+            await asyncio.sleep(random.uniform(0.2, 0.6))
+            reservation_id, _ = await credit_service.reserve(user_id, "image_gen", 1)
+            balance = int(await redis_client.get(f"credits:balance:{user_id}"))
+            await asyncio.sleep(PROPAGATION)
+            committed[user_id] = balance
+
+    start = time.perf_counter()
+    await asyncio.gather(*(poll(user_id) for user_id in user_ids), *(spend(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - start
+    stats = [instance.stats() for instance in instances]
+    for instance in instances:
+        await instance.stop()
+    await redis_client.aclose()
+    # the stub also serves the credit mirror loads, count only the profile misses
+    return elapsed, latencies, sum(s["misses"] for s in stats), stats, stale_reads
+
+
+async def main():
+    user_ids = [str(uuid.uuid4()) for _ in range(USERS)]
+    reads = USERS * READS_PER_USER
+
+    elapsed, latencies, selects = await run_uncached(user_ids)
+    print(f"select per read  {reads} reads: {elapsed:5.1f} s wall | {_summary(latencies)} | {selects} profiles selects")
+
+    elapsed, latencies, selects, stats, stale = await run_cached(user_ids)
+    print(f"profile cache    {reads} reads: {elapsed:5.1f} s wall | {_summary(latencies)} | {selects} profiles selects")
+    for name, s in zip("AB", stats):
+        print(f"  instance {name}: local {s['local_hits']} redis {s['redis_hits']} miss {s['misses']} "
+              f"updates {s['updates']} hit ratio {s['hit_ratio']:.2f}")
+    print(f"  reads older than the last completed debit: {stale}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
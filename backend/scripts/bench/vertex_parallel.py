@@ -0,0 +1,145 @@
+"""
+Benchmark: video job preprocessing with a stubbed genai client.
+
+Compares the old behaviour (SDK calls block the event loop) against the async client:
+- wall time of _process_video_job for a two-frame job
+- p99 latency of concurrent status polls while jobs are in flight
+
+Run from backend/:  python scripts/bench/vertex_parallel.py
+Requires fakeredis (pip install fakeredis).
+"""
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+import _env
+_env.setup()
+
+import fakeredis
+
+from models.job import VideoJobRequest
+from services.job_events_service import JobEventsService
+from services.job_queue import JobQueue
+from services.job_service import JobService
+from services.job_worker import JobWorker
+from services.vertex_service import VertexService
+from utils.image_normalizer import NormalizedImage
+
+CALL_LATENCY = 0.5  # seconds per stubbed Vertex call
+JOBS_IN_FLIGHT = 5
+POLLERS = 50
+POLL_INTERVAL = 0.05
+
+
+class _StubCall:
+    def __init__(self, blocking: bool):
+        self.blocking = blocking
+
+    async def wait(self):
+        if self.blocking:
+            time.sleep(CALL_LATENCY)  # what a sync SDK call inside async def does
+        else:
+            await asyncio.sleep(CALL_LATENCY)
+
+
+class _StubModels(_StubCall):
+    async def generate_content(self, model, contents, config=None):
+        await self.wait()
+        part = SimpleNamespace(text="an arrow pointing left", inline_data=SimpleNamespace(data=b"frame", mime_type="image/png"))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    async def generate_videos(self, model, prompt, image, config):
+        await self.wait()
+        return SimpleNamespace(name="projects/bench/operations/stub")
+
+
+class _StubOperations(_StubCall):
+    async def get(self, operation):
+        # answered instantly so poll latency only measures event loop stalls
+        return SimpleNamespace(done=False, result=None, error=None)
+
+
+class _PassthroughNormalizer:
+    async def normalize(self, data, flatten=False):
+        return NormalizedImage(data, "image/png")
+
+
+class _NoFrameCache:
+    async def get_annotation(self, *args):
+        return None
+
+    async def get_frame(self, *args):
+        return None
+
+    async def set_annotation(self, *args):
+        pass
+
+    async def set_frame(self, *args):
+        pass
+
+
+def _build_job_service(blocking: bool) -> tuple[JobService, JobWorker]:
+    vertex_service = VertexService.__new__(VertexService)
+    vertex_service.bucket_name = "bench"
+    vertex_service.client = SimpleNamespace(
+        aio=SimpleNamespace(models=_StubModels(blocking), operations=_StubOperations(blocking))
+    )
+    redis_client = fakeredis.FakeAsyncRedis()
+    job_queue = JobQueue(redis_client)
+    # frame cache disabled (no-op) so every job really runs its preprocessing calls
+    job_service = JobService(vertex_service, redis_client, JobEventsService(redis_client), job_queue, _NoFrameCache(), storage_service=None, image_normalizer=_PassthroughNormalizer())
+    return job_service, JobWorker(job_service, job_queue, concurrency=JOBS_IN_FLIGHT)
+
+
+def _request() -> VideoJobRequest:
+    return VideoJobRequest(
+        starting_image=b"start",
+        ending_image=b"end",
+        global_context="a forest",
+        custom_prompt="the fox runs left",
+    )
+
+
+async def _run(blocking: bool):
+    job_service, job_worker = _build_job_service(blocking)
+
+    start = time.perf_counter()
+    await job_service.process_video_job("warmup", _request())
+    wall_time = time.perf_counter() - start
+
+    job_ids = [await job_service.create_video_job(_request()) for _ in range(JOBS_IN_FLIGHT)]
+    await job_worker.start()
+    latencies = []
+    deadline = time.perf_counter() + CALL_LATENCY * 4
+
+    async def poll(job_id: str):
+        # latency is measured from when the poll was due, so event loop stalls are included
+        due = time.perf_counter()
+        while True:
+            await job_service.get_video_job_status(job_id)
+            now = time.perf_counter()
+            latencies.append(now - due)
+            if now >= deadline:
+                break
+            due += POLL_INTERVAL
+            await asyncio.sleep(max(0.0, due - now))
+
+    await asyncio.gather(*(poll(job_ids[i % len(job_ids)]) for i in range(POLLERS)))
+    await job_worker.stop()
+    latencies.sort()
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)]
+    return wall_time, statistics.median(latencies), p99, len(latencies)
+
+
+def main():
+    for label, blocking in (("blocking sdk", True), ("async sdk", False)):
+        wall_time, p50, p99, polls = asyncio.run(_run(blocking))
+        print(
+            f"{label:>13}: two-frame job {wall_time * 1000:7.1f} ms | "
+            f"poll p50 {p50 * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms  ({polls} polls)"
+        )
+
+
+if __name__ == "__main__":
+    main()
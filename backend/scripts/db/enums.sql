@@ -1,5 +1,8 @@
-CREATE TYPE transaction_type AS ENUM ('video_gen', 'image_gen', 'credit_purchase');
+CREATE TYPE transaction_type AS ENUM ('video_gen', 'image_gen', 'credit_purchase', 'credit_refund');
 CREATE TYPE billing_type AS ENUM ('free', 'paid');
 
 -- To add 'credit_purchase' to an existing transaction_type enum, run:
 -- ALTER TYPE transaction_type ADD VALUE 'credit_purchase';
+
+-- To add 'credit_refund' (failed jobs, see CreditService.refund), run:
+-- ALTER TYPE transaction_type ADD VALUE 'credit_refund';
@@ -50,4 +50,130 @@ END;
 $$ LANGUAGE plpgsql security definer;
 CREATE TRIGGER on_auth_user_created
   AFTER INSERT ON auth.users
-  FOR EACH ROW EXECUTE PROCEDURE public.handle_new_user();
\ No newline at end of file
+  FOR EACH ROW EXECUTE PROCEDURE public.handle_new_user();
+
+-- debit (positive p_credit_change) or credit (negative) a user, optionally set their plan and
+-- append the transaction_log row, all in one statement/round trip. Returns the new balance.
+CREATE OR REPLACE FUNCTION public.apply_credit_transaction(
+  p_user_id uuid,
+  p_transaction_type transaction_type,
+  p_credit_change numeric,
+  p_billing_type billing_type DEFAULT NULL
+)
+RETURNS numeric
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_balance numeric;
+BEGIN
+  -- lock user row to avoid race conditions
+  SELECT credits
+    INTO v_balance
+    FROM public.profiles
+   WHERE profiles.user_id = p_user_id
+   FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'user_not_found: user % does not exist', p_user_id;
+  END IF;
+
+  v_balance := COALESCE(v_balance, 0) - p_credit_change;
+
+  IF v_balance < 0 THEN
+    RAISE EXCEPTION 'insufficient_credits: cannot apply change % to user %, not enough credits',
+      p_credit_change, p_user_id;
+  END IF;
+
+  UPDATE public.profiles
+    SET credits = v_balance,
+        billing_type = COALESCE(p_billing_type, profiles.billing_type)
+   WHERE user_id = p_user_id;
+
+  INSERT INTO public.transaction_log (transaction_type, user_id, credit_usage)
+  VALUES (p_transaction_type, p_user_id, p_credit_change);
+
+  RETURN v_balance;
+END;
+$$;
+
+
+-- ledger entries from the Redis credit mirror carry their id, so a replayed batch is a no-op
+ALTER TABLE public.transaction_log ADD COLUMN IF NOT EXISTS ledger_entry_id text UNIQUE;
+
+-- write a batch of ledger entries (jsonb array of {ledger_entry_id, user_id, transaction_type,
+-- credit_usage, billing_type?}) and apply their sum per user, plus the plan of entries that set one
+-- (purchases). Returns the balance of every user in the batch.
+-- The balance check already happened in Redis, so this never raises insufficient_credits.
+CREATE OR REPLACE FUNCTION public.apply_credit_ledger(
+  p_entries jsonb
+)
+RETURNS TABLE (balance_user_id uuid, balance numeric)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  WITH inserted AS (
+    INSERT INTO public.transaction_log (ledger_entry_id, user_id, transaction_type, credit_usage)
+    SELECT e.ledger_entry_id, e.user_id, e.transaction_type, e.credit_usage
+      FROM jsonb_to_recordset(p_entries)
+        AS e(ledger_entry_id text, user_id uuid, transaction_type transaction_type, credit_usage numeric)
+    ON CONFLICT (ledger_entry_id) DO NOTHING
+    RETURNING transaction_log.ledger_entry_id, transaction_log.user_id, transaction_log.credit_usage
+  ), totals AS (
+    SELECT inserted.user_id, SUM(inserted.credit_usage) AS credit_usage, MAX(e.billing_type) AS billing_type
+      FROM inserted
+      JOIN jsonb_to_recordset(p_entries) AS e(ledger_entry_id text, billing_type billing_type)
+        ON e.ledger_entry_id = inserted.ledger_entry_id
+     GROUP BY inserted.user_id
+  )
+  UPDATE public.profiles
+     SET credits = COALESCE(profiles.credits, 0) - totals.credit_usage,
+         billing_type = COALESCE(totals.billing_type, profiles.billing_type)
+    FROM totals
+   WHERE profiles.user_id = totals.user_id;
+
+  RETURN QUERY
+  SELECT profiles.user_id, profiles.credits
+    FROM public.profiles
+   WHERE profiles.user_id IN (
+     SELECT (e->>'user_id')::uuid FROM jsonb_array_elements(p_entries) AS e
+   );
+END;
+$$;
+
+
+-- one page of a user's transaction log, newest first, keyset paginated on
+-- (created_at, transaction_log_id) so deep pages cost the same as the first one
+-- (see transaction_log_user_created_idx). The first page also carries the per-type totals.
+CREATE OR REPLACE FUNCTION public.get_transaction_page(
+  p_user_id uuid,
+  p_limit integer,
+  p_before_created_at timestamptz DEFAULT NULL,
+  p_before_id public.transaction_log.transaction_log_id%TYPE DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT jsonb_build_object(
+    'transactions', COALESCE((
+      SELECT jsonb_agg(to_jsonb(page) ORDER BY page.created_at DESC, page.transaction_log_id DESC)
+        FROM (
+          SELECT transaction_log_id, created_at, transaction_type, credit_usage
+            FROM public.transaction_log
+           WHERE transaction_log.user_id = p_user_id
+             AND (p_before_created_at IS NULL
+                  OR (created_at, transaction_log_id) < (p_before_created_at, p_before_id))
+           ORDER BY created_at DESC, transaction_log_id DESC
+           LIMIT p_limit
+        ) AS page
+    ), '[]'::jsonb),
+    'summary', CASE WHEN p_before_created_at IS NULL THEN COALESCE((
+      SELECT jsonb_object_agg(
+               transaction_summary.transaction_type,
+               jsonb_build_object('credits', transaction_summary.total_credits, 'count', transaction_summary.transaction_count)
+             )
+        FROM public.transaction_summary
+       WHERE transaction_summary.user_id = p_user_id
+    ), '{}'::jsonb) END
+  );
+$$;
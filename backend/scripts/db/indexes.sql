@@ -0,0 +1,5 @@
+-- keyset pagination of a user's transaction log (get_transaction_page): the range scan walks the
+-- index in order and the INCLUDE columns make it index-only
+CREATE INDEX IF NOT EXISTS transaction_log_user_created_idx
+  ON public.transaction_log (user_id, created_at DESC, transaction_log_id DESC)
+  INCLUDE (transaction_type, credit_usage);
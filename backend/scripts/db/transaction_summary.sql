@@ -0,0 +1,44 @@
+-- per user, per transaction type totals of transaction_log, kept up to date by a trigger so the
+-- dashboard summary never scans the history
+CREATE TABLE IF NOT EXISTS public.transaction_summary (
+  user_id uuid NOT NULL,
+  transaction_type transaction_type NOT NULL,
+  total_credits numeric NOT NULL DEFAULT 0,
+  transaction_count bigint NOT NULL DEFAULT 0,
+  PRIMARY KEY (user_id, transaction_type)
+);
+
+CREATE OR REPLACE FUNCTION public.update_transaction_summary()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  -- statement level, a batched ledger flush (apply_credit_ledger) is one upsert per user and type
+  INSERT INTO public.transaction_summary AS summary (user_id, transaction_type, total_credits, transaction_count)
+  SELECT new_rows.user_id, new_rows.transaction_type, SUM(new_rows.credit_usage), COUNT(*)
+    FROM new_rows
+   GROUP BY new_rows.user_id, new_rows.transaction_type
+  ON CONFLICT (user_id, transaction_type) DO UPDATE
+    SET total_credits = summary.total_credits + EXCLUDED.total_credits,
+        transaction_count = summary.transaction_count + EXCLUDED.transaction_count;
+  RETURN NULL;
+END;
+$$;
+
+-- trigger + backfill in one transaction with inserts blocked, so no row is counted twice or missed
+-- (safe to re-run, the summary is rebuilt from the log)
+BEGIN;
+LOCK TABLE public.transaction_log IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS on_transaction_log_inserted ON public.transaction_log;
+CREATE TRIGGER on_transaction_log_inserted
+  AFTER INSERT ON public.transaction_log
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE PROCEDURE public.update_transaction_summary();
+
+TRUNCATE public.transaction_summary;
+INSERT INTO public.transaction_summary (user_id, transaction_type, total_credits, transaction_count)
+SELECT user_id, transaction_type, SUM(credit_usage), COUNT(*)
+  FROM public.transaction_log
+ GROUP BY user_id, transaction_type;
+COMMIT;
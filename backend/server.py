@@ -1,31 +1,84 @@
 import logging
-from blacksheep import Application, Request, Request
+from blacksheep import Application, Content, Request, Request, Response, json
 from services.storage_service import StorageService
 from services.vertex_service import VertexService
 from services.job_service import JobService
+from services.job_events_service import JobEventsService
+from services.job_queue import JobQueue
+from services.frame_cache_service import FrameCacheService
+from services.job_worker import JobWorker
 from services.supabase_service import SupabaseService
+from services.credit_service import CreditService
+from services.profile_cache_service import ProfileCacheService
+from services.credit_reconciler import CreditReconciler
 from services.autumn_service import AutumnService
+from services.autumn_webhook_service import AutumnWebhookService
 from services.video_merge_service import VideoMergeService
+from services.merge_cache_service import MergeCacheService
+from services.operation_poller import OperationPoller
+from utils.redis_pool import create_redis_client
+from utils.metrics import StatsCollector, metrics_middleware, render_metrics
+from utils.env import settings
 from rodi import Container
+from prometheus_client import REGISTRY, start_http_server
 
 services = Container()
 
+redis_client = create_redis_client()
 storage_service = StorageService()
 vertex_service = VertexService()
-job_service = JobService(vertex_service)
+job_events_service = JobEventsService(redis_client)
+job_queue = JobQueue(redis_client)
+frame_cache_service = FrameCacheService(redis_client, storage_service)
 supabase_service = SupabaseService()
-autumn_service = AutumnService()
-video_merge_service = VideoMergeService(storage_service)
+profile_cache_service = ProfileCacheService(redis_client, supabase_service)
+credit_service = CreditService(redis_client, supabase_service, profile_cache_service)
+credit_reconciler = CreditReconciler(credit_service, supabase_service, redis_client)
+job_service = JobService(vertex_service, redis_client, job_events_service, job_queue, frame_cache_service, storage_service, credit_service)
+autumn_service = AutumnService(redis_client=redis_client)
+autumn_webhook_service = AutumnWebhookService(redis_client, supabase_service, credit_service)
+merge_cache_service = MergeCacheService(redis_client, storage_service)
+video_merge_service = VideoMergeService(storage_service, merge_cache_service)
+operation_poller = OperationPoller(job_service, redis_client)
+job_worker = JobWorker(job_service, job_queue, settings.JOB_WORKER_CONCURRENCY)
 
 services.add_instance(storage_service, StorageService)
 services.add_instance(vertex_service, VertexService)
 services.add_instance(job_service, JobService)
+services.add_instance(job_events_service, JobEventsService)
 services.add_instance(supabase_service, SupabaseService)
+services.add_instance(credit_service, CreditService)
+services.add_instance(profile_cache_service, ProfileCacheService)
 services.add_instance(autumn_service, AutumnService)
+services.add_instance(autumn_webhook_service, AutumnWebhookService)
 services.add_instance(video_merge_service, VideoMergeService)
 
 app = Application(services=services)
 
+@app.on_start
+async def start_background_tasks(application: Application):
+    await job_events_service.start()
+    await operation_poller.start()
+    await credit_reconciler.start()
+    await profile_cache_service.start()
+    await autumn_webhook_service.start()
+    await autumn_service.start()
+    if settings.JOB_WORKER_EMBEDDED:
+        await job_worker.start()
+
+@app.on_stop
+async def stop_background_tasks(application: Application):
+    await job_worker.stop()
+    await operation_poller.stop()
+    await credit_reconciler.stop()
+    await autumn_webhook_service.stop()
+    await profile_cache_service.stop()
+    await job_events_service.stop()
+    await video_merge_service.aclose()
+    await autumn_service.aclose()
+    job_service.image_normalizer.shutdown()
+    await redis_client.aclose()
+
 # TODO: REMOVE IN PRODUCTION, FOR DEV ONLY
 app.use_cors(
     allow_methods="*",
@@ -33,17 +86,43 @@ app.use_cors(
     allow_headers="*",
 )
 
-async def attach_user(request: Request):
+async def attach_user(request: Request, handler):
+    # tokens are verified locally against the project's JWT secret / JWKS (cached until exp),
+    # so this no longer costs a GoTrue round trip per request; JWKS fetches and the GoTrue
+    # fallback run in a thread
     try:
-        uid = supabase_service.get_user_id_from_request(request)
+        uid = await supabase_service.get_user_id_from_request(request)
         if uid:
             request.scope["user_id"] = uid
     except Exception:
         # Do not block request processing on auth parsing errors
         pass
+    return await handler(request)
 
 app.middlewares.append(attach_user)
 
+if settings.METRICS_ENABLED:
+    # first in the chain so the histograms cover the other middlewares too
+    app.middlewares.insert(0, metrics_middleware(app.router))
+    REGISTRY.register(StatsCollector(
+        "profile_cache_events", "ProfileCacheService hits, misses and writes", lambda: profile_cache_service.counters
+    ))
+
+    if settings.METRICS_PORT:
+        # scraped on a port that is not exposed publicly, like worker.py's
+        start_http_server(settings.METRICS_PORT)
+
+    @app.router.get("/metrics")
+    async def metrics(request: Request):
+        # route latencies, queue depths and cache counters are for operators, not every caller
+        user_id = request.scope.get("user_id") or await supabase_service.get_user_id_from_request(request)
+        if not user_id:
+            return json({"error": "Unauthorized"}, status=401)
+        if not SupabaseService.is_operator(user_id):
+            return json({"error": "Forbidden"}, status=403)
+        content_type, body = render_metrics()
+        return Response(200, None, Content(content_type, body))
+
 # random test routes
 @app.router.get("/")
 def hello_world():
@@ -1,70 +1,216 @@
+import asyncio
+import itertools
+import random
+import time
+import traceback
 import httpx
+import redis.asyncio as redis
 from typing import Optional, Dict, Any
 from utils.env import settings
+from utils.metrics import EXTERNAL_CALL_ERRORS, EXTERNAL_CALL_SECONDS
+from utils.ttl_cache import TTLCache
+
+# upstream statuses worth another attempt (Autumn or its load balancer having a moment)
+RETRY_STATUSES = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# read-only paths (first segment) whose 200 responses are cached, and for how long (seconds)
+CACHEABLE_PATHS = {
+    "products": settings.AUTUMN_CACHE_PRODUCTS_TTL,
+    "customers": settings.AUTUMN_CACHE_CUSTOMER_TTL,
+    "entitled": settings.AUTUMN_CACHE_CUSTOMER_TTL,
+}
+INVALIDATE_CHANNEL = "autumncache:invalidate"
 
 class AutumnService:
-    def __init__(self):
+    def __init__(self, base_url: str = "https://api.useautumn.com/v1", redis_client: Optional[redis.Redis] = None):
         self.api_key = settings.AUTUMN_SECRET_KEY
-        self.base_url = "https://api.useautumn.com/v1"
+        self.base_url = base_url
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        # one pooled client per process: keep-alive (and HTTP/2) connections to Autumn are reused
+        # across requests instead of paying a TCP + TLS handshake on every call
+        self.http_client = httpx.AsyncClient(
+            headers=self.headers,
+            http2=settings.AUTUMN_HTTP2,
+            timeout=httpx.Timeout(settings.AUTUMN_READ_TIMEOUT, connect=settings.AUTUMN_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.AUTUMN_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.AUTUMN_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+        )
+        # GET responses of CACHEABLE_PATHS, keyed by (customer generation, customer, path, params).
+        # invalidate() bumps the customer's generation instead of hunting down its keys, the old
+        # entries are never read again and age out of the LRU
+        self.cache = TTLCache(max_size=settings.AUTUMN_CACHE_SIZE)
+        self._counter = itertools.count(1)
+        self._epoch = 0
+        self._generations: dict[str, int] = {}
+        # cache key -> request in flight, concurrent identical GETs share it
+        self._inflight: dict[tuple, asyncio.Task] = {}
+        # invalidations are broadcast so every instance drops its copy (checkout and webhooks run anywhere)
+        self.redis_client = redis_client
+        self._listener: Optional[asyncio.Task] = None
+
+    async def aclose(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self.http_client.aclose()
+
+    async def start(self):
+        if self.redis_client and not self._listener:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def invalidate(self, customer_id: str):
+        """Drop the cached responses of a customer here and on every other instance (after a checkout or payment)"""
+        self._bump(customer_id)
+        if self.redis_client:
+            try:
+                await self.redis_client.publish(INVALIDATE_CHANNEL, customer_id)
+            except Exception as e:
+                print(f"Autumn cache invalidation broadcast failed for {customer_id}: {e}")
+
+    def _bump(self, customer_id: Optional[str]):
+        if len(self._generations) >= settings.AUTUMN_CACHE_SIZE:
+            # keeps the generations bounded
+            self._reset()
+        self._generations[customer_id] = next(self._counter)
+
+    def _reset(self):
+        """Invalidate everything. Every generation comes from one counter, so keys of requests
+        still in flight can't collide with ones made after the reset"""
+        self._epoch = next(self._counter)
+        self._generations.clear()
+        self.cache.clear()
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATE_CHANNEL)
+                    # invalidations may have been missed while (re)connecting
+                    self._reset()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._bump(message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Autumn cache listener error, resubscribing: {e}")
+                traceback.print_exc()
+                await asyncio.sleep(1)
+
+    async def _cached_get(
+        self, path: str, customer_id: Optional[str], params: Optional[dict] = None, fresh: bool = False
+    ) -> tuple[httpx.Response, bool]:
+        """
+        GET {base_url}/{path} through the response cache when the path is cacheable, returns the
+        response and whether it was served from the cache. fresh=True skips the cached copy
+        (the new response still replaces it).
+        """
+        ttl = CACHEABLE_PATHS.get(path.split("/", 1)[0])
+        url = f"{self.base_url}/{path}"
+        if ttl is None:
+            return await self._request("GET", url, params=params), False
+
+        key = (self._generations.get(customer_id, self._epoch), customer_id, path, tuple(sorted((params or {}).items())))
+        if not fresh:
+            response = self.cache.get(key)
+            if response is not None:
+                return response, True
+
+        request = self._inflight.get(key)
+        if request is None or fresh:
+            request = asyncio.create_task(self._fetch(key, ttl, url, params))
+            if not fresh:
+                self._inflight[key] = request
+                request.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shielded so one caller going away doesn't fail the others waiting on the same request
+        return await asyncio.shield(request), False
+
+    async def _fetch(self, key: tuple, ttl: float, url: str, params: Optional[dict]) -> httpx.Response:
+        response = await self._request("GET", url, params=params)
+        # only successes; an invalidation during the request changed the generation, so this key is dead anyway
+        if response.status_code == 200:
+            self.cache.set(key, response, ttl)
+        return response
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request through the shared client, retrying with jittered exponential backoff.
+        Connect errors are always retried (the request never left), 5xx only for idempotent methods
+        so a slow POST /checkout isn't submitted twice.
+        """
+        # one label per endpoint, not per customer: "GET customers"
+        operation = f"{method} {url.removeprefix(self.base_url).strip('/').split('/', 1)[0]}"
+        for attempt in range(settings.AUTUMN_MAX_RETRIES + 1):
+            last_attempt = attempt == settings.AUTUMN_MAX_RETRIES
+            start = time.perf_counter()
+            try:
+                response = await self.http_client.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                EXTERNAL_CALL_ERRORS.labels("autumn", operation).inc()
+                if last_attempt:
+                    raise
+                print(f"Autumn {method} {url} failed to connect ({e!r}), retrying")
+            else:
+                EXTERNAL_CALL_SECONDS.labels("autumn", operation).observe(time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUSES or method not in IDEMPOTENT_METHODS or last_attempt:
+                    return response
+                print(f"Autumn {method} {url} returned {response.status_code}, retrying")
+            # full jitter, spreads the retries of concurrent requests instead of syncing them up
+            await asyncio.sleep(random.uniform(0, min(settings.AUTUMN_RETRY_MAX_DELAY, settings.AUTUMN_RETRY_BASE_DELAY * 2 ** attempt)))
 
     async def proxy_request(
-        self, 
-        path: str, 
-        method: str, 
-        customer_id: str, 
+        self,
+        path: str,
+        method: str,
+        customer_id: str,
         customer_data: Dict[str, str],
         body: Optional[Dict] = None
     ) -> Dict[str, Any]:
         """Proxy request to Autumn API (equivalent to autumnHandler)"""
-        async with httpx.AsyncClient() as client:
-            url = f"{self.base_url}/{path}"
-            
-            # Add customer_id to query params for GET, or body for POST/PUT
-            params = {}
-            json_data = body or {}
-            
-            if method == "GET":
-                params["customer_id"] = customer_id
-            else:
-                json_data["customer_id"] = customer_id
-                json_data["customer_data"] = customer_data
-
-            response = await client.request(
-                method=method,
-                url=url,
-                headers=self.headers,
-                params=params if method == "GET" else None,
-                json=json_data if method != "GET" else None
-            )
-            
-            response.raise_for_status()
-            return {
-                "data": response.json(),
-                "status": response.status_code
-            }
+        url = f"{self.base_url}/{path}"
+
+        # Add customer_id to query params for GET, or body for POST/PUT
+        params = {}
+        json_data = body or {}
+
+        if method == "GET":
+            params["customer_id"] = customer_id
+        else:
+            json_data["customer_id"] = customer_id
+            json_data["customer_data"] = customer_data
+
+        if method == "GET":
+            response, _ = await self._cached_get(path, customer_id, params)
+        else:
+            response = await self._request(method, url, json=json_data)
+
+        response.raise_for_status()
+        return {
+            "data": response.json(),
+            "status": response.status_code
+        }
 
     async def get_customer_entitlements(self, customer_id: str) -> Dict[str, Any]:
         """
         Get customer's entitlements/products from Autumn.
         Used to verify if a payment actually went through.
         """
-        async with httpx.AsyncClient() as client:
-            url = f"{self.base_url}/entitled"
-            params = {"customer_id": customer_id}
-            
-            response = await client.get(
-                url=url,
-                headers=self.headers,
-                params=params
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            return None
+        response, _ = await self._cached_get("entitled", customer_id, {"customer_id": customer_id})
+
+        if response.status_code == 200:
+            return response.json()
+        return None
 
     async def check_product_purchased(self, customer_id: str, product_id: str) -> bool:
         """
@@ -72,28 +218,27 @@ class AutumnService:
         Returns True if the product was purchased, False otherwise.
         """
         try:
-            async with httpx.AsyncClient() as client:
-                # Check customer's products/subscriptions
-                url = f"{self.base_url}/customers/{customer_id}"
-                
-                response = await client.get(
-                    url=url,
-                    headers=self.headers
-                )
-                
+            # Check customer's products/subscriptions. A cached customer can prove a purchase,
+            # but not its absence (it may predate the payment), so a miss there is confirmed upstream
+            fresh = False
+            while True:
+                response, cached = await self._cached_get(f"customers/{customer_id}", customer_id, fresh=fresh)
+
                 if response.status_code != 200:
                     print(f"Failed to get customer: {response.status_code}")
                     return False
-                
+
                 data = response.json()
                 products = data.get("products", [])
-                
+
                 # Check if the product_id is in customer's products
                 for product in products:
                     if product.get("id") == product_id:
                         return True
-                
-                return False
+
+                if not cached:
+                    return False
+                fresh = True
         except Exception as e:
             print(f"Error checking product purchase: {e}")
-            return False
\ No newline at end of file
+            return False
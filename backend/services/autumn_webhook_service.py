@@ -0,0 +1,144 @@
+import asyncio
+import traceback
+from typing import Optional
+
+import redis.asyncio as redis
+
+from services.credit_service import CreditService
+from services.supabase_service import SupabaseService
+from utils.env import settings
+from utils.stream_consumer import StreamConsumer, is_rejected
+
+STREAM_KEY = "autumn:webhooks"
+GROUP_NAME = "autumn-webhook-consumers"
+SEEN_PREFIX = "autumn:webhook:seen:"  # event id -> 1 for AUTUMN_WEBHOOK_DEDUP_TTL, drops redeliveries at the door
+DEAD_LETTER_KEY = "autumn:webhooks:dead"  # events rejected AUTUMN_WEBHOOK_MAX_ATTEMPTS times, kept with the error
+STREAM_MAX_LEN = 100_000
+RETRY_IDLE_MS = 5_000  # a rejected event is retried this long after its last attempt
+MAX_BACKOFF = 60  # seconds between retries while Postgres can't be reached
+
+# queue an event unless its id was already seen, atomically
+INGEST_SCRIPT = """
+if redis.call('set', KEYS[1], 1, 'nx', 'ex', ARGV[1]) == false then
+    return 0
+end
+redis.call('xadd', KEYS[2], 'maxlen', '~', ARGV[2], '*', unpack(ARGV, 3))
+return 1
+"""
+
+
+class AutumnWebhookService:
+    """
+    Durable, idempotent intake of Autumn payment webhooks.
+    The webhook handler only queues the verified event on a Redis stream (deduplicated by event id)
+    and answers right away; a background consumer applies queued purchases to Postgres in batches
+    through apply_credit_ledger, keyed by event id, so a replayed batch writes nothing twice either.
+    An event that keeps failing is set aside on a dead-letter stream instead of blocking the rest.
+    """
+
+    def __init__(self, redis_client: redis.Redis, supabase_service: SupabaseService, credit_service: CreditService):
+        self.redis_client = redis_client
+        self.supabase_service = supabase_service
+        self.credit_service = credit_service
+        self.consumer = StreamConsumer(
+            redis_client, STREAM_KEY, GROUP_NAME, DEAD_LETTER_KEY,
+            batch_size=settings.AUTUMN_WEBHOOK_BATCH_SIZE,
+            max_attempts=settings.AUTUMN_WEBHOOK_MAX_ATTEMPTS,
+            retry_idle_ms=RETRY_IDLE_MS,
+            max_len=STREAM_MAX_LEN,
+        )
+        self._ingest = redis_client.register_script(INGEST_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+
+    async def ingest(self, event_id: str, customer_id: str, product_id: str, credits: int) -> bool:
+        """Queue a purchase, returns False if this event id was already queued (a redelivery)"""
+        fields = {"event_id": event_id, "customer_id": customer_id, "product_id": product_id, "credits": credits}
+        queued = await self._ingest(
+            keys=[f"{SEEN_PREFIX}{event_id}", STREAM_KEY],
+            args=[settings.AUTUMN_WEBHOOK_DEDUP_TTL, STREAM_MAX_LEN, *(item for pair in fields.items() for item in pair)],
+        )
+        return bool(queued)
+
+    async def start(self):
+        if not self._task:
+            await self.consumer.ensure_group()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # apply what's already accepted so a deploy doesn't hold purchases for a reclaim timeout
+        try:
+            await self.apply_batch()
+        except Exception as e:
+            print(f"Final Autumn webhook batch failed: {e}")
+
+    async def _run(self):
+        failures = 0
+        while True:
+            try:
+                # keep going while there's a backlog, otherwise poll
+                if await self.apply_batch() < settings.AUTUMN_WEBHOOK_BATCH_SIZE:
+                    await asyncio.sleep(settings.AUTUMN_WEBHOOK_FLUSH_INTERVAL)
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Postgres can't be reached: entries stay pending, back off so an outage doesn't burn their attempts
+                failures += 1
+                print(f"Autumn webhook batch failed: {e}")
+                traceback.print_exc()
+                await asyncio.sleep(min(settings.AUTUMN_WEBHOOK_FLUSH_INTERVAL * 2 ** failures, MAX_BACKOFF))
+
+    async def apply_batch(self) -> int:
+        """Applies one batch of queued purchases, returns how many events it handled"""
+        entries = await self.consumer.read_batch()
+        if not entries:
+            return 0
+
+        try:
+            await self._apply_and_ack(entries)
+        except Exception as e:
+            if not is_rejected(e):
+                raise
+            # one bad event fails the whole RPC, split the batch until it's isolated so the others go through
+            print(f"Autumn webhook batch of {len(entries)} rejected ({e}), splitting it")
+            return await self.consumer.apply_split(entries, e, self._apply_and_ack)
+
+        return len(entries)
+
+    async def _apply(self, entries: list):
+        rows = []
+        for _, fields in entries:
+            event = {key.decode(): value.decode() for key, value in fields.items()}
+            rows.append({
+                "ledger_entry_id": f"autumn:{event['event_id']}",
+                "user_id": event["customer_id"],
+                "transaction_type": "credit_purchase",
+                "credit_usage": -int(event["credits"]),  # Negative because user gained credits
+                "billing_type": "paid",
+            })
+
+        # supabase-py is synchronous, keep the event loop free while it waits
+        balances = await asyncio.to_thread(self.supabase_service.apply_credit_ledger, rows)
+        for row in rows:
+            print(f"Applied Autumn payment for user {row['user_id']}: +{-row['credit_usage']} credits "
+                  f"(balance {balances.get(row['user_id'])})")
+
+        # Postgres changed directly, the next debit reloads the Redis mirror (and the profile cache)
+        await asyncio.gather(*(self.credit_service.invalidate(user_id) for user_id in {row["user_id"] for row in rows}))
+
+    async def _apply_and_ack(self, entries: list):
+        # the ledger ids make re-applying an event that already went through a no-op
+        await self._apply(entries)
+        await self._ack([entry_id for entry_id, _ in entries])
+
+    async def _ack(self, entry_ids: list):
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            self.consumer.ack(pipe, entry_ids)
+            await pipe.execute()
@@ -0,0 +1,124 @@
+import asyncio
+import traceback
+from collections import defaultdict
+from typing import Optional
+
+import redis.asyncio as redis
+
+from services.credit_service import BALANCE_PREFIX, CreditService, LEDGER_STREAM_KEY, PENDING_PREFIX, VERSION_PREFIX
+from services.supabase_service import SupabaseService
+from utils.env import settings
+from utils.stream_consumer import StreamConsumer, is_rejected
+
+GROUP_NAME = "credit-reconcilers"
+DEAD_LETTER_KEY = "credits:ledger:dead"  # entries rejected CREDIT_FLUSH_MAX_ATTEMPTS times, kept with the error
+RETRY_IDLE_MS = 10_000  # a rejected entry is retried this long after its last attempt
+
+
+class CreditReconciler:
+    """
+    Background task writing the credits:ledger stream to Postgres, one batched RPC per
+    CREDIT_FLUSH_INTERVAL instead of a row-locking RPC per request.
+    The RPC is idempotent per ledger entry and returns the new balances, which are mirrored back
+    in the same MULTI that acks the entries, so a crash at any point can only replay a batch.
+    Entries Postgres keeps rejecting are isolated and set aside on a dead-letter stream.
+    """
+
+    def __init__(self, credit_service: CreditService, supabase_service: SupabaseService, redis_client: redis.Redis):
+        self.credit_service = credit_service
+        self.supabase_service = supabase_service
+        self.redis_client = redis_client
+        self.consumer = StreamConsumer(
+            redis_client, LEDGER_STREAM_KEY, GROUP_NAME, DEAD_LETTER_KEY,
+            batch_size=settings.CREDIT_FLUSH_BATCH_SIZE,
+            max_attempts=settings.CREDIT_FLUSH_MAX_ATTEMPTS,
+            retry_idle_ms=RETRY_IDLE_MS,
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if not self._task:
+            await self.consumer.ensure_group()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # write out what's left so a deploy doesn't delay the ledger by a reclaim timeout
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Final credit ledger flush failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.CREDIT_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Postgres can't be reached, entries stay pending and are retried on the next tick
+                print(f"Credit ledger flush failed: {e}")
+                traceback.print_exc()
+
+    async def flush(self) -> int:
+        """Writes one batch of ledger entries to Postgres, returns how many were flushed"""
+        entries = await self.consumer.read_batch()
+        if not entries:
+            return 0
+
+        try:
+            await self._flush(entries)
+        except Exception as e:
+            if not is_rejected(e):
+                raise
+            # one bad row (e.g. a deleted user) fails the whole RPC, split the batch until it's isolated
+            print(f"Credit ledger batch of {len(entries)} rejected ({e}), splitting it")
+            return await self.consumer.apply_split(entries, e, self._flush, self._drop_pending)
+        return len(entries)
+
+    async def _flush(self, entries: list):
+        rows = []
+        flushed = defaultdict(int)
+        for _, fields in entries:
+            row = {key.decode(): value.decode() for key, value in fields.items()}
+            rows.append({
+                "ledger_entry_id": row["entry_id"],
+                "user_id": row["user_id"],
+                "transaction_type": row["transaction_type"],
+                "credit_usage": int(row["credit_usage"]),
+            })
+            flushed[row["user_id"]] += int(row["credit_usage"])
+
+        # supabase-py is synchronous, keep the event loop free while it waits
+        balances = await asyncio.to_thread(self.supabase_service.apply_credit_ledger, rows)
+
+        entry_ids = [entry_id for entry_id, _ in entries]
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            for user_id, balance in balances.items():
+                await self.credit_service.sync_balance(user_id, balance, flushed.pop(user_id, 0), client=pipe)
+            for user_id, usage in flushed.items():
+                # no profile row came back (deleted user), just stop counting the entries as pending
+                pipe.decrby(f"{PENDING_PREFIX}{user_id}", usage)
+            self.consumer.ack(pipe, entry_ids)
+            results = await pipe.execute()
+
+        # the sync scripts ran first, their results are the mirrored balances
+        await asyncio.gather(*(
+            self.credit_service.cache_balance(user_id, mirrored) for user_id, mirrored in zip(balances, results)
+        ))
+
+    @staticmethod
+    def _drop_pending(pipe, fields: dict):
+        """A dead-lettered entry never reaches Postgres: stop counting it and reload the user's balance"""
+        user_id = fields[b"user_id"].decode()
+        pipe.decrby(f"{PENDING_PREFIX}{user_id}", int(fields[b"credit_usage"]))
+        pipe.delete(f"{BALANCE_PREFIX}{user_id}")
+        pipe.incr(f"{VERSION_PREFIX}{user_id}")
+        pipe.expire(f"{VERSION_PREFIX}{user_id}", settings.CREDIT_BALANCE_TTL)
@@ -0,0 +1,191 @@
+import asyncio
+import traceback
+import uuid
+from typing import Optional, Tuple
+
+import redis.asyncio as redis
+
+from services.supabase_service import SupabaseService
+from services.profile_cache_service import ProfileCacheService
+from utils.env import settings
+
+BALANCE_PREFIX = "credits:balance:"  # mirrored profiles.credits, reloaded from Postgres after CREDIT_BALANCE_TTL
+PENDING_PREFIX = "credits:pending:"  # net credit usage in the ledger stream not yet flushed to Postgres
+HOLD_PREFIX = "credits:hold:"  # reservation id -> debit, kept so a failed job can be refunded once
+VERSION_PREFIX = "credits:version:"  # bumped when Postgres' balance changes behind the mirror (flushes, purchases)
+LEDGER_STREAM_KEY = "credits:ledger"
+REFUND_TRANSACTION_TYPE = "credit_refund"
+
+# check-and-decrement the mirrored balance and append the ledger entry, atomically
+RESERVE_SCRIPT = """
+local balance = redis.call('get', KEYS[1])
+if not balance then
+    return {0, 0}
+end
+local amount = tonumber(ARGV[1])
+if tonumber(balance) < amount then
+    return {-1, tonumber(balance)}
+end
+balance = redis.call('decrby', KEYS[1], amount)
+redis.call('incrby', KEYS[2], amount)
+redis.call('xadd', KEYS[3], '*', 'entry_id', ARGV[4], 'user_id', ARGV[2], 'transaction_type', ARGV[3], 'credit_usage', amount)
+redis.call('hset', KEYS[4], 'user_id', ARGV[2], 'transaction_type', ARGV[3], 'amount', amount)
+redis.call('expire', KEYS[4], ARGV[5])
+return {1, balance}
+"""
+
+# give a reservation back once (the hold is deleted), as a negative ledger entry
+REFUND_SCRIPT = """
+if redis.call('del', KEYS[1]) == 0 then
+    return {0, false}
+end
+local balance = false
+if redis.call('exists', KEYS[2]) == 1 then
+    balance = redis.call('incrby', KEYS[2], ARGV[2])
+end
+redis.call('decrby', KEYS[3], ARGV[2])
+redis.call('xadd', KEYS[4], '*', 'entry_id', ARGV[3], 'user_id', ARGV[1], 'transaction_type', ARGV[4], 'credit_usage', -tonumber(ARGV[2]))
+return {1, balance}
+"""
+
+# mirrored balance = Postgres balance - usage still waiting in the stream; ARGV[3] is what was just flushed.
+# ARGV[4] is the version a reload saw before reading Postgres, the reload is dropped if a flush or
+# purchase changed the balance since (its read may predate the flush and would overstate the balance)
+SYNC_BALANCE_SCRIPT = """
+if ARGV[4] ~= '' and (redis.call('get', KEYS[3]) or '0') ~= ARGV[4] then
+    return false
+end
+if tonumber(ARGV[3]) ~= 0 then
+    redis.call('incr', KEYS[3])
+    redis.call('expire', KEYS[3], ARGV[2])
+end
+local pending = redis.call('decrby', KEYS[2], ARGV[3])
+if pending == 0 then
+    redis.call('del', KEYS[2])
+end
+local balance = tonumber(ARGV[1]) - pending
+redis.call('set', KEYS[1], balance, 'ex', ARGV[2])
+return balance
+"""
+
+
+class CreditService:
+    """
+    Credit debits on the hot path, without the profiles row lock.
+    Balances are mirrored in Redis and debited by a Lua check-and-decrement that also appends the
+    debit to the credits:ledger stream; CreditReconciler flushes the stream to Postgres in batches
+    and re-syncs the mirrored balances from what Postgres returns. Every debit leaves a hold so a
+    failed job can be refunded exactly once. Every balance change is written through to the
+    profile cache, so GET /api/supabase/user shows it right away.
+    """
+
+    def __init__(self, redis_client: redis.Redis, supabase_service: SupabaseService, profile_cache_service: Optional[ProfileCacheService] = None):
+        self.redis_client = redis_client
+        self.supabase_service = supabase_service
+        self.profile_cache_service = profile_cache_service
+        self._reserve = redis_client.register_script(RESERVE_SCRIPT)
+        self._refund = redis_client.register_script(REFUND_SCRIPT)
+        self._sync_balance = redis_client.register_script(SYNC_BALANCE_SCRIPT)
+
+    @staticmethod
+    def _keys(user_id: str) -> Tuple[str, str]:
+        return f"{BALANCE_PREFIX}{user_id}", f"{PENDING_PREFIX}{user_id}"
+
+    async def reserve(self, user_id: str, transaction_type: str, credit_usage: int) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Debits credit_usage from the user.
+        Returns (reservation_id, error_message), the reservation id is what refund() takes.
+        """
+        reservation_id = uuid.uuid4().hex
+        balance_key, pending_key = self._keys(user_id)
+        try:
+            # a reload that raced a flush is dropped, hence a third try
+            for _ in range(3):
+                status, balance = await self._reserve(
+                    keys=[balance_key, pending_key, LEDGER_STREAM_KEY, f"{HOLD_PREFIX}{reservation_id}"],
+                    args=[credit_usage, user_id, transaction_type, reservation_id, settings.CREDIT_HOLD_TTL],
+                )
+                if status == 1:
+                    await self.cache_balance(user_id, balance)
+                    return (reservation_id, None)
+                if status == -1:
+                    return (None, "insufficient_credits")
+                # balance not mirrored yet (or expired), load it and try again
+                if not await self._load_balance(user_id):
+                    return (None, "user_not_found")
+            return (None, "Credit balance unavailable")
+        except Exception as e:
+            error_msg = str(e)
+            print(f"Failed to reserve credits: {error_msg}")
+            traceback.print_exc()
+            return (None, error_msg)
+
+    async def refund(self, reservation_id: str) -> bool:
+        """Gives a reservation back, returns False if it was already refunded (or has expired)"""
+        try:
+            hold = await self.redis_client.hgetall(f"{HOLD_PREFIX}{reservation_id}")
+            if not hold:
+                return False
+            user_id = hold[b"user_id"].decode()
+            balance_key, pending_key = self._keys(user_id)
+            refunded, balance = await self._refund(
+                keys=[f"{HOLD_PREFIX}{reservation_id}", balance_key, pending_key, LEDGER_STREAM_KEY],
+                args=[user_id, int(hold[b"amount"]), f"{reservation_id}:refund", REFUND_TRANSACTION_TYPE],
+            )
+            if refunded:
+                await self.cache_balance(user_id, balance)
+                print(f"Refunded {int(hold[b'amount'])} credits to user {user_id} (reservation {reservation_id})")
+            return bool(refunded)
+        except Exception as e:
+            print(f"Failed to refund reservation {reservation_id}: {e}")
+            traceback.print_exc()
+            return False
+
+    async def sync_balance(self, user_id: str, balance: float, flushed: int = 0, client=None, version: Optional[bytes] = None) -> Optional[int]:
+        """
+        Mirror a balance read from Postgres (after flushed credits of this user's ledger were written).
+        With version (read from VERSION_PREFIX before Postgres was), nothing is written and None is
+        returned if the balance changed in between.
+        """
+        balance_key, pending_key = self._keys(user_id)
+        mirrored = await self._sync_balance(
+            keys=[balance_key, pending_key, f"{VERSION_PREFIX}{user_id}"],
+            args=[int(balance), settings.CREDIT_BALANCE_TTL, flushed, b"" if version is None else version],
+            client=client,
+        )
+        if client is None and mirrored is not None:
+            await self.cache_balance(user_id, mirrored)
+        return mirrored
+
+    async def cache_balance(self, user_id: str, balance: Optional[int]):
+        """Write a mirrored balance through to the profile cache (None: not mirrored, drop the row)"""
+        if not self.profile_cache_service:
+            return
+        if balance is None:
+            await self.profile_cache_service.invalidate(user_id)
+        else:
+            await self.profile_cache_service.update(user_id, credits=balance)
+
+    async def invalidate(self, user_id: str):
+        """Drop the mirrored balance after Postgres changed it directly (purchases), the next debit reloads it"""
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(f"{BALANCE_PREFIX}{user_id}")
+                # a reload already reading Postgres may have missed the change, make it drop its result
+                pipe.incr(f"{VERSION_PREFIX}{user_id}")
+                pipe.expire(f"{VERSION_PREFIX}{user_id}", settings.CREDIT_BALANCE_TTL)
+                await pipe.execute()
+        except Exception as e:
+            print(f"Failed to invalidate credit balance of {user_id}: {e}")
+        if self.profile_cache_service:
+            await self.profile_cache_service.invalidate(user_id)
+
+    async def _load_balance(self, user_id: str) -> bool:
+        version = await self.redis_client.get(f"{VERSION_PREFIX}{user_id}") or b"0"
+        # supabase-py is synchronous, keep the event loop free while it waits
+        user_row = await asyncio.to_thread(self.supabase_service.get_user_row, user_id)
+        if not user_row or not user_row.data:
+            return False
+        if await self.sync_balance(user_id, user_row.data.get("credits") or 0, version=version) is None:
+            print(f"Credit balance of {user_id} changed while it was loaded, not mirroring the stale read")
+        return True
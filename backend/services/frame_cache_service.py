@@ -0,0 +1,106 @@
+import hashlib
+import traceback
+from typing import Optional
+
+import redis.asyncio as redis
+
+from services.storage_service import StorageService
+from utils.env import settings
+from utils.size_lru import SizeBoundedLRU
+
+ENTRY_PREFIX = "framecache:"
+GCS_PREFIX = "cache/frames/"
+
+# first byte of a cached value: stored inline in Redis, or a pointer to a GCS object
+INLINE = b"i"
+GCS = b"g"
+
+
+class FrameCacheService:
+    """
+    Content-addressed cache for the preprocessing results of a video job (annotation descriptions
+    and text-free frames), keyed by SHA-256 of the image bytes plus the prompt and model id.
+    Small values live in Redis, larger frames in GCS with a Redis pointer. Entries expire after
+    FRAME_CACHE_TTL and the least recently used ones are evicted above FRAME_CACHE_MAX_BYTES.
+    Cache errors are logged and treated as misses, they never fail a job.
+    """
+
+    def __init__(self, redis_client: redis.Redis, storage_service: Optional[StorageService]):
+        self.redis_client = redis_client
+        self.storage_service = storage_service
+        self.lru = SizeBoundedLRU(
+            redis_client, ENTRY_PREFIX, settings.FRAME_CACHE_MAX_BYTES, settings.FRAME_CACHE_TTL,
+            on_remove=self._delete_entries, after_remove=self._delete_objects,
+        )
+
+    @staticmethod
+    def cache_key(image: bytes, prompt: str, model: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(hashlib.sha256(image).digest())
+        digest.update(b"\0" + model.encode() + b"\0" + prompt.encode())
+        return digest.hexdigest()
+
+    async def get_annotation(self, image: bytes, prompt: str, model: str) -> Optional[str]:
+        value = await self._get(self.cache_key(image, prompt, model))
+        return value.decode() if value is not None else None
+
+    async def set_annotation(self, image: bytes, prompt: str, model: str, description: str):
+        await self._set(self.cache_key(image, prompt, model), description.encode())
+
+    async def get_frame(self, image: bytes, prompt: str, model: str) -> Optional[bytes]:
+        return await self._get(self.cache_key(image, prompt, model))
+
+    async def set_frame(self, image: bytes, prompt: str, model: str, frame: bytes):
+        await self._set(self.cache_key(image, prompt, model), frame)
+
+    def _gcs_enabled(self) -> bool:
+        return self.storage_service is not None and self.storage_service.bucket is not None
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        try:
+            value = await self.redis_client.get(ENTRY_PREFIX + key)
+            if value is None:
+                return None
+
+            if value[:1] == GCS:
+                data = await self.storage_service.download_file(value[1:].decode()) if self._gcs_enabled() else None
+                if data is None:
+                    await self.lru.remove([key])
+                    return None
+            else:
+                data = value[1:]
+
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                self.lru.touch(pipe, key)
+                pipe.expire(ENTRY_PREFIX + key, settings.FRAME_CACHE_TTL)
+                await pipe.execute()
+            return data
+        except Exception as e:
+            print(f"Frame cache read failed for {key}: {e}")
+            return None
+
+    async def _set(self, key: str, data: bytes):
+        try:
+            if len(data) <= settings.FRAME_CACHE_INLINE_MAX_BYTES:
+                value = INLINE + data
+            elif self._gcs_enabled():
+                object_name = GCS_PREFIX + key
+                await self.storage_service.upload_file(object_name, data, public=False)
+                value = GCS + object_name.encode()
+            else:
+                return
+
+            await self.lru.add(key, len(data), lambda pipe: pipe.set(ENTRY_PREFIX + key, value, ex=settings.FRAME_CACHE_TTL))
+        except Exception as e:
+            print(f"Frame cache write failed for {key}: {e}")
+            traceback.print_exc()
+
+    def _delete_entries(self, pipe, keys: list[str]):
+        pipe.delete(*(ENTRY_PREFIX + key for key in keys))
+
+    async def _delete_objects(self, keys: list[str], sizes: list[int]):
+        # frames above the inline limit were stored in GCS (the Redis pointer may already have expired)
+        if self._gcs_enabled():
+            for key, size in zip(keys, sizes):
+                if size > settings.FRAME_CACHE_INLINE_MAX_BYTES:
+                    await self.storage_service.delete_file(GCS_PREFIX + key)
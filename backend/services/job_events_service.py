@@ -0,0 +1,76 @@
+import asyncio
+import traceback
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import orjson
+import redis.asyncio as redis
+
+CHANNEL_PREFIX = "jobevents:"
+
+
+class JobEventsService:
+    """
+    Cross-instance job status events over Redis pub/sub.
+    Each instance holds a single pattern subscription and routes messages to in-process watcher
+    queues, so thousands of open SSE connections still cost one Redis connection.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis_client = redis_client
+        self._watchers: dict[str, set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, job_id: str, event: dict):
+        await self.redis_client.publish(f"{CHANNEL_PREFIX}{job_id}", orjson.dumps(event))
+
+    @asynccontextmanager
+    async def watch(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Yields a queue receiving every event published for job_id while the context is open"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._watchers.setdefault(job_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(queue)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    async def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.redis_client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                    async for message in pubsub.listen():
+                        if message["type"] == "pmessage":
+                            self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job events subscription dropped, reconnecting: {e}")
+                traceback.print_exc()
+                await asyncio.sleep(1)
+
+    def _dispatch(self, channel: bytes, data: bytes):
+        job_id = channel.decode()[len(CHANNEL_PREFIX):]
+        watchers = self._watchers.get(job_id)
+        if not watchers:
+            return
+        event = orjson.loads(data)
+        for queue in watchers:
+            queue.put_nowait(event)
@@ -0,0 +1,107 @@
+from typing import Optional
+
+import redis.asyncio as redis
+
+from models.job import VideoJobRequest
+
+STREAM_KEY = "jobs:stream"
+GROUP_NAME = "video-workers"
+STREAM_MAX_LEN = 10_000
+INPUT_TTL_SECONDS = 3600
+
+
+class JobQueue:
+    """
+    Durable video job queue on a Redis Stream with a consumer group.
+    Stream entries only carry the job id, the (large) inputs live in a job:{id}:input hash.
+    Entries stay pending until a worker acks them, and entries idle for longer than the
+    visibility timeout are reclaimed by other workers, so jobs survive an instance going away.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis_client = redis_client
+
+    async def ensure_group(self):
+        try:
+            await self.redis_client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def enqueue(self, job_id: str, request: VideoJobRequest):
+        job_input = {
+            "global_context": request.global_context,
+            "custom_prompt": request.custom_prompt,
+            "duration_seconds": request.duration_seconds,
+        }
+        # images are either inline bytes or gs:// references to uploads
+        for field in ("starting_image", "ending_image", "starting_image_uri", "ending_image_uri", "reservation_id", "queued_at"):
+            value = getattr(request, field)
+            if value:
+                job_input[field] = value
+
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(f"job:{job_id}:input", mapping=job_input)
+            pipe.expire(f"job:{job_id}:input", INPUT_TTL_SECONDS)
+            pipe.xadd(STREAM_KEY, {"job_id": job_id}, maxlen=STREAM_MAX_LEN, approximate=True)
+            await pipe.execute()
+
+    async def load_input(self, job_id: str) -> Optional[VideoJobRequest]:
+        job_input = await self.redis_client.hgetall(f"job:{job_id}:input")
+        if not job_input:
+            return None
+        starting_image_uri = job_input.get(b"starting_image_uri")
+        ending_image_uri = job_input.get(b"ending_image_uri")
+        reservation_id = job_input.get(b"reservation_id")
+        queued_at = job_input.get(b"queued_at")
+        return VideoJobRequest(
+            starting_image=job_input.get(b"starting_image"),
+            global_context=job_input[b"global_context"].decode(),
+            custom_prompt=job_input[b"custom_prompt"].decode(),
+            duration_seconds=int(job_input[b"duration_seconds"]),
+            ending_image=job_input.get(b"ending_image"),
+            starting_image_uri=starting_image_uri.decode() if starting_image_uri else None,
+            ending_image_uri=ending_image_uri.decode() if ending_image_uri else None,
+            reservation_id=reservation_id.decode() if reservation_id else None,
+            queued_at=int(queued_at) if queued_at else None,
+        )
+
+    async def read(self, consumer: str, count: int, block_ms: int) -> list[tuple[str, str]]:
+        """Claim up to count new entries for consumer, returns (entry_id, job_id) pairs"""
+        response = await self.redis_client.xreadgroup(
+            GROUP_NAME, consumer, {STREAM_KEY: ">"}, count=count, block=block_ms
+        )
+        if not response:
+            return []
+        return [self._entry(entry) for _, entries in response for entry in entries]
+
+    async def reclaim(self, consumer: str, min_idle_ms: int, count: int) -> list[tuple[str, str]]:
+        """Take over entries other consumers haven't touched for min_idle_ms (crashed or scaled down)"""
+        response = await self.redis_client.xautoclaim(
+            STREAM_KEY, GROUP_NAME, consumer, min_idle_ms, start_id="0-0", count=count
+        )
+        return [self._entry(entry) for entry in response[1] if entry[1]]
+
+    async def heartbeat(self, consumer: str, entry_id: str):
+        """Reset the idle time of an entry we're still working on so it isn't reclaimed"""
+        await self.redis_client.xclaim(STREAM_KEY, GROUP_NAME, consumer, 0, [entry_id], justid=True)
+
+    async def record_attempt(self, job_id: str) -> int:
+        key = f"job:{job_id}:attempts"
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, INPUT_TTL_SECONDS)
+            attempts, _ = await pipe.execute()
+        return attempts
+
+    async def ack(self, entry_id: str, job_id: str):
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.xack(STREAM_KEY, GROUP_NAME, entry_id)
+            pipe.xdel(STREAM_KEY, entry_id)
+            pipe.delete(f"job:{job_id}:input", f"job:{job_id}:attempts")
+            await pipe.execute()
+
+    @staticmethod
+    def _entry(entry) -> tuple[str, str]:
+        entry_id, fields = entry
+        return entry_id.decode(), fields[b"job_id"].decode()
@@ -2,109 +2,252 @@ from datetime import datetime
 from typing import Optional
 from models.job import JobStatus, VideoJobRequest, VideoJob
 from services.vertex_service import VertexService
+from services.job_events_service import JobEventsService
+from services.job_queue import JobQueue, INPUT_TTL_SECONDS
+from services.frame_cache_service import FrameCacheService
+from services.storage_service import StorageService
+from services.credit_service import CreditService
 from utils.prompt_builder import create_video_prompt
+from utils.job_codec import JobRecordCodec
+from utils.image_normalizer import ImageNormalizer, NormalizedImage, sniff_mime_type
 from utils.env import settings
+from utils.metrics import VIDEO_JOB_STAGE_SECONDS
+import dataclasses
+import orjson
 import uuid
-import redis
-import pickle
-import lzma
+import redis.asyncio as redis
 import asyncio
+import time
 import traceback
 
+# sorted set of job ids with a Veo operation in flight, scored by when they're next due for a poll
+INFLIGHT_JOBS_KEY = "jobs:inflight"
+# timelines of the last JOB_TIMELINE_SAMPLES jobs whose video was served, for stage_stats()
+TIMELINES_KEY = "jobs:timelines"
+
+# intervals of a job's stage timeline (stage -> epoch ms, stored with the job) reported by
+# stage_stats() and video_job_stage_duration_seconds: name -> (from stage, to stage)
+STAGE_INTERVALS = {
+    "queue": ("queued", "started"),
+    "prepare": ("started", "analysis_started"),  # loading uploads, normalizing images
+    "analysis": ("analysis_started", "analysis_finished"),
+    "cleaning": ("cleaning_started", "cleaning_finished"),
+    "veo_submit": ("veo_submit_started", "veo_submitted"),
+    "veo": ("veo_submitted", "veo_done"),  # includes up to one poll interval, see OperationPoller
+    "delivery": ("veo_done", "url_served"),
+    "total": ("queued", "url_served"),
+}
+
+# record url_served and sample the timeline once per job, however many clients read it
+URL_SERVED_SCRIPT = """
+if redis.call('set', KEYS[2], 1, 'nx', 'ex', ARGV[3]) == false then
+    return 0
+end
+redis.call('set', KEYS[1], ARGV[1], 'xx', 'keepttl')
+redis.call('lpush', KEYS[3], ARGV[2])
+redis.call('ltrim', KEYS[3], 0, tonumber(ARGV[4]) - 1)
+return 1
+"""
+
+
+def mark_stage(timeline: dict, stage: str):
+    """Record that a job reached a stage now, and observe the intervals it completes"""
+    timeline[stage] = now = int(time.time() * 1000)
+    for name, (start, end) in STAGE_INTERVALS.items():
+        if end == stage and start in timeline:
+            VIDEO_JOB_STAGE_SECONDS.labels(name).observe((now - timeline[start]) / 1000)
+
+ANNOTATION_PROMPT = "Describe any animation annotations you see. Use this description to inform a video director. Be descriptive about location and purpose of the annotations."
+CLEAN_STARTING_FRAME_PROMPT = "Remove all text, captions, subtitles, annotations from this image. Generate a clean version of the image with no text. Keep everything else the exact same."
+CLEAN_ENDING_FRAME_PROMPT = "Remove all text, captions, subtitles, annotations from this image. Generate a clean version of the image with no text. Keep the art/image style the exact same."
+
 class JobService:
-    def __init__(self, vertex_service: VertexService):
+    def __init__(self, vertex_service: VertexService, redis_client: redis.Redis, job_events_service: JobEventsService, job_queue: JobQueue, frame_cache_service: FrameCacheService, storage_service: StorageService, credit_service: Optional[CreditService] = None, image_normalizer: Optional[ImageNormalizer] = None, codec: Optional[JobRecordCodec] = None):
         self.vertex_service = vertex_service
-        self.redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=False)
+        self.redis_client = redis_client
+        self.job_events_service = job_events_service
+        self.job_queue = job_queue
+        self.frame_cache_service = frame_cache_service
+        self.storage_service = storage_service
+        self.credit_service = credit_service
+        self.image_normalizer = image_normalizer or ImageNormalizer(
+            max_workers=settings.IMAGE_NORMALIZE_WORKERS,
+            max_width=settings.IMAGE_MAX_WIDTH,
+            max_height=settings.IMAGE_MAX_HEIGHT,
+            jpeg_quality=settings.IMAGE_JPEG_QUALITY,
+        )
+        self.codec = codec or JobRecordCodec(
+            zstd_threshold=settings.JOB_CODEC_ZSTD_THRESHOLD,
+            read_legacy=settings.JOB_CODEC_READ_LEGACY,
+        )
+        self._url_served = redis_client.register_script(URL_SERVED_SCRIPT)
 
     def _serialize(self, data: dict) -> bytes:
-        """Serialize + compress any data to bytes for Redis storage"""
-        return lzma.compress(pickle.dumps(data))
+        """Encode a job record to bytes for Redis storage"""
+        return self.codec.encode(data)
     
     def _deserialize(self, data: bytes) -> Optional[dict]:
-        """Deserialize + decompress bytes from Redis storage"""
-        if not data:
-            return None
-        return pickle.loads(lzma.decompress(data))
+        """Decode a job record read from Redis"""
+        return self.codec.decode(data)
 
     async def create_video_job(self, request: VideoJobRequest) -> str:
-        """Create a video job and return job_id immediately, processing happens in background"""
+        """Create a video job and return job_id immediately, processing happens in a JobWorker"""
         job_id = str(uuid.uuid4())
+        timeline = {}
+        mark_stage(timeline, "queued")
         
         pending_job = {
             "status": "pending",
-            "job_start_time": datetime.now().isoformat()
+            "job_start_time": datetime.now().isoformat(),
+            "timeline": timeline
         }
-        # Store pending job BEFORE starting background task to avoid 404 race condition
-        self.redis_client.setex(f"job:{job_id}:pending", 300, self._serialize(pending_job))
+        # Store pending job BEFORE queueing it to avoid 404 race condition
+        # (lives as long as the queued input, a job can wait in the queue under load)
+        await self.redis_client.setex(f"job:{job_id}:pending", INPUT_TTL_SECONDS, self._serialize(pending_job))
         
-        # start background task
-        asyncio.create_task(self._process_video_job(job_id, request))
+        await self.job_queue.enqueue(job_id, dataclasses.replace(request, queued_at=timeline["queued"]))
         
         return job_id
     
-    async def _process_video_job(self, job_id: str, request: VideoJobRequest):
-        """Background task that processes the video generation"""
+    async def process_video_job(self, job_id: str, request: VideoJobRequest):
+        """Processes a queued video job up to the Veo submit, called by JobWorker"""
+        timeline = {"queued": request.queued_at} if request.queued_at else {}
+        mark_stage(timeline, "started")
         try:
-            # for parallel tasks
-            tasks = [
-                self.vertex_service.analyze_image_content(
-                    prompt="Describe any animation annotations you see. Use this description to inform a video director. Be descriptive about location and purpose of the annotations.",
-                    image_data=request.starting_image
-                ),
-                self.vertex_service.generate_image_content(
-                    prompt="Remove all text, captions, subtitles, annotations from this image. Generate a clean version of the image with no text. Keep everything else the exact same.",
-                    image=request.starting_image
-                )
-            ]
-            
-            if request.ending_image:
-                tasks.append(
-                    self.vertex_service.generate_image_content(
-                        prompt="Remove all text, captions, subtitles, annotations from this image. Generate a clean version of the image with no text. Keep the art/image style the exact same.",
-                        image=request.ending_image
-                    )
-                )
+            request = await self._load_uploaded_images(request)
+
+            # downsize and re-encode the uploads once, every Vertex call below sends the smaller frames
+            images = await asyncio.gather(*(
+                self.image_normalizer.normalize(image) for image in (request.starting_image, request.ending_image) if image
+            ))
+            starting_image = images[0]
+            ending_image = images[1] if len(images) > 1 else None
+
+            # for parallel tasks (each one is answered from the frame cache on a repeat generation)
+            frames = [self._clean_frame(starting_image, CLEAN_STARTING_FRAME_PROMPT)]
+            if ending_image:
+                frames.append(self._clean_frame(ending_image, CLEAN_ENDING_FRAME_PROMPT))
             
-            results = await asyncio.gather(*tasks)
-            annotation_description = results[0]
-            starting_frame = results[1]
-            ending_frame = results[2] if len(results) > 2 else None
+            annotation_description, frames = await asyncio.gather(
+                self._stage(timeline, "analysis", self._describe_annotations(starting_image)),
+                self._stage(timeline, "cleaning", asyncio.gather(*frames)),
+            )
+            starting_frame = frames[0]
+            ending_frame = frames[1] if len(frames) > 1 else None
 
+            mark_stage(timeline, "veo_submit_started")
             operation = await self.vertex_service.generate_video_content(
                 create_video_prompt(request.custom_prompt, request.global_context, annotation_description),
-                starting_frame,
-                ending_frame,
-                request.duration_seconds
+                starting_frame.data,
+                ending_frame.data if ending_frame else None,
+                request.duration_seconds,
+                image_mime_type=starting_frame.mime_type,
+                ending_image_mime_type=ending_frame.mime_type if ending_frame else None
             )
+            mark_stage(timeline, "veo_submitted")
             
             # Store only the operation name (string) instead of full operation object to save space
             job = {
                 "job_id": job_id,
                 "operation_name": operation.name,
                 "job_start_time": datetime.now().isoformat(),
+                "reservation_id": request.reservation_id,
+                "timeline": timeline,
                 "metadata": {
                     "annotation_description": annotation_description
                 }
             }
             
-            self.redis_client.delete(f"job:{job_id}:pending")
-            self.redis_client.setex(f"job:{job_id}", 300, self._serialize(job))
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(f"job:{job_id}:pending")
+                pipe.setex(f"job:{job_id}", 300, self._serialize(job))
+                # hand the operation to the background poller (see OperationPoller)
+                pipe.zadd(INFLIGHT_JOBS_KEY, {job_id: time.time() + settings.VEO_POLL_INITIAL_DELAY})
+                await pipe.execute()
             
         except Exception as e:
             # debug stuff
             print(f"Error processing video job {job_id}: {e}")
             traceback.print_exc()
-            error_job = {
-                "status": "error",
-                "error": str(e),
-                "job_start_time": datetime.now().isoformat()
-            }
-            self.redis_client.delete(f"job:{job_id}:pending")
-            self.redis_client.setex(f"job:{job_id}:error", 300, self._serialize(error_job))
+            await self.fail_video_job(job_id, str(e), request.reservation_id)
+
+    async def _stage(self, timeline: dict, stage: str, awaitable):
+        """Await a step of the job, recording {stage}_started / {stage}_finished around it"""
+        mark_stage(timeline, f"{stage}_started")
+        result = await awaitable
+        mark_stage(timeline, f"{stage}_finished")
+        return result
+
+    async def _load_uploaded_images(self, request: VideoJobRequest) -> VideoJobRequest:
+        """Fetch images the client uploaded straight to GCS (inside GCP, instead of through the API)"""
+        uris = [request.starting_image_uri, request.ending_image_uri]
+        if not any(uris):
+            return request
+
+        async def load(uri: Optional[str]) -> Optional[bytes]:
+            if not uri:
+                return None
+            data = await self.storage_service.download_file(self.storage_service.object_name_from_url(uri))
+            if data is None:
+                raise Exception(f"Uploaded image {uri} not found")
+            return data
+
+        starting_image, ending_image = await asyncio.gather(*(load(uri) for uri in uris))
+        return dataclasses.replace(
+            request,
+            starting_image=starting_image or request.starting_image,
+            ending_image=ending_image or request.ending_image,
+        )
+
+    async def _describe_annotations(self, image: NormalizedImage) -> str:
+        model = VertexService.ANALYSIS_MODEL
+        description = await self.frame_cache_service.get_annotation(image.data, ANNOTATION_PROMPT, model)
+        if description is None:
+            description = await self.vertex_service.analyze_image_content(prompt=ANNOTATION_PROMPT, image_data=image.data, mime_type=image.mime_type)
+            await self.frame_cache_service.set_annotation(image.data, ANNOTATION_PROMPT, model, description)
+        return description
+
+    async def _clean_frame(self, image: NormalizedImage, prompt: str) -> NormalizedImage:
+        model = VertexService.IMAGE_MODEL
+        frame = await self.frame_cache_service.get_frame(image.data, prompt, model)
+        if frame is None:
+            generated = await self.vertex_service.generate_image_content(prompt=prompt, image=image.data, mime_type=image.mime_type)
+            # Gemini answers with a full size PNG, shrink it to a JPEG at Veo's output size for the Veo request (and the cache)
+            frame = (await self.image_normalizer.normalize(
+                generated, flatten=True, max_width=settings.VEO_FRAME_MAX_WIDTH, max_height=settings.VEO_FRAME_MAX_HEIGHT,
+            )).data
+            await self.frame_cache_service.set_frame(image.data, prompt, model, frame)
+        return NormalizedImage(frame, sniff_mime_type(frame))
+
+    async def fail_video_job(self, job_id: str, error: str, reservation_id: Optional[str] = None):
+        """Move a job that never reached Veo to the error state (and refund its credits)"""
+        error_job = {
+            "status": "error",
+            "error": error,
+            "job_start_time": datetime.now().isoformat()
+        }
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(f"job:{job_id}:pending")
+            pipe.setex(f"job:{job_id}:error", 300, self._serialize(error_job))
+            await pipe.execute()
+        await self._refund(reservation_id)
+        await self.job_events_service.publish(job_id, JobStatus(
+            status="error",
+            job_start_time=datetime.fromisoformat(error_job["job_start_time"]),
+            error=error_job["error"]
+        ).to_dict())
+
+    async def _refund(self, reservation_id: Optional[str]):
+        if reservation_id and self.credit_service:
+            await self.credit_service.refund(reservation_id)
 
     async def get_video_job_status(self, job_id: str) -> JobStatus:
+        # Fetch all three job states in one round trip
+        pending_data, error_data, job_data = await self.redis_client.mget(
+            f"job:{job_id}:pending", f"job:{job_id}:error", f"job:{job_id}"
+        )
+
         # Check if job is still pending
-        pending_data = self.redis_client.get(f"job:{job_id}:pending")
         if pending_data:
             pending_job = self._deserialize(pending_data)
             return JobStatus(
@@ -115,7 +258,6 @@ class JobService:
             )
         
         # Check if job failed
-        error_data = self.redis_client.get(f"job:{job_id}:error")
         if error_data:
             error_job = self._deserialize(error_data)
             return JobStatus(
@@ -126,33 +268,96 @@ class JobService:
                 error=error_job.get("error")
             )
         
-        # Retrieve actual job from Redis
-        job_data = self.redis_client.get(f"job:{job_id}")
-
         if job_data is None: # if job not found
             return None
 
+        # Cache read, the Veo operation itself is refreshed by the background poller
+        # (the first read of a finished job also records url_served)
         job = self._deserialize(job_data)
+        await self._record_url_served(job_id, job)
+        return self._job_status(job)
 
-        # Use operation_name instead of full operation object
-        result = await self.vertex_service.get_video_status_by_name(job["operation_name"])
+    async def mark_url_served(self, job_id: str):
+        """Record url_served for a finished job whose URL was pushed to a client (SSE)"""
+        job = self._deserialize(await self.redis_client.get(f"job:{job_id}"))
+        if job is not None:
+            await self._record_url_served(job_id, job)
+
+    async def _record_url_served(self, job_id: str, job: dict):
+        timeline = job.get("timeline")
+        if job.get("status") != "done" or timeline is None or "url_served" in timeline:
+            return
+        mark_stage(timeline, "url_served")
+        await self._url_served(
+            keys=[f"job:{job_id}", f"job:{job_id}:served", TIMELINES_KEY],
+            args=[self._serialize(job), orjson.dumps(timeline), 300, settings.JOB_TIMELINE_SAMPLES],
+        )
+
+    async def stage_stats(self) -> dict:
+        """p50/p95 in ms of every stage interval over the last JOB_TIMELINE_SAMPLES served jobs"""
+        timelines = [orjson.loads(raw) for raw in await self.redis_client.lrange(TIMELINES_KEY, 0, -1)]
+        stages = {}
+        for name, (start, end) in STAGE_INTERVALS.items():
+            durations = sorted(t[end] - t[start] for t in timelines if start in t and end in t)
+            if durations:
+                stages[name] = {
+                    "count": len(durations),
+                    "p50": durations[len(durations) // 2],
+                    "p95": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                }
+        return {"jobs": len(timelines), "stages_ms": stages}
 
-        ret = JobStatus(
-            status=result.status,
+    def _job_status(self, job: dict) -> JobStatus:
+        metadata = job.get("metadata")
+        timeline = job.get("timeline")
+        if timeline:
+            # ms since the job was queued, the stored absolute times stay internal
+            origin = timeline.get("queued", min(timeline.values()))
+            metadata = {**(metadata or {}), "timeline": {stage: at - origin for stage, at in timeline.items()}}
+        return JobStatus(
+            status=job.get("status", "waiting"),
             job_start_time=datetime.fromisoformat(job["job_start_time"]),
-            job_end_time=datetime.now() if result.status == "done" else None,
-            video_url=result.video_url.replace("gs://", "https://storage.googleapis.com/") if result.video_url else None,
-            metadata=job.get("metadata")
+            job_end_time=datetime.fromisoformat(job["job_end_time"]) if job.get("job_end_time") else None,
+            video_url=job.get("video_url"),
+            error=job.get("error"),
+            metadata=metadata
         )
 
-        if result.status == "done":
-            self.redis_client.delete(f"job:{job_id}") # clean from redis
+    async def refresh_video_job(self, job_id: str) -> Optional[JobStatus]:
+        """
+        Check the Veo operation of an in-flight job once and store its final state in the job record.
+        Returns the job status, or None if the job record has expired.
+        """
+        job = self._deserialize(await self.redis_client.get(f"job:{job_id}"))
+        if job is None:
+            return None
+        if job.get("status") in ("done", "error"):
+            return self._job_status(job)
+
+        result = await self.vertex_service.get_video_status_by_name(job["operation_name"])
+        if result.status == "waiting":
+            return self._job_status(job)
+
+        job["status"] = result.status
+        job["job_end_time"] = datetime.now().isoformat()
+        if "timeline" in job:
+            mark_stage(job["timeline"], "veo_done")
+        if result.video_url:
+            job["video_url"] = result.video_url.replace("gs://", "https://storage.googleapis.com/")
+        if result.error:
+            job["error"] = result.error
+        if result.status == "error":
+            await self._refund(job.get("reservation_id"))
 
-        return ret
+        # keep the finished record around so every client polling this job can read it
+        await self.redis_client.setex(f"job:{job_id}", 300, self._serialize(job))
+        status = self._job_status(job)
+        await self.job_events_service.publish(job_id, status.to_dict())
+        return status
 
     async def redis_health_check(self) -> bool:
         try:
-            self.redis_client.ping()
+            await self.redis_client.ping()
             return True
         except redis.RedisError:
             return False
@@ -0,0 +1,108 @@
+import asyncio
+import socket
+import time
+import traceback
+import uuid
+from typing import Optional
+
+from services.job_queue import JobQueue
+from services.job_service import JobService
+from utils.env import settings
+from utils.metrics import BACKGROUND_JOBS_IN_FLIGHT
+
+# well under REDIS_SOCKET_TIMEOUT, or an idle XREADGROUP BLOCK hits the socket read timeout
+READ_BLOCK_MS = int(min(2.0, settings.REDIS_SOCKET_TIMEOUT / 2) * 1000)
+
+
+class JobWorker:
+    """
+    Bounded pool of video job workers consuming the JobQueue stream.
+    At most `concurrency` jobs run at once per process, which is the back-pressure against Vertex.
+    """
+
+    def __init__(self, job_service: JobService, job_queue: JobQueue, concurrency: int):
+        self.job_service = job_service
+        self.job_queue = job_queue
+        self.concurrency = concurrency
+        self.consumer = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.visibility_timeout_ms = settings.JOB_QUEUE_VISIBILITY_TIMEOUT * 1000
+        self._active: set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if not self._task:
+            await self.job_queue.ensure_group()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop taking new jobs and wait for the running ones (unacked jobs are reclaimed elsewhere)"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._active:
+            await asyncio.wait(self._active, timeout=settings.JOB_QUEUE_VISIBILITY_TIMEOUT)
+
+    async def _run(self):
+        last_reclaim = 0.0
+        while True:
+            try:
+                if len(self._active) >= self.concurrency:
+                    await asyncio.wait(self._active, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                free = self.concurrency - len(self._active)
+                entries = []
+                if time.monotonic() - last_reclaim > settings.JOB_QUEUE_VISIBILITY_TIMEOUT / 2:
+                    last_reclaim = time.monotonic()
+                    entries = await self.job_queue.reclaim(self.consumer, self.visibility_timeout_ms, free)
+                if not entries:
+                    entries = await self.job_queue.read(self.consumer, free, READ_BLOCK_MS)
+                if not entries:
+                    # BLOCK already waited, this only avoids spinning if the server returns early
+                    await asyncio.sleep(0.1)
+
+                for entry_id, job_id in entries:
+                    task = asyncio.create_task(self._handle(entry_id, job_id))
+                    self._active.add(task)
+                    task.add_done_callback(self._active.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job worker loop error: {e}")
+                traceback.print_exc()
+                await asyncio.sleep(1)
+
+    async def _handle(self, entry_id: str, job_id: str):
+        heartbeat = asyncio.create_task(self._heartbeat(entry_id))
+        BACKGROUND_JOBS_IN_FLIGHT.labels("video_job").inc()
+        try:
+            attempts = await self.job_queue.record_attempt(job_id)
+            request = await self.job_queue.load_input(job_id)
+            if attempts > settings.JOB_QUEUE_MAX_ATTEMPTS:
+                await self.job_service.fail_video_job(
+                    job_id, f"Job abandoned after {attempts - 1} attempts", request.reservation_id if request else None
+                )
+            elif request is None:
+                await self.job_service.fail_video_job(job_id, "Job input expired before it was processed")
+            else:
+                await self.job_service.process_video_job(job_id, request)
+            await self.job_queue.ack(entry_id, job_id)
+        except Exception as e:
+            # leave the entry pending, it's retried once the visibility timeout passes
+            print(f"Failed to handle queued job {job_id}: {e}")
+            traceback.print_exc()
+        finally:
+            heartbeat.cancel()
+            BACKGROUND_JOBS_IN_FLIGHT.labels("video_job").dec()
+
+    async def _heartbeat(self, entry_id: str):
+        while True:
+            await asyncio.sleep(settings.JOB_QUEUE_VISIBILITY_TIMEOUT / 3)
+            try:
+                await self.job_queue.heartbeat(self.consumer, entry_id)
+            except Exception as e:
+                print(f"Job heartbeat failed for {entry_id}: {e}")
@@ -0,0 +1,79 @@
+import traceback
+from typing import Optional
+
+import redis.asyncio as redis
+
+from services.storage_service import StorageService
+from utils.env import settings
+from utils.size_lru import SizeBoundedLRU
+
+INDEX_PREFIX = "mergecache:"
+DURATIONS_KEY = "mergecache:durations"  # hash merge key -> seconds, needed to concat it as a prefix
+
+# merged videos are stored under their merge key
+MERGED_PREFIX = "videos/merged/"
+
+
+def merged_object_name(key: str) -> str:
+    return f"{MERGED_PREFIX}{key}.mp4"
+
+
+class MergeCacheService:
+    """
+    Redis index of the merged videos in GCS, keyed by the merge key of their ordered segment list.
+    Every merge is a potential prefix of a later one (storyboard paths grow one clip at a time), so
+    VideoMergeService looks up the longest cached prefix and only concatenates what's new.
+    Entries unused for MERGE_CACHE_TTL and the least recently used ones above MERGE_CACHE_MAX_BYTES
+    are evicted along with their objects. Index errors are logged and treated as misses.
+    """
+
+    def __init__(self, redis_client: redis.Redis, storage_service: StorageService):
+        self.redis_client = redis_client
+        self.storage_service = storage_service
+        self.lru = SizeBoundedLRU(
+            redis_client, INDEX_PREFIX, settings.MERGE_CACHE_MAX_BYTES, settings.MERGE_CACHE_TTL,
+            on_remove=lambda pipe, keys: pipe.hdel(DURATIONS_KEY, *keys), after_remove=self._delete_objects,
+        )
+
+    async def longest_prefix(self, keys: list[str]) -> Optional[tuple[int, float]]:
+        """Index into keys and duration of the longest cached merge (keys are ordered by prefix length)"""
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.zscore(self.lru.lru_key, key)
+                pipe.hmget(DURATIONS_KEY, keys)
+                *scores, durations = await pipe.execute()
+        except Exception as e:
+            print(f"Merge cache lookup failed: {e}")
+            return None
+
+        for i in reversed(range(len(keys))):
+            if durations[i] is not None and self.lru.is_fresh(scores[i]):
+                return i, float(durations[i])
+        return None
+
+    async def touch(self, key: str):
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                self.lru.touch(pipe, key)
+                await pipe.execute()
+        except Exception as e:
+            print(f"Merge cache touch failed for {key}: {e}")
+
+    async def add(self, key: str, size: int, duration: Optional[float]):
+        def store_duration(pipe):
+            if duration is not None:
+                pipe.hset(DURATIONS_KEY, key, duration)
+
+        try:
+            await self.lru.add(key, size, store_duration)
+        except Exception as e:
+            print(f"Merge cache write failed for {key}: {e}")
+            traceback.print_exc()
+
+    async def remove(self, keys: list[str]):
+        await self.lru.remove(keys)
+
+    async def _delete_objects(self, keys: list[str], sizes: list[int]):
+        for key in keys:
+            await self.storage_service.delete_file(merged_object_name(key))
@@ -0,0 +1,103 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class MergeQueueFull(Exception):
+    """Raised when a merge can't be admitted, retry_after is a hint in seconds for the client"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MergeScheduler:
+    """
+    Admission control for ffmpeg merges. At most `concurrency` merges run at once, waiting merges
+    are queued per user and served round robin so one user's burst can't starve everyone else,
+    and new merges are rejected with a retry hint once the queue is too deep to serve them in time.
+    """
+
+    def __init__(self, concurrency: int, max_queue_depth: int, max_queued_per_user: int):
+        self.concurrency = concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_queued_per_user = max_queued_per_user
+        self._running = 0
+        self._queues: dict[str, deque[asyncio.Future]] = {}
+        self._turns: deque[str] = deque()  # users with waiting merges, in serving order
+        self._waiting = 0
+        # moving average of merge durations, for Retry-After estimates
+        self._average_seconds = 10.0
+
+    @asynccontextmanager
+    async def slot(self, user_id: str) -> AsyncIterator[None]:
+        """Wait for a merge slot (raises MergeQueueFull if the merge can't be admitted)"""
+        await self._acquire(user_id)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._average_seconds = 0.8 * self._average_seconds + 0.2 * (time.monotonic() - start)
+            self._release()
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        return max(1, math.ceil((self._waiting / self.concurrency + 1) * self._average_seconds))
+
+    async def _acquire(self, user_id: str):
+        if self._running < self.concurrency and not self._waiting:
+            self._running += 1
+            return
+
+        queue = self._queues.get(user_id)
+        if self._waiting >= self.max_queue_depth:
+            raise MergeQueueFull("Too many merges queued, try again later", self.retry_after())
+        if queue is not None and len(queue) >= self.max_queued_per_user:
+            raise MergeQueueFull("Too many of your merges are queued, try again later", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+            self._turns.append(user_id)
+        queue.append(waiter)
+        self._waiting += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as we were cancelled, pass it on
+                self._release()
+            else:
+                self._discard(user_id, waiter)
+            raise
+
+    def _release(self):
+        self._running -= 1
+        while self._turns and self._running < self.concurrency:
+            user_id = self._turns.popleft()
+            queue = self._queues[user_id]
+            waiter = queue.popleft()
+            self._waiting -= 1
+            if queue:
+                self._turns.append(user_id)
+            else:
+                del self._queues[user_id]
+            # a waiter cancelled in this loop iteration hasn't run its except yet, skip it
+            # (like asyncio.Semaphore) rather than handing it a slot nobody will release
+            if waiter.done():
+                continue
+            self._running += 1
+            waiter.set_result(None)
+
+    def _discard(self, user_id: str, waiter: asyncio.Future):
+        queue = self._queues.get(user_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self._waiting -= 1
+        if not queue:
+            del self._queues[user_id]
+            self._turns.remove(user_id)
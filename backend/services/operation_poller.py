@@ -0,0 +1,94 @@
+import asyncio
+import time
+import traceback
+import uuid
+from datetime import datetime
+from typing import Optional
+
+import redis.asyncio as redis
+
+from services.job_service import INFLIGHT_JOBS_KEY, JobService
+from utils.env import settings
+from utils.metrics import BACKGROUND_JOBS_IN_FLIGHT
+
+LEADER_KEY = "jobs:poller:leader"
+LEADER_TTL_MS = 10_000
+TICK_SECONDS = 1.0
+BATCH_SIZE = 100
+
+# extend the lease only if we still own it
+RENEW_LEADERSHIP_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class OperationPoller:
+    """
+    Background task that refreshes in-flight Veo operations so status reads never hit Vertex.
+    Every instance runs one, but only the holder of a Redis lease polls, so Vertex sees one
+    operations.get per job per interval no matter how many instances or clients there are.
+    """
+
+    def __init__(self, job_service: JobService, redis_client: redis.Redis):
+        self.job_service = job_service
+        self.redis_client = redis_client
+        self.instance_id = uuid.uuid4().hex
+        self.semaphore = asyncio.Semaphore(settings.VEO_POLL_CONCURRENCY)
+        self._renew_leadership = redis_client.register_script(RENEW_LEADERSHIP_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # let another instance take over right away instead of waiting for the lease to expire
+        await self._renew_leadership(keys=[LEADER_KEY], args=[self.instance_id, 1])
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._is_leader():
+                    await self._poll_due()
+            except Exception as e:
+                print(f"Operation poller error: {e}")
+                traceback.print_exc()
+            await asyncio.sleep(TICK_SECONDS)
+
+    async def _is_leader(self) -> bool:
+        if await self._renew_leadership(keys=[LEADER_KEY], args=[self.instance_id, LEADER_TTL_MS]):
+            return True
+        return bool(await self.redis_client.set(LEADER_KEY, self.instance_id, nx=True, px=LEADER_TTL_MS))
+
+    async def _poll_due(self):
+        job_ids = await self.redis_client.zrangebyscore(INFLIGHT_JOBS_KEY, "-inf", time.time(), start=0, num=BATCH_SIZE)
+        await asyncio.gather(*(self._poll_job(job_id.decode()) for job_id in job_ids))
+
+    async def _poll_job(self, job_id: str):
+        async with self.semaphore:
+            try:
+                with BACKGROUND_JOBS_IN_FLIGHT.labels("veo_poll").track_inprogress():
+                    status = await self.job_service.refresh_video_job(job_id)
+            except Exception as e:
+                print(f"Failed to refresh video job {job_id}: {e}")
+                await self.redis_client.zadd(INFLIGHT_JOBS_KEY, {job_id: time.time() + settings.VEO_POLL_MAX_INTERVAL})
+                return
+
+        if status is None or status.status in ("done", "error"):
+            await self.redis_client.zrem(INFLIGHT_JOBS_KEY, job_id)
+            return
+
+        # poll young jobs often and back off for long running ones (~1/10th of the job's age)
+        age = (datetime.now() - status.job_start_time).total_seconds()
+        delay = min(settings.VEO_POLL_MAX_INTERVAL, max(settings.VEO_POLL_MIN_INTERVAL, age / 10))
+        await self.redis_client.zadd(INFLIGHT_JOBS_KEY, {job_id: time.time() + delay})
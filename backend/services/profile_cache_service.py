@@ -0,0 +1,153 @@
+import asyncio
+import traceback
+from typing import Optional
+
+import orjson
+import redis.asyncio as redis
+
+from services.supabase_service import SupabaseService
+from utils.env import settings
+from utils.ttl_cache import TTLCache
+
+PROFILE_PREFIX = "profile:"  # hash of the profiles row, one orjson value per column
+VERSION_PREFIX = "profile:version:"  # bumped by every write, a load only stores what it read if unchanged
+INVALIDATE_CHANNEL = "profilecache:invalidate"
+
+# store a row loaded from Postgres unless a write happened since we read the version
+STORE_SCRIPT = """
+if (redis.call('get', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('del', KEYS[1])
+redis.call('hset', KEYS[1], unpack(ARGV, 3))
+redis.call('expire', KEYS[1], ARGV[2])
+return 1
+"""
+
+# write-through: patch the cached row if there is one, and bump the version either way
+UPDATE_SCRIPT = """
+redis.call('incr', KEYS[2])
+redis.call('expire', KEYS[2], ARGV[1])
+if #ARGV > 1 and redis.call('exists', KEYS[1]) == 1 then
+    redis.call('hset', KEYS[1], unpack(ARGV, 2))
+else
+    redis.call('del', KEYS[1])
+end
+return 1
+"""
+
+
+class ProfileCacheService:
+    """
+    Two level cache of profiles rows for GET /api/supabase/user: an in-process TTLCache
+    (PROFILE_CACHE_LOCAL_TTL) in front of a Redis hash (PROFILE_CACHE_TTL).
+    Credit and plan writes update or invalidate the Redis copy and broadcast the user id, so every
+    instance drops its local copy. Hit/miss counters are kept per instance (see stats()).
+    """
+
+    def __init__(self, redis_client: redis.Redis, supabase_service: SupabaseService):
+        self.redis_client = redis_client
+        self.supabase_service = supabase_service
+        self.local = TTLCache(max_size=settings.PROFILE_CACHE_LOCAL_SIZE, default_ttl=settings.PROFILE_CACHE_LOCAL_TTL)
+        self.counters = {"local_hits": 0, "redis_hits": 0, "misses": 0, "updates": 0, "invalidations": 0}
+        self._store = redis_client.register_script(STORE_SCRIPT)
+        self._update = redis_client.register_script(UPDATE_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        """The user's profiles row, None if there is none"""
+        profile = self.local.get(user_id)
+        if profile is not None:
+            self.counters["local_hits"] += 1
+            return profile
+
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.hgetall(f"{PROFILE_PREFIX}{user_id}")
+                pipe.get(f"{VERSION_PREFIX}{user_id}")
+                cached, version = await pipe.execute()
+        except Exception as e:
+            print(f"Profile cache read failed for {user_id}: {e}")
+            cached, version = None, None
+
+        if cached:
+            self.counters["redis_hits"] += 1
+            profile = {key.decode(): orjson.loads(value) for key, value in cached.items()}
+            self.local.set(user_id, profile)
+            return profile
+
+        self.counters["misses"] += 1
+        # supabase-py is synchronous, keep the event loop free while it waits
+        res = await asyncio.to_thread(self.supabase_service.get_user_row, user_id)
+        if not res or not res.data:
+            return None
+        profile = res.data
+
+        try:
+            fields = [item for key, value in profile.items() for item in (key, orjson.dumps(value))]
+            stored = await self._store(
+                keys=[f"{PROFILE_PREFIX}{user_id}", f"{VERSION_PREFIX}{user_id}"],
+                args=[version or b"", settings.PROFILE_CACHE_TTL, *fields],
+            )
+            # a write raced with the load, serve what we read but don't cache it
+            if stored:
+                self.local.set(user_id, profile)
+        except Exception as e:
+            print(f"Profile cache write failed for {user_id}: {e}")
+        return profile
+
+    async def update(self, user_id: str, **fields):
+        """Write-through for a known change (e.g. credits=new_balance), other columns stay cached"""
+        self.counters["updates"] += 1
+        await self._write(user_id, [item for key, value in fields.items() for item in (key, orjson.dumps(value))])
+
+    async def invalidate(self, user_id: str):
+        """Drop the cached row after a write whose result we don't know"""
+        self.counters["invalidations"] += 1
+        await self._write(user_id, [])
+
+    async def _write(self, user_id: str, fields: list):
+        self.local.delete(user_id)
+        try:
+            await self._update(
+                keys=[f"{PROFILE_PREFIX}{user_id}", f"{VERSION_PREFIX}{user_id}"],
+                args=[settings.PROFILE_CACHE_TTL, *fields],
+            )
+            await self.redis_client.publish(INVALIDATE_CHANNEL, user_id)
+        except Exception as e:
+            print(f"Profile cache invalidation failed for {user_id}: {e}")
+
+    def stats(self) -> dict:
+        reads = self.counters["local_hits"] + self.counters["redis_hits"] + self.counters["misses"]
+        hits = reads - self.counters["misses"]
+        return {**self.counters, "hit_ratio": hits / reads if reads else None, "local_entries": len(self.local)}
+
+    async def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATE_CHANNEL)
+                    # messages may have been missed while (re)connecting
+                    self.local.clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.local.delete(message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Profile cache listener error, resubscribing: {e}")
+                traceback.print_exc()
+                await asyncio.sleep(1)
@@ -1,7 +1,28 @@
 from google.cloud import storage
+from google.api_core.exceptions import NotFound
+from google.cloud.storage.retry import DEFAULT_RETRY
+from google.auth.credentials import Signing
+from google.auth.transport.requests import Request as AuthRequest
+from datetime import timedelta
+from typing import AsyncIterator, BinaryIO, Optional, Union
 from utils.env import settings
+from utils.metrics import timed
+from urllib.parse import unquote, urlparse
+import asyncio
+import io
 import os
 
+# resumable upload chunk size, must be a multiple of 256 KiB
+STREAM_CHUNK_SIZE = 2 * 1024 * 1024
+# bytes uploads above this size go through a resumable upload instead of a single request
+RESUMABLE_THRESHOLD = 8 * 1024 * 1024
+# chunks buffered between the producer and the uploader thread
+STREAM_QUEUE_SIZE = 2
+# objects uploaded by clients through signed URLs live under uploads/{user_id}/
+UPLOADS_PREFIX = "uploads/"
+
+UploadData = Union[bytes, BinaryIO, AsyncIterator[bytes]]
+
 class StorageService:
     def __init__(self):
         # Only initialize if bucket name is configured
@@ -44,20 +65,182 @@ class StorageService:
             self.client = None
             self.bucket = None
 
-    async def upload_file(self, item_name: str, file_data: bytes):
+    @timed("gcs")
+    async def upload_file(self, item_name: str, file_data: UploadData, public: bool = True, content_type: Optional[str] = None):
+        """
+        Upload bytes, a binary file-like object or an async iterator of chunks, off the event loop.
+        Bytes above RESUMABLE_THRESHOLD, file-like objects and streams go through a chunked resumable
+        upload, so memory stays bounded. Requests are retried with the client's exponential backoff,
+        which is safe as the same bytes are rewritten to the same object.
+        Returns the public URL, or a gs:// URI when public=False.
+        """
         if not self.bucket:
             raise ValueError("Google Cloud Storage not configured. Set GOOGLE_CLOUD_BUCKET_NAME in .env")
         
         blob = self.bucket.blob(item_name)
-        blob.upload_from_string(file_data)
+        if isinstance(file_data, (bytes, bytearray, memoryview)):
+            if len(file_data) > RESUMABLE_THRESHOLD:
+                blob.chunk_size = STREAM_CHUNK_SIZE
+                await asyncio.to_thread(
+                    blob.upload_from_file, io.BytesIO(file_data), size=len(file_data), content_type=content_type, retry=DEFAULT_RETRY
+                )
+            else:
+                await asyncio.to_thread(blob.upload_from_string, file_data, content_type=content_type, retry=DEFAULT_RETRY)
+        elif hasattr(file_data, "read"):
+            # size unknown, always resumable
+            blob.chunk_size = STREAM_CHUNK_SIZE
+            await asyncio.to_thread(blob.upload_from_file, file_data, content_type=content_type, retry=DEFAULT_RETRY)
+        else:
+            await self._upload_stream(blob, file_data, content_type)
+
+        if not public:
+            return f"gs://{self.bucket.name}/{item_name}"
         
         # Try to make the blob publicly readable
         # If uniform bucket-level access is enabled, this will fail
         try:
-            blob.make_public()
+            await asyncio.to_thread(blob.make_public)
             return blob.public_url
         except Exception:
             # If uniform bucket-level access is enabled, return the public URL format
             # Format: https://storage.googleapis.com/{bucket_name}/{object_name}
             bucket_name = self.bucket.name
             return f"https://storage.googleapis.com/{bucket_name}/{item_name}"
+
+    async def _upload_stream(self, blob: storage.Blob, chunks: AsyncIterator[bytes], content_type: Optional[str]):
+        """
+        Upload an async stream of chunks with a GCS resumable upload while it's being produced.
+        Memory stays bounded (upload chunk + a couple of queued chunks) whatever the total size.
+        If the producer fails the upload is abandoned and no object is created.
+        """
+        writer = blob.open("wb", chunk_size=STREAM_CHUNK_SIZE, content_type=content_type, retry=DEFAULT_RETRY)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+
+        async def produce():
+            try:
+                async for chunk in chunks:
+                    await queue.put(chunk)
+                await queue.put(None)
+            finally:
+                # close the source right away (e.g. kills ffmpeg) instead of whenever it's collected
+                if hasattr(chunks, "aclose"):
+                    await chunks.aclose()
+
+        async def upload():
+            while (chunk := await queue.get()) is not None:
+                await asyncio.to_thread(writer.write, chunk)
+
+        producer = asyncio.create_task(produce())
+        uploader = asyncio.create_task(upload())
+        try:
+            await asyncio.gather(producer, uploader)
+        except BaseException:
+            # either side failing (or us being cancelled) abandons the upload before it's finalized
+            producer.cancel()
+            uploader.cancel()
+            await asyncio.gather(producer, uploader, return_exceptions=True)
+            raise
+        await asyncio.to_thread(writer.close)
+
+    @timed("gcs")
+    async def download_file(self, item_name: str) -> Optional[bytes]:
+        """Returns the object's bytes, or None if it doesn't exist"""
+        if not self.bucket:
+            raise ValueError("Google Cloud Storage not configured. Set GOOGLE_CLOUD_BUCKET_NAME in .env")
+        try:
+            return await asyncio.to_thread(self.bucket.blob(item_name).download_as_bytes)
+        except NotFound:
+            return None
+
+    @timed("gcs")
+    async def delete_file(self, item_name: str):
+        if not self.bucket:
+            raise ValueError("Google Cloud Storage not configured. Set GOOGLE_CLOUD_BUCKET_NAME in .env")
+        try:
+            await asyncio.to_thread(self.bucket.blob(item_name).delete)
+        except NotFound:
+            pass
+
+    def object_name_from_url(self, url: str) -> Optional[str]:
+        """Object name for a gs:// or storage.googleapis.com URL pointing into our bucket, else None"""
+        if not self.bucket:
+            return None
+        parsed = urlparse(url)
+        if parsed.scheme == "gs":
+            bucket_name, path = parsed.netloc, parsed.path.lstrip("/")
+        elif parsed.netloc == "storage.googleapis.com":
+            bucket_name, _, path = parsed.path.lstrip("/").partition("/")
+        else:
+            return None
+        if bucket_name != self.bucket.name or not path:
+            return None
+        return unquote(path)
+
+    async def get_generation(self, item_name: str) -> Optional[int]:
+        """Current generation of an object (changes whenever it's overwritten), None if it doesn't exist"""
+        blob = await self.get_file_info(item_name)
+        return blob.generation if blob is not None else None
+
+    @timed("gcs")
+    async def get_file_info(self, item_name: str) -> Optional[storage.Blob]:
+        """Blob with its metadata loaded (generation, size, content_type), None if it doesn't exist"""
+        if not self.bucket:
+            raise ValueError("Google Cloud Storage not configured. Set GOOGLE_CLOUD_BUCKET_NAME in .env")
+        return await asyncio.to_thread(self.bucket.get_blob, item_name)
+
+    def user_object_name(self, uri: str, user_id: str) -> Optional[str]:
+        """
+        Object name of a gs:// reference sent by a client, if the user may use it as an input:
+        their own uploads, or videos (generated and merged videos are public anyway). None otherwise.
+        """
+        if not uri.startswith("gs://"):
+            return None
+        item_name = self.object_name_from_url(uri)
+        if item_name is None or ".." in item_name.split("/"):
+            return None
+        if item_name.startswith(f"{UPLOADS_PREFIX}{user_id}/") or item_name.startswith("videos/"):
+            return item_name
+        return None
+
+    @timed("gcs")
+    async def generate_upload_url(self, item_name: str, content_type: str, max_bytes: int) -> tuple[str, dict]:
+        """
+        V4 signed URL a client can PUT one object to directly, bypassing the backend.
+        Returns the URL and the headers the client must send with the upload (they're part of the signature).
+        """
+        if not self.bucket:
+            raise ValueError("Google Cloud Storage not configured. Set GOOGLE_CLOUD_BUCKET_NAME in .env")
+        headers = {"x-goog-content-length-range": f"0,{max_bytes}"}
+        # signed with a copy, the signer adds Host to the dict it's given
+        url = await asyncio.to_thread(
+            self._sign, item_name, "PUT", settings.UPLOAD_URL_TTL, content_type=content_type, headers=dict(headers)
+        )
+        return url, {"Content-Type": content_type, **headers}
+
+    @timed("gcs")
+    async def generate_download_url(self, item_name: str) -> str:
+        """V4 signed URL to read a (possibly private) object, e.g. for ffmpeg"""
+        if not self.bucket:
+            raise ValueError("Google Cloud Storage not configured. Set GOOGLE_CLOUD_BUCKET_NAME in .env")
+        return await asyncio.to_thread(self._sign, item_name, "GET", settings.DOWNLOAD_URL_TTL)
+
+    def _sign(self, item_name: str, method: str, ttl: int, **kwargs) -> str:
+        credentials = self.client._credentials
+        if not isinstance(credentials, Signing):
+            # e.g. Cloud Run / GCE metadata credentials hold no private key, sign through the IAM API instead
+            if not credentials.valid:
+                credentials.refresh(AuthRequest())
+            kwargs["service_account_email"] = credentials.service_account_email
+            kwargs["access_token"] = credentials.token
+        return self.bucket.blob(item_name).generate_signed_url(
+            version="v4", expiration=timedelta(seconds=ttl), method=method, **kwargs
+        )
+
+    @timed("gcs")
+    async def file_exists(self, item_name: str) -> bool:
+        if not self.bucket:
+            raise ValueError("Google Cloud Storage not configured. Set GOOGLE_CLOUD_BUCKET_NAME in .env")
+        return await asyncio.to_thread(self.bucket.blob(item_name).exists)
+
+    def public_url(self, item_name: str) -> str:
+        return f"https://storage.googleapis.com/{self.bucket.name}/{item_name}"
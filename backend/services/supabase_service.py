@@ -1,7 +1,28 @@
 from supabase import Client, create_client
 from utils.env import settings
-from typing import Optional, Tuple
+from utils.jwt_verifier import JWTVerifier, JWTVerificationUnavailable
+from utils.metrics import timed
+from utils.ttl_cache import TTLCache
+from typing import Optional
 from blacksheep import Request
+import asyncio
+import base64
+import time
+import jwt
+import orjson
+
+
+def encode_transaction_cursor(created_at: str, transaction_log_id) -> str:
+    """Opaque keyset cursor pointing just after the given transaction_log row"""
+    return base64.urlsafe_b64encode(orjson.dumps([created_at, transaction_log_id])).decode().rstrip("=")
+
+
+def decode_transaction_cursor(cursor: str) -> tuple:
+    try:
+        created_at, transaction_log_id = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("invalid cursor")
+    return created_at, transaction_log_id
 
 
 class SupabaseService:
@@ -9,14 +30,54 @@ class SupabaseService:
         self.supabase: Client = create_client(
             settings.SUPABASE_URL, settings.SUPABASE_SECRET_KEY
         )
+        auth_url = f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1"
+        self.jwt_verifier = JWTVerifier(
+            issuer=auth_url,
+            jwt_secret=settings.SUPABASE_JWT_SECRET,
+            jwks_url=settings.SUPABASE_JWKS_URL or f"{auth_url}/.well-known/jwks.json",
+            cache_size=settings.AUTH_TOKEN_CACHE_SIZE,
+        )
+        # token -> user id confirmed by GoTrue, for tokens that can't be verified locally
+        self.gotrue_cache = TTLCache(max_size=settings.AUTH_TOKEN_CACHE_SIZE)
     
-    def get_user_id_from_token(self, token: str) -> Optional[str]:
+    async def get_user_id_from_token(self, token: str, verify_remote: bool = False) -> Optional[str]:
         """Return the Supabase user id from a JWT access token.
-        Uses GoTrue to validate the token and fetch the user.
+        Verifies the token locally (signature, exp, audience) and only asks GoTrue when
+        verify_remote is set (revocation-sensitive routes) or the token can't be checked locally.
         Returns None if invalid or user not found.
         """
         if not token:
             return None
+        try:
+            claims = await self.jwt_verifier.verify(token)
+            if claims is None:
+                return None
+            if not verify_remote:
+                return claims["sub"]
+        except JWTVerificationUnavailable:
+            # can't check it here (e.g. HS256 without SUPABASE_JWT_SECRET), reuse GoTrue's answer until exp
+            user_id = None if verify_remote else self.gotrue_cache.get(token)
+            if user_id is not None:
+                return user_id
+            user_id = await asyncio.to_thread(self._get_user_id_from_gotrue, token)
+            if user_id:
+                self.gotrue_cache.set(token, user_id, ttl=self._seconds_until_exp(token))
+            return user_id
+        # revocation-sensitive routes always ask GoTrue; supabase-py is synchronous, keep it off the event loop
+        return await asyncio.to_thread(self._get_user_id_from_gotrue, token)
+
+    @staticmethod
+    def _seconds_until_exp(token: str) -> float:
+        """Lifetime left on a token GoTrue accepted (its signature was checked there), 0 if unknown"""
+        try:
+            exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except jwt.InvalidTokenError:
+            return 0
+        return exp - time.time() if isinstance(exp, (int, float)) else 0
+
+    @timed("supabase")
+    def _get_user_id_from_gotrue(self, token: str) -> Optional[str]:
+        """Validate the token with GoTrue (catches signed-out / deleted users)"""
         try:
             res = self.supabase.auth.get_user(token)
             # supabase-py v2: res has `.user` with `.id`
@@ -26,7 +87,12 @@ class SupabaseService:
         except Exception:
             return None
 
-    def get_user_id_from_request(self, request: Request) -> Optional[str]:
+    @staticmethod
+    def is_operator(user_id: Optional[str]) -> bool:
+        """Whether the user may read the operator stats endpoints (OPERATOR_USER_IDS)"""
+        return bool(user_id) and user_id in {item.strip() for item in settings.OPERATOR_USER_IDS.split(",")}
+
+    async def get_user_id_from_request(self, request: Request, verify_remote: bool = False) -> Optional[str]:
         """Extract Bearer token from Authorization header and return user id."""
         auth_header = request.get_first_header(b"authorization")
         if not auth_header:
@@ -38,37 +104,39 @@ class SupabaseService:
             else:
                 # Not a Bearer token
                 return None
-            return self.get_user_id_from_token(token)
+            return await self.get_user_id_from_token(token, verify_remote=verify_remote)
         except Exception:
             return None
 
-    def do_transaction(self, user_id: str, transaction_type: str, credit_usage: int) -> Tuple[bool, Optional[str]]:
+    @timed("supabase")
+    def apply_credit_transaction(self, user_id: str, transaction_type: str, credit_usage: int, plan: Optional[str] = None) -> float:
         """
-        Logs transaction and deducts credit usage for user.
-        Returns (success, error_message) tuple.
+        Debits credit_usage (negative to credit), sets the plan if given and appends the
+        transaction_log row in a single RPC (see scripts/db/functions.sql).
+        Returns the new balance, raises on failure (e.g. insufficient_credits).
         """
-        try:
-            self.supabase.rpc(
-                "sub_user_credits",
-                {
-                    "p_user_id": user_id,
-                    "p_credit_change": credit_usage
-                }
-            ).execute()
+        res = self.supabase.rpc(
+            "apply_credit_transaction",
+            {
+                "p_user_id": user_id,
+                "p_transaction_type": transaction_type,
+                "p_credit_change": credit_usage,
+                "p_billing_type": plan,
+            }
+        ).execute()
+        return res.data
 
-            self.supabase.table("transaction_log").insert({
-                "transaction_type": transaction_type,
-                "user_id": user_id,
-                "credit_usage": credit_usage
-            }).execute()
-            return (True, None)
-        except Exception as e:
-            error_msg = str(e)
-            print(f"Failed to do transaction: {error_msg}")
-            if "insufficient_credits" in error_msg:
-                return (False, "insufficient_credits")
-            return (False, error_msg)
-        
+    @timed("supabase")
+    def apply_credit_ledger(self, entries: list[dict]) -> dict[str, float]:
+        """
+        Writes a batch of ledger entries from CreditReconciler / AutumnWebhookService ({ledger_entry_id,
+        user_id, transaction_type, credit_usage, billing_type?}) in one RPC, entries already written are skipped.
+        Returns the new balance of every user in the batch.
+        """
+        res = self.supabase.rpc("apply_credit_ledger", {"p_entries": entries}).execute()
+        return {row["balance_user_id"]: row["balance"] for row in res.data or []}
+
+    @timed("supabase")
     def get_user_row(self, user_id: str):
         """ fetches user row """
         try:
@@ -83,63 +151,48 @@ class SupabaseService:
         except Exception:
             return None
 
-    def get_transaction_log(self, user_id: str):
-        """ fetches transaction log for user """
-        try:
-            return (
-                self.supabase
-                .table("transaction_log")    
-                .select("*")
-                .eq("user_id", user_id) 
-                .order("created_at", desc=True)
-                .execute()
-            )
-        except Exception:
-            return None
-
-    def add_user_credits(self, user_id: str, credits: int):
+    @timed("supabase")
+    def get_transaction_page(self, user_id: str, limit: int, cursor: Optional[str] = None) -> Optional[dict]:
         """
-        Add credits to user account (opposite of sub_user_credits).
-        Uses a negative value with the existing subtract function to add credits.
+        fetches one page of the transaction log for user, newest first.
+        Returns {transactions, next_cursor, summary} (summary only on the first page), None on failure.
+        Raises ValueError for a malformed cursor.
         """
+        before_created_at, before_id = decode_transaction_cursor(cursor) if cursor else (None, None)
         try:
-            self.supabase.rpc(
-                "sub_user_credits",
+            res = self.supabase.rpc(
+                "get_transaction_page",
                 {
                     "p_user_id": user_id,
-                    "p_credit_change": -credits  # Negative to add credits
+                    "p_limit": limit + 1,  # one extra row tells us whether there is a next page
+                    "p_before_created_at": before_created_at,
+                    "p_before_id": before_id,
                 }
             ).execute()
-            return True
         except Exception as e:
-            print(f"Failed to add credits: {e}")
-            return False
+            print(f"Failed to fetch transaction log: {e}")
+            return None
 
-    def update_user_plan(self, user_id: str, plan: str):
-        """
-        Update user's billing plan (free or paid).
-        """
-        try:
-            self.supabase.table("profiles").update({
-                "billing_type": plan  # Column is billing_type, not plan
-            }).eq("user_id", user_id).execute()
-            return True
-        except Exception as e:
-            print(f"Failed to update plan: {e}")
-            return False
+        transactions = res.data["transactions"]
+        next_cursor = None
+        if len(transactions) > limit:
+            transactions = transactions[:limit]
+            last = transactions[-1]
+            next_cursor = encode_transaction_cursor(last["created_at"], last["transaction_log_id"])
+        return {"transactions": transactions, "next_cursor": next_cursor, "summary": res.data["summary"]}
 
-    def log_credit_purchase(self, user_id: str, credits: int, product_id: str):
+    def purchase_credits(self, user_id: str, credits: int, plan: str = "paid") -> Optional[float]:
         """
-        Log a credit purchase transaction.
+        Adds purchased credits, moves the user to plan and logs the purchase in one round trip.
+        Returns the new balance, None on failure.
         """
         try:
-            self.supabase.table("transaction_log").insert({
-                "transaction_type": "credit_purchase",  # Must be a valid enum value
-                "user_id": user_id,
-                "credit_usage": -credits,  # Negative because user gained credits
-            }).execute()
-            return True
+            return self.apply_credit_transaction(
+                user_id,
+                "credit_purchase",  # Must be a valid enum value
+                -credits,  # Negative because user gained credits
+                plan=plan,
+            )
         except Exception as e:
-            print(f"Failed to log credit purchase: {e}")
-            return False
-        
+            print(f"Failed to purchase credits: {e}")
+            return None
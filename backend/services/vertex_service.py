@@ -2,31 +2,39 @@ from google import genai
 from google.genai.types import GenerateVideosConfig, GenerateVideosOperation, Image, GenerateContentConfig, ImageConfig, Part, VideoGenerationReferenceImage
 from models.job import JobStatus
 from utils.env import settings
+from utils.metrics import timed
 
 class VertexService:
+    VIDEO_MODEL = "veo-3.1-fast-generate-001"
+    IMAGE_MODEL = "gemini-2.5-flash-image"
+    ANALYSIS_MODEL = "gemini-2.0-flash"
+
     def __init__(self):
         self.client = genai.Client(
             vertexai=settings.GOOGLE_GENAI_USE_VERTEXAI,
             project=settings.GOOGLE_CLOUD_PROJECT,
             location=settings.GOOGLE_CLOUD_LOCATION
         )
+        # every call below goes through client.aio so gather() in JobService actually overlaps
+        # the requests instead of blocking the event loop one call at a time
         self.bucket_name = settings.GOOGLE_CLOUD_BUCKET_NAME
 
-    async def generate_video_content(self, prompt: str, image_data: bytes = None, ending_image_data: bytes = None, duration_seconds: int = 6) -> GenerateVideosOperation:
+    @timed("vertex")
+    async def generate_video_content(self, prompt: str, image_data: bytes = None, ending_image_data: bytes = None, duration_seconds: int = 6, image_mime_type: str = "image/png", ending_image_mime_type: str = "image/png") -> GenerateVideosOperation:
         ending_frame = None
         if ending_image_data:
             ending_frame = Image(
                 image_bytes=ending_image_data,
-                mime_type="image/png",
+                mime_type=ending_image_mime_type,
             )
 
         # gen vid
-        operation = self.client.models.generate_videos(
-            model="veo-3.1-fast-generate-001",
+        operation = await self.client.aio.models.generate_videos(
+            model=self.VIDEO_MODEL,
             prompt=prompt,
             image=Image(
                 image_bytes=image_data,
-                mime_type="image/png",
+                mime_type=image_mime_type,
             ),
             config=GenerateVideosConfig(
                 aspect_ratio="16:9",
@@ -39,13 +47,14 @@ class VertexService:
 
         return operation
     
-    async def generate_image_content(self, prompt: str, image: bytes) -> str:
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash-image",
+    @timed("vertex")
+    async def generate_image_content(self, prompt: str, image: bytes, mime_type: str = "image/png") -> str:
+        response = await self.client.aio.models.generate_content(
+            model=self.IMAGE_MODEL,
             contents=[
                 Part.from_bytes(
                     data=image,
-                    mime_type="image/png",
+                    mime_type=mime_type,
                 ),
                 prompt,
             ],
@@ -61,48 +70,61 @@ class VertexService:
             raise Exception(str(response))
         return response.candidates[0].content.parts[0].inline_data.data
     
+    @timed("vertex")
     async def get_video_status(self, operation: GenerateVideosOperation) -> JobStatus:
-        operation = self.client.operations.get(operation)
+        operation = await self.client.aio.operations.get(operation)
         if operation.done and operation.result and operation.result.generated_videos:
             return JobStatus(status="done", job_start_time=None, video_url=operation.result.generated_videos[0].video.uri)
         return JobStatus(status="waiting", job_start_time=None, video_url=None)
     
+    @timed("vertex")
     async def get_video_status_by_name(self, operation_name: str) -> JobStatus:
         """Get video status by operation name (avoids serialization)"""
         # Create a minimal operation object with just the name since get() expects an operation object
         operation = GenerateVideosOperation(name=operation_name)
-        operation = self.client.operations.get(operation)
+        operation = await self.client.aio.operations.get(operation)
         if operation.done and operation.result and operation.result.generated_videos:
             return JobStatus(status="done", job_start_time=None, video_url=operation.result.generated_videos[0].video.uri)
+        if operation.done:
+            # finished without a video (failed or filtered), stop polling it
+            return JobStatus(status="error", job_start_time=None, error=str(operation.error or "Video generation returned no video"))
         return JobStatus(status="waiting", job_start_time=None, video_url=None)
     
-    def analyze_video_content(self, prompt: str, video_data: bytes) -> dict:
-        return self.client.models.generate_content(
+    @timed("vertex")
+    async def analyze_video_content(self, prompt: str, video_data: bytes = None, video_uri: str = None, mime_type: str = "video/mp4") -> dict:
+        # a gs:// video is read by Gemini straight from the bucket, the bytes never pass through us
+        if video_uri:
+            video = Part.from_uri(file_uri=video_uri, mime_type=mime_type)
+        else:
+            video = Part.from_bytes(
+                data=video_data.data,
+                mime_type=mime_type,
+            )
+        return await self.client.aio.models.generate_content(
             model="gemini-2.0-flash",
             contents=[
-                Part.from_bytes(
-                    data=video_data.data,
-                    mime_type="video/mp4",
-                ),
+                video,
                 prompt
                 ]
         )
     
-    async def analyze_image_content(self, prompt: str, image_data: bytes) -> dict:
-        return self.client.models.generate_content(
-            model="gemini-2.0-flash",
+    @timed("vertex")
+    async def analyze_image_content(self, prompt: str, image_data: bytes, mime_type: str = "image/png") -> dict:
+        response = await self.client.aio.models.generate_content(
+            model=self.ANALYSIS_MODEL,
             contents=[
                 Part.from_bytes(
                     data=image_data,
-                    mime_type="image/png",
+                    mime_type=mime_type,
                 ),
                 prompt
                 ]
-        ).candidates[0].content.parts[0].text.strip()
+        )
+        return response.candidates[0].content.parts[0].text.strip()
     
 
     async def test_service(self):
-        return self.client.models.generate_content(
+        return await self.client.aio.models.generate_content(
             model="gemini-2.0-flash",
             contents="Hi there, does u work?",
         )
@@ -1,12 +1,43 @@
 import asyncio
+import hashlib
+import os
+import re
+import tempfile
 import time
+from typing import AsyncIterator, Optional
 from services.storage_service import StorageService
-import uuid
+from services.merge_scheduler import MergeScheduler
+from services.merge_cache_service import MergeCacheService, merged_object_name
+from utils.env import settings
+from utils.metrics import BACKGROUND_JOBS_IN_FLIGHT, FFMPEG_PROCESSES, VIDEO_MERGE_STAGE_SECONDS
+import httpx
 import shutil
 
+# bytes of ffmpeg stderr kept for error messages
+FFMPEG_STDERR_TAIL = 64 * 1024
+# output timestamp in ffmpeg's progress lines, the last one is the merged duration
+FFMPEG_TIME_PATTERN = re.compile(rb"time=(\d+):(\d+):(\d+(?:\.\d+)?)")
+
 class VideoMergeService:
-    def __init__(self, storage_service: StorageService):
+    def __init__(self, storage_service: StorageService, merge_cache_service: Optional[MergeCacheService] = None, merge_scheduler: Optional[MergeScheduler] = None):
         self.storage_service = storage_service
+        self.merge_cache_service = merge_cache_service
+        self.merge_scheduler = merge_scheduler or MergeScheduler(
+            concurrency=settings.MERGE_CONCURRENCY,
+            max_queue_depth=settings.MERGE_QUEUE_MAX_DEPTH,
+            max_queued_per_user=settings.MERGE_QUEUE_MAX_PER_USER,
+        )
+        # merge key -> running merge and how many requests are waiting on it, for coalescing identical requests
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+        # pooled client for segment size checks and prefetch downloads
+        self.http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=16),
+            follow_redirects=True,
+        )
+        # bytes of prefetched segments currently held in the scratch dir, see MERGE_SCRATCH_MAX_BYTES
+        self._scratch_bytes = 0
         # Check if ffmpeg is available
         self._check_ffmpeg()
 
@@ -22,10 +53,16 @@ class VideoMergeService:
         """
         Merges multiple videos from URLs into a single video using FFmpeg with HTTP inputs.
         This is the fastest approach - FFmpeg downloads and merges in one pass, no temporary files.
+        Merged videos are content addressed (see prefix_keys), so a repeated merge of the same ordered
+        segments returns the existing object, and identical concurrent merges share one FFmpeg run.
+        When a prefix of the segments was merged before, only the cached prefix and the new segments
+        are concatenated.
+        FFmpeg runs are admitted by the MergeScheduler (raises MergeQueueFull when it's saturated),
+        and a merge is cancelled once every request waiting on it has been cancelled.
         
         Args:
             video_urls: List of video URLs in order (from root to end frame)
-            user_id: User ID for organizing storage
+            user_id: User ID of the requester (for scheduling, merged objects are shared)
             
         Returns:
             Public URL of the merged video
@@ -40,32 +77,216 @@ class VideoMergeService:
             # Single video, just return the URL
             return video_urls[0]
         
+        keys = await self.prefix_keys(video_urls)
+        key = keys[-1]
+        merge = self._inflight.get(key)
+        if merge is None:
+            merge = asyncio.create_task(self._merge_once(keys, video_urls, user_id))
+            self._inflight[key] = merge
+            BACKGROUND_JOBS_IN_FLIGHT.labels("video_merge").inc()
+            merge.add_done_callback(lambda _: self._inflight.pop(key, None))
+            merge.add_done_callback(lambda _: BACKGROUND_JOBS_IN_FLIGHT.labels("video_merge").dec())
+        else:
+            print(f"[VIDEO MERGE] Joining in-flight merge {key[:12]}")
+
+        # shielded so a requester disconnecting doesn't cancel the merge the others are waiting on,
+        # the last one to leave cancels it
+        self._waiters[key] = self._waiters.get(key, 0) + 1
         try:
-            # Merge videos using FFmpeg with HTTP inputs directly
-            merge_start = time.time()
-            
-            merged_video_data = await self._merge_with_ffmpeg_http(video_urls)
-            
-            merge_duration = time.time() - merge_start
-            merged_size = len(merged_video_data)
-            
-            # Upload to storage
-            upload_start = time.time()
-            video_id = str(uuid.uuid4())
-            video_path = f"videos/{user_id}/merged_{video_id}.mp4"
-            
-            public_url = await self.storage_service.upload_file(video_path, merged_video_data)
-            
-            upload_duration = time.time() - upload_start
-            total_duration = time.time() - start_time
-            
-            return public_url
-        except Exception as e:
+            public_url = await asyncio.shield(merge)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1:
+                print(f"[VIDEO MERGE] Cancelling merge {key[:12]}, no requests are waiting on it")
+                merge.cancel()
             raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+        
+        total_duration = time.time() - start_time
+        VIDEO_MERGE_STAGE_SECONDS.labels("total").observe(total_duration)
+        print(f"[VIDEO MERGE] Merge {key[:12]} of {len(video_urls)} videos ready in {total_duration:.2f}s")
+        
+        return public_url
+
+    async def prefix_keys(self, video_urls: list[str]) -> list[str]:
+        """
+        Deterministic merge keys for every prefix of an ordered segment list (the last one is the key of
+        the whole list). Segments stored in our bucket contribute their object generation too, so
+        overwriting a source video produces a new key.
+        """
+        object_names = [self.storage_service.object_name_from_url(url) for url in video_urls]
+        generations = await asyncio.gather(*(
+            self._generation(name) for name in object_names
+        ))
+
+        digest = hashlib.sha256()
+        keys = []
+        for url, generation in zip(video_urls, generations):
+            digest.update(f"{url}\0{generation or ''}\n".encode())
+            keys.append(digest.hexdigest())
+        return keys
+
+    async def _generation(self, object_name: Optional[str]) -> Optional[int]:
+        if object_name is None:
+            return None
+        try:
+            return await self.storage_service.get_generation(object_name)
+        except Exception as e:
+            print(f"[VIDEO MERGE] Could not read generation of {object_name}: {e}")
+            return None
+
+    async def _merge_once(self, keys: list[str], video_urls: list[str], user_id: str) -> str:
+        key = keys[-1]
+        video_path = merged_object_name(key)
+        if await self.storage_service.file_exists(video_path):
+            print(f"[VIDEO MERGE] Cache hit for merge {key[:12]}")
+            if self.merge_cache_service:
+                await self.merge_cache_service.touch(key)
+            return self.storage_service.public_url(video_path)
+
+        # ffmpeg can't read gs:// references to (private) uploads, give it signed URLs for them
+        inputs = await asyncio.gather(*(self._readable_url(url) for url in video_urls))
+        durations = None
+        cached = await self._cached_prefix(keys[:-1])
+        if cached is not None:
+            prefix, prefix_duration = cached
+            print(f"[VIDEO MERGE] Reusing merged prefix of {prefix + 1} videos, {len(video_urls) - prefix - 1} new")
+            inputs = [self.storage_service.public_url(merged_object_name(keys[prefix]))] + inputs[prefix + 1:]
+            durations = [prefix_duration] + [None] * (len(inputs) - 1)
+        stats = {}
+
+        merged_size = 0
+
+        async def counted(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+            nonlocal merged_size
+            async for chunk in chunks:
+                merged_size += len(chunk)
+                yield chunk
+
+        queued_at = time.perf_counter()
+        async with self.merge_scheduler.slot(user_id):
+            started_at = time.perf_counter()
+            VIDEO_MERGE_STAGE_SECONDS.labels("queue").observe(started_at - queued_at)
+            # ffmpeg output is streamed straight into a resumable GCS upload, so merging and
+            # uploading overlap and memory stays bounded whatever the length of the merged video
+            public_url = await self.storage_service.upload_file(
+                video_path,
+                counted(self._merge_segments(inputs, durations, stats)),
+                content_type="video/mp4"
+            )
+            VIDEO_MERGE_STAGE_SECONDS.labels("merge_upload").observe(time.perf_counter() - started_at)
+
+        if self.merge_cache_service:
+            await self.merge_cache_service.add(key, merged_size, stats.get("duration"))
+        return public_url
+
+    async def _readable_url(self, url: str) -> str:
+        if not url.startswith("gs://"):
+            return url
+        item_name = self.storage_service.object_name_from_url(url)
+        if item_name is None:
+            raise ValueError(f"{url} is not in this app's bucket")
+        return await self.storage_service.generate_download_url(item_name)
+
+    async def _cached_prefix(self, keys: list[str]) -> Optional[tuple[int, float]]:
+        """Index and duration of the longest prefix with a merged video we can still read, if any"""
+        if not self.merge_cache_service or not keys:
+            return None
+        cached = await self.merge_cache_service.longest_prefix(keys)
+        if cached is None:
+            return None
+        prefix, _ = cached
+        if not await self.storage_service.file_exists(merged_object_name(keys[prefix])):
+            # deleted behind the index's back (bucket lifecycle rule), forget it and merge from scratch
+            await self.merge_cache_service.remove([keys[prefix]])
+            return None
+        return cached
+
+    async def _merge_segments(self, video_urls: list[str], durations: Optional[list[Optional[float]]] = None, stats: Optional[dict] = None) -> AsyncIterator[bytes]:
+        """
+        Picks the merge strategy. With enough segments whose total size fits the scratch budget, all of
+        them are downloaded concurrently first, so latency is paid once instead of per segment and a
+        slow segment doesn't stall the others. Otherwise FFmpeg reads the URLs itself.
+        """
+        total_size = await self._prefetch_size(video_urls)
+        if total_size is None or self._scratch_bytes + total_size > settings.MERGE_SCRATCH_MAX_BYTES:
+            print(f"[VIDEO MERGE] Merging {len(video_urls)} videos from HTTP inputs")
+            async for chunk in self._merge_with_ffmpeg_http(video_urls, durations, stats):
+                yield chunk
+            return
+
+        print(f"[VIDEO MERGE] Prefetching {len(video_urls)} videos ({total_size / 2**20:.1f} MiB)")
+        self._scratch_bytes += total_size
+        try:
+            async for chunk in self._merge_with_prefetch(video_urls, durations, stats):
+                yield chunk
+        finally:
+            self._scratch_bytes -= total_size
 
-    async def _merge_with_ffmpeg_http(self, video_urls: list[str]) -> bytes:
+    async def _prefetch_size(self, video_urls: list[str]) -> Optional[int]:
+        """Total size of the segments if prefetching is worth it and possible, else None"""
+        if len(video_urls) < settings.MERGE_PREFETCH_MIN_SEGMENTS:
+            return None
+        try:
+            responses = await asyncio.gather(*(self.http_client.head(url) for url in video_urls))
+        except httpx.HTTPError as e:
+            print(f"[VIDEO MERGE] Segment size check failed, not prefetching: {e}")
+            return None
+
+        total_size = 0
+        for response in responses:
+            length = response.headers.get("content-length")
+            if response.status_code != 200 or length is None:
+                return None
+            total_size += int(length)
+        return total_size if total_size <= settings.MERGE_SCRATCH_MAX_BYTES else None
+
+    async def _merge_with_prefetch(self, video_urls: list[str], durations: Optional[list[Optional[float]]] = None, stats: Optional[dict] = None) -> AsyncIterator[bytes]:
+        """Downloads every segment concurrently into the scratch dir, then concatenates the local files"""
+        scratch_dir = settings.MERGE_SCRATCH_DIR if os.path.isdir(settings.MERGE_SCRATCH_DIR) else None
+        workdir = tempfile.mkdtemp(prefix="merge-", dir=scratch_dir)
+        try:
+            semaphore = asyncio.Semaphore(settings.MERGE_PREFETCH_CONCURRENCY)
+            paths = [os.path.join(workdir, f"{i}.mp4") for i in range(len(video_urls))]
+            start_time = time.time()
+            downloads = [
+                asyncio.create_task(self._download(url, path, semaphore)) for url, path in zip(video_urls, paths)
+            ]
+            try:
+                await asyncio.gather(*downloads)
+            except BaseException:
+                # don't leave the other downloads writing into a dir that's about to be removed
+                for download in downloads:
+                    download.cancel()
+                await asyncio.gather(*downloads, return_exceptions=True)
+                raise
+            VIDEO_MERGE_STAGE_SECONDS.labels("prefetch").observe(time.time() - start_time)
+            print(f"[VIDEO MERGE] Prefetched {len(video_urls)} videos in {time.time() - start_time:.2f}s")
+
+            # explicit file: protocol, a bare path in a concat list read from stdin resolves against fd:
+            async for chunk in self._merge_with_ffmpeg_http([f"file:{path}" for path in paths], durations, stats):
+                yield chunk
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    async def _download(self, url: str, path: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            async with self.http_client.stream("GET", url) as response:
+                response.raise_for_status()
+                # plain writes, the scratch dir is normally tmpfs so they're memory copies
+                with open(path, "wb") as f:
+                    async for chunk in response.aiter_bytes(1024 * 1024):
+                        f.write(chunk)
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+    async def _merge_with_ffmpeg_http(self, video_urls: list[str], durations: Optional[list[Optional[float]]] = None, stats: Optional[dict] = None) -> AsyncIterator[bytes]:
         """
-        Merges videos using FFmpeg with HTTP inputs directly.
+        Merges videos using FFmpeg with HTTP inputs directly and yields the merged mp4 in chunks.
+        (Also used on local files by the prefetch strategy, the whitelist includes file.)
         FFmpeg downloads and merges in one pass - no temporary files, no intermediate downloads.
         Uses concat demuxer with HTTP URLs for maximum speed.
         
@@ -73,13 +294,23 @@ class VideoMergeService:
         1. Create concat file content in memory (as string)
         2. Pipe concat file to FFmpeg via stdin
         3. FFmpeg reads videos directly from HTTP URLs
-        4. Stream output directly to stdout
+        4. Stream output from stdout chunk by chunk (fragmented mp4 needs no seeking)
+        Raises once the output is exhausted if FFmpeg exited with an error.
+        
+        durations gives known input durations, needed for our own fragmented mp4 outputs (cached
+        prefixes) whose duration FFmpeg can't read from the header. The merged duration is stored
+        in stats["duration"] when stats is given.
         """
         # Build concat file content in memory
         # Format: file 'http://url1'
+        #         duration 12.0 (when known)
         #         file 'http://url2'
         #         ...
-        concat_content = "".join([f"file '{url}'\n" for url in video_urls])
+        concat_content = ""
+        for i, url in enumerate(video_urls):
+            concat_content += f"file '{url}'\n"
+            if durations and durations[i] is not None:
+                concat_content += f"duration {durations[i]:.6f}\n"
         concat_bytes = concat_content.encode('utf-8')
         
         # FFmpeg command using concat demuxer with stdin for concat file
@@ -106,62 +337,50 @@ class VideoMergeService:
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
-        
-        # Write concat file to stdin first, then read output in parallel
-        async def write_concat_file():
-            """Write concat file content to FFmpeg stdin."""
-            try:
-                process.stdin.write(concat_bytes)
-                await process.stdin.drain()
-                process.stdin.close()
-                await process.stdin.wait_closed()
-            except Exception as e:
-                raise
-        
-        async def read_output():
-            """Read merged video output from FFmpeg stdout."""
-            chunks = []
-            try:
-                while True:
-                    chunk = await process.stdout.read(1024 * 1024)  # Read 1MB chunks
-                    if not chunk:
-                        break
-                    chunks.append(chunk)
-                return b"".join(chunks)
-            except Exception as e:
-                raise
+        FFMPEG_PROCESSES.inc()
         
         async def monitor_progress():
-            """Monitor FFmpeg stderr for progress and errors."""
-            chunks = []
-            try:
-                while True:
-                    chunk = await process.stderr.read(1024)
-                    if not chunk:
-                        break
-                    chunks.append(chunk)
-            except Exception as e:
-                pass
-            
-            return b"".join(chunks)
+            """Keep the tail of FFmpeg stderr for error messages without growing unbounded."""
+            tail = b""
+            while True:
+                chunk = await process.stderr.read(4096)
+                if not chunk:
+                    break
+                tail = (tail + chunk)[-FFMPEG_STDERR_TAIL:]
+            return tail
 
-        # Write concat file first, then read output and monitor progress in parallel
+        stderr_task = asyncio.create_task(monitor_progress())
+        finished = False
         try:
-            await write_concat_file()
-            stdout_data, stderr_data = await asyncio.gather(
-                read_output(),
-                monitor_progress()
-            )
-        except Exception as e:
-            process.terminate()
-            await process.wait()
-            raise Exception(f"Error during FFmpeg execution: {e}")
-        
-        # Wait for process to complete
-        return_code = await process.wait()
+            # Write concat file to stdin first, then stream the output
+            process.stdin.write(concat_bytes)
+            await process.stdin.drain()
+            process.stdin.close()
+            await process.stdin.wait_closed()
+
+            while True:
+                chunk = await process.stdout.read(1024 * 1024)  # Read 1MB chunks
+                if not chunk:
+                    break
+                yield chunk
+
+            return_code = await process.wait()
+            stderr_data = await stderr_task
+            finished = True
+        finally:
+            if not finished:
+                # consumer gave up (upload failed or request cancelled), don't leave ffmpeg running
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                stderr_task.cancel()
+            FFMPEG_PROCESSES.dec()
 
         if return_code != 0:
-            error_msg = stderr_data.decode() if stderr_data else "Unknown FFmpeg error"
+            error_msg = stderr_data.decode(errors="replace") if stderr_data else "Unknown FFmpeg error"
             raise Exception(f"FFmpeg failed with return code {return_code}: {error_msg}")
-        
-        return stdout_data
+
+        times = FFMPEG_TIME_PATTERN.findall(stderr_data or b"")
+        if stats is not None and times:
+            hours, minutes, seconds = times[-1]
+            stats["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -6,9 +7,81 @@ class Settings(BaseSettings):
     GOOGLE_GENAI_USE_VERTEXAI: bool
     GOOGLE_CLOUD_BUCKET_NAME: str
     REDIS_URL: str
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0  # seconds to wait for a free pooled connection
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_RETRIES: int = 3
+    METRICS_ENABLED: bool = True  # Prometheus /metrics endpoint (operators only) and per-route latency histograms
+    METRICS_PORT: Optional[int] = None  # server.py also serves /metrics on this internal port when set, for scraping
+    WORKER_METRICS_PORT: Optional[int] = None  # worker.py serves /metrics on this port when set
+    JOB_CODEC_ZSTD_THRESHOLD: int = 512  # bytes, smaller job records are stored uncompressed
+    JOB_CODEC_READ_LEGACY: bool = True  # still decode pre-codec lzma/pickle records during rollout
+    VEO_POLL_INITIAL_DELAY: float = 20.0  # seconds after submit before the first operations.get
+    VEO_POLL_MIN_INTERVAL: float = 3.0
+    VEO_POLL_MAX_INTERVAL: float = 15.0
+    VEO_POLL_CONCURRENCY: int = 10
+    JOB_WORKER_EMBEDDED: bool = True  # run queue workers inside the API process (set False when running worker.py)
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_TIMELINE_SAMPLES: int = 1000  # served jobs whose stage timelines GET /api/jobs/stage-stats aggregates
+    JOB_QUEUE_VISIBILITY_TIMEOUT: int = 120  # seconds before an unacked job is reclaimed by another worker
+    JOB_QUEUE_MAX_ATTEMPTS: int = 3
+    FRAME_CACHE_TTL: int = 86400  # seconds an unused preprocessing result is kept
+    FRAME_CACHE_MAX_BYTES: int = 2 * 1024 ** 3  # total size of cached frames (Redis + GCS)
+    FRAME_CACHE_INLINE_MAX_BYTES: int = 256 * 1024  # larger frames go to GCS instead of Redis
+    MERGE_SCRATCH_DIR: str = "/dev/shm"  # tmpfs for prefetched merge segments (falls back to the temp dir)
+    # prefetched segments held at once across all merges. tmpfs (and Cloud Run's in-memory filesystem)
+    # count against the container's memory, so keep this to ~1/4 of it (512Mi in cloudbuild.yaml);
+    # raise it only with a disk-backed MERGE_SCRATCH_DIR. Larger merges use the streaming HTTP path
+    MERGE_SCRATCH_MAX_BYTES: int = 128 * 1024 ** 2
+    MERGE_PREFETCH_MIN_SEGMENTS: int = 3  # fewer segments are merged straight from their URLs
+    MERGE_PREFETCH_CONCURRENCY: int = 8  # segment downloads in flight per merge
+    MERGE_CONCURRENCY: int = 2  # ffmpeg merges running at once per instance
+    MERGE_QUEUE_MAX_DEPTH: int = 20  # waiting merges before new ones get a 429
+    MERGE_QUEUE_MAX_PER_USER: int = 3  # waiting merges per user before that user gets a 429
+    MERGE_CACHE_TTL: int = 7 * 86400  # seconds an unused merged video is kept for reuse as a prefix
+    MERGE_CACHE_MAX_BYTES: int = 20 * 1024 ** 3  # total size of cached merged videos in GCS
+    UPLOAD_URL_TTL: int = 900  # seconds a signed upload URL stays valid
+    DOWNLOAD_URL_TTL: int = 3600  # seconds a signed read URL (merge inputs) stays valid
+    UPLOAD_MAX_IMAGE_BYTES: int = 20 * 1024 ** 2
+    UPLOAD_MAX_VIDEO_BYTES: int = 512 * 1024 ** 2
+    IMAGE_MAX_WIDTH: int = 1344  # uploads are fit into Gemini's 16:9 frame size before any Vertex call
+    IMAGE_MAX_HEIGHT: int = 768
+    IMAGE_JPEG_QUALITY: int = 90
+    VEO_FRAME_MAX_WIDTH: int = 1280  # frames sent to Veo are fit into its 16:9 720p output size
+    VEO_FRAME_MAX_HEIGHT: int = 720
+    IMAGE_NORMALIZE_WORKERS: int = 2  # processes decoding/resizing images
+    CREDIT_BALANCE_TTL: int = 300  # seconds a balance mirrored in Redis is used before it's reloaded from Postgres
+    CREDIT_HOLD_TTL: int = 86400  # seconds a debit can still be refunded (failed job)
+    CREDIT_FLUSH_INTERVAL: float = 2.0  # seconds between batched ledger writes to Postgres
+    CREDIT_FLUSH_BATCH_SIZE: int = 500
+    CREDIT_FLUSH_MAX_ATTEMPTS: int = 10  # flushes of a rejected ledger entry before it goes to the dead-letter stream
+    PROFILE_CACHE_TTL: int = 300  # seconds a profiles row is cached in Redis (writes update/invalidate it)
+    PROFILE_CACHE_LOCAL_TTL: float = 10.0  # seconds it's kept in process, bounds staleness if an invalidation is missed
+    PROFILE_CACHE_LOCAL_SIZE: int = 10000
     SUPABASE_URL: str
     SUPABASE_SECRET_KEY: str
+    SUPABASE_JWT_SECRET: Optional[str] = None  # legacy HS256 projects; asymmetric keys come from JWKS
+    SUPABASE_JWKS_URL: Optional[str] = None  # defaults to {SUPABASE_URL}/auth/v1/.well-known/jwks.json
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    OPERATOR_USER_IDS: str = ""  # comma-separated Supabase user ids allowed on the operator stats endpoints
     AUTUMN_SECRET_KEY: str
+    AUTUMN_HTTP2: bool = True  # multiplex concurrent Autumn calls over one connection
+    AUTUMN_CONNECT_TIMEOUT: float = 5.0
+    AUTUMN_READ_TIMEOUT: float = 15.0
+    AUTUMN_MAX_CONNECTIONS: int = 20  # pooled (keep-alive) connections per process
+    AUTUMN_MAX_RETRIES: int = 2  # extra attempts after a connect error (or 5xx for idempotent requests)
+    AUTUMN_RETRY_BASE_DELAY: float = 0.2  # seconds, doubled per attempt with full jitter
+    AUTUMN_RETRY_MAX_DELAY: float = 2.0
+    AUTUMN_CACHE_PRODUCTS_TTL: float = 300.0  # seconds GET /products responses are cached
+    AUTUMN_CACHE_CUSTOMER_TTL: float = 30.0  # seconds customer/entitlement reads are cached, checkouts and payments invalidate them
+    AUTUMN_CACHE_SIZE: int = 5000
+    AUTUMN_WEBHOOK_SECRET: Optional[str] = None  # whsec_... signing secret, webhooks are rejected while it's unset
+    AUTUMN_WEBHOOK_ALLOW_UNSIGNED: bool = False  # local development only: accept unsigned webhooks when no secret is set
+    AUTUMN_WEBHOOK_TOLERANCE: int = 300  # seconds a signed delivery stays valid (replay window)
+    AUTUMN_WEBHOOK_DEDUP_TTL: int = 7 * 86400  # seconds an event id is remembered, covers the provider's retry schedule
+    AUTUMN_WEBHOOK_FLUSH_INTERVAL: float = 0.5  # seconds between polls for accepted webhooks
+    AUTUMN_WEBHOOK_BATCH_SIZE: int = 100
+    AUTUMN_WEBHOOK_MAX_ATTEMPTS: int = 10  # deliveries of a queued event before it goes to the dead-letter stream
     FRONTEND_URL: str = "http://localhost:5173"  # Default for local dev
     model_config = SettingsConfigDict(
         env_file=".env",
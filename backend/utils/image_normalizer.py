@@ -0,0 +1,98 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+# magic numbers of the formats Vertex accepts for image parts
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"RIFF", "image/webp"),  # followed by the size and "WEBP"
+)
+
+
+@dataclass
+class NormalizedImage:
+    data: bytes
+    mime_type: str
+
+
+def sniff_mime_type(data: bytes, default: str = "image/png") -> str:
+    """MIME type from the file signature, for frames we don't re-encode (e.g. Gemini's output)"""
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    return default
+
+
+def normalize_image(data: bytes, max_width: int, max_height: int, jpeg_quality: int, flatten: bool = False) -> NormalizedImage:
+    """
+    Fit an image inside max_width x max_height and re-encode it: JPEG, or WebP when it has transparency
+    (annotations drawn on a transparent layer, Gemini reads WebP at a tenth of the PNG size).
+    flatten composites transparency onto white and always gives JPEG (for Veo, which takes JPEG/PNG).
+    Images already within bounds in JPEG are returned as is.
+    Runs in a worker process, keep it a plain module-level function.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        source_format = image.format
+        fits = image.width <= max_width and image.height <= max_height
+
+        if fits and source_format == "JPEG":
+            return NormalizedImage(data, "image/jpeg")
+
+        if source_format == "JPEG":
+            # let libjpeg decode at a reduced scale, much cheaper than decoding 12 MP and resizing
+            image.draft("RGB", (max_width, max_height))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+        if not fits:
+            image.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        if has_alpha and not flatten:
+            image.convert("RGBA").save(output, format="WEBP", quality=jpeg_quality)
+            return NormalizedImage(output.getvalue(), "image/webp")
+        if has_alpha:
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+            image = background
+        image.convert("RGB").save(output, format="JPEG", quality=jpeg_quality, optimize=True)
+        return NormalizedImage(output.getvalue(), "image/jpeg")
+
+
+class ImageNormalizer:
+    """
+    Runs normalize_image in a process pool so decoding and resizing never block the event loop.
+    Workers are started by a forkserver, not forked from the server: a fork copies the event loop,
+    the Redis/Supabase clients and whatever lock another thread held at that moment.
+    """
+
+    def __init__(self, max_workers: int, max_width: int, max_height: int, jpeg_quality: int):
+        self.max_workers = max_workers
+        self.max_width = max_width
+        self.max_height = max_height
+        self.jpeg_quality = jpeg_quality
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def normalize(
+        self, data: bytes, flatten: bool = False, max_width: Optional[int] = None, max_height: Optional[int] = None
+    ) -> NormalizedImage:
+        """max_width/max_height override the bounds for one call (e.g. the Veo frame size)"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, normalize_image, data,
+            max_width or self.max_width, max_height or self.max_height, self.jpeg_quality, flatten,
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
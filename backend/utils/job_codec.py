@@ -0,0 +1,53 @@
+import lzma
+import pickle
+from typing import Optional
+
+import orjson
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, records are just stored uncompressed without it
+    zstandard = None
+
+# First byte of every record written by JobRecordCodec
+FORMAT_JSON = 0x01
+FORMAT_JSON_ZSTD = 0x02
+
+# Records written before the codec existed are lzma(pickle(...)) and start with the xz magic
+LEGACY_LZMA_MAGIC = b"\xfd7zXZ\x00"
+
+
+class JobRecordCodec:
+    """
+    Encodes job records for Redis as a version byte followed by orjson (optionally zstd) bytes.
+    Payloads under zstd_threshold are left uncompressed, job records are usually a few hundred
+    bytes and compression only makes those bigger and slower.
+    """
+
+    def __init__(self, zstd_threshold: int = 512, read_legacy: bool = True):
+        self.zstd_threshold = zstd_threshold
+        self.read_legacy = read_legacy
+        self._compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def encode(self, record: dict) -> bytes:
+        payload = orjson.dumps(record)
+        if self._compressor and len(payload) >= self.zstd_threshold:
+            return bytes([FORMAT_JSON_ZSTD]) + self._compressor.compress(payload)
+        return bytes([FORMAT_JSON]) + payload
+
+    def decode(self, data: Optional[bytes]) -> Optional[dict]:
+        if not data:
+            return None
+
+        version = data[0]
+        if version == FORMAT_JSON:
+            return orjson.loads(data[1:])
+        if version == FORMAT_JSON_ZSTD:
+            if not self._decompressor:
+                raise ValueError("job record is zstd compressed but zstandard is not installed")
+            return orjson.loads(self._decompressor.decompress(data[1:]))
+        if data.startswith(LEGACY_LZMA_MAGIC) and self.read_legacy:
+            # only records we wrote ourselves before the codec rollout; disable once they've expired
+            return pickle.loads(lzma.decompress(data))
+        raise ValueError(f"unknown job record format {version:#04x}")
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from typing import Optional
+
+import jwt
+
+from utils.ttl_cache import TTLCache
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
+
+
+class JWTVerificationUnavailable(Exception):
+    """Raised when a token can't be checked locally (no secret / signing key for its algorithm)."""
+
+
+class JWTVerifier:
+    """
+    Verifies Supabase access tokens locally, either with the project's JWT secret (HS256)
+    or with the signing keys published at the project's JWKS endpoint.
+    Valid tokens are cached until their `exp`, so repeat requests skip signature checks entirely.
+    """
+
+    def __init__(
+        self,
+        issuer: str,
+        jwt_secret: Optional[str] = None,
+        jwks_url: Optional[str] = None,
+        audience: str = "authenticated",
+        cache_size: int = 10_000,
+    ):
+        self.issuer = issuer
+        self.jwt_secret = jwt_secret
+        self.audience = audience
+        self.jwks_client = jwt.PyJWKClient(jwks_url, cache_keys=True, lifespan=3600) if jwks_url else None
+        self.cache = TTLCache(max_size=cache_size)
+
+    async def verify(self, token: str) -> Optional[dict]:
+        """
+        Return the token claims, or None if the token is invalid or expired.
+        Raises JWTVerificationUnavailable if no key is configured for the token's algorithm.
+        """
+        claims = self.cache.get(token)
+        if claims is not None:
+            return claims
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError:
+            return None
+
+        algorithm = header.get("alg")
+        if algorithm == "HS256":
+            if not self.jwt_secret:
+                raise JWTVerificationUnavailable("SUPABASE_JWT_SECRET not set")
+            key = self.jwt_secret
+        elif algorithm in ASYMMETRIC_ALGORITHMS:
+            if not self.jwks_client:
+                raise JWTVerificationUnavailable("no JWKS url configured")
+            try:
+                # PyJWKClient fetches the JWKS with a blocking urllib call (first use, refreshes,
+                # unknown kids), keep it off the event loop
+                key = (await asyncio.to_thread(self.jwks_client.get_signing_key_from_jwt, token)).key
+            except jwt.PyJWKClientError as e:
+                raise JWTVerificationUnavailable(str(e))
+        else:
+            return None
+
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                options={"require": ["exp", "sub"]},
+            )
+        except jwt.InvalidTokenError:
+            return None
+
+        self.cache.set(token, claims, ttl=claims["exp"] - time.time())
+        return claims
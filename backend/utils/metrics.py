@@ -0,0 +1,164 @@
+import functools
+import inspect
+import time
+
+import redis.asyncio as redis
+from blacksheep.exceptions import HTTPException
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily
+from redis.asyncio.client import Pipeline
+
+# latency buckets (seconds): sub-ms Redis commands up to multi-minute merges and Veo calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route pattern",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled")
+EXTERNAL_CALL_SECONDS = Histogram(
+    "external_call_duration_seconds", "Latency of calls to Vertex, Supabase, Redis, Autumn and GCS",
+    ["service", "operation"], buckets=LATENCY_BUCKETS,
+)
+EXTERNAL_CALL_ERRORS = Counter(
+    "external_call_errors_total", "External calls that raised", ["service", "operation"],
+)
+VIDEO_MERGE_STAGE_SECONDS = Histogram(
+    "video_merge_stage_duration_seconds", "Video merge time per stage", ["stage"], buckets=LATENCY_BUCKETS,
+)
+VIDEO_JOB_STAGE_SECONDS = Histogram(
+    "video_job_stage_duration_seconds", "Video job time per stage (see job_service.STAGE_INTERVALS)",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+BACKGROUND_JOBS_IN_FLIGHT = Gauge("background_jobs_in_flight", "Background jobs currently running", ["kind"])
+FFMPEG_PROCESSES = Gauge("ffmpeg_processes", "Running ffmpeg processes")
+REDIS_POOL_CONNECTIONS = Gauge("redis_pool_connections", "Connections of the shared Redis pool", ["state"])
+
+
+def timed(service: str, operation: str = None):
+    """
+    Decorator recording the latency (and failures) of a sync or async external call in
+    external_call_duration_seconds. The labelled children are bound once, so a call costs two
+    perf_counter reads and a histogram observe.
+    """
+    def decorator(fn):
+        histogram = EXTERNAL_CALL_SECONDS.labels(service, operation or fn.__name__)
+        errors = EXTERNAL_CALL_ERRORS.labels(service, operation or fn.__name__)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except BaseException:
+                    errors.inc()
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            operation = "MULTI" if self.is_transaction else "PIPELINE"
+            EXTERNAL_CALL_SECONDS.labels("redis", operation).observe(time.perf_counter() - start)
+
+
+class InstrumentedRedis(redis.Redis):
+    """redis.asyncio.Redis recording every command (and pipeline round trip) in external_call_duration_seconds"""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            command = args[0] if isinstance(args[0], str) else args[0].decode()
+            EXTERNAL_CALL_SECONDS.labels("redis", command.upper()).observe(time.perf_counter() - start)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> Pipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def track_redis_pool(pool: redis.ConnectionPool):
+    """Report the pool's connections at scrape time (nothing is paid per command)"""
+    REDIS_POOL_CONNECTIONS.labels("in_use").set_function(lambda: len(pool._in_use_connections))
+    REDIS_POOL_CONNECTIONS.labels("idle").set_function(
+        lambda: sum(1 for connection in pool._available_connections if connection is not None)
+    )
+    REDIS_POOL_CONNECTIONS.labels("max").set_function(lambda: pool.max_connections)
+
+
+class StatsCollector:
+    """
+    Exports a dict of running totals kept by a service (e.g. ProfileCacheService.counters) as one
+    counter labelled by key, read at scrape time. Register with prometheus_client.REGISTRY.register().
+    """
+
+    def __init__(self, name: str, documentation: str, stats, label: str = "event"):
+        self.name = name
+        self.documentation = documentation
+        self.stats = stats
+        self.label = label
+
+    def collect(self):
+        family = CounterMetricFamily(self.name, self.documentation, labels=[self.label])
+        for key, value in self.stats().items():
+            family.add_metric([key], value)
+        yield family
+
+
+def metrics_middleware(router):
+    """
+    blacksheep middleware timing every request by its route pattern (e.g. /api/jobs/video/{job_id}),
+    not the raw path, so the label set stays bounded. The router is matched again here because
+    blacksheep doesn't expose the matched route to middlewares; unmatched paths get the fallback's "*".
+    """
+    # labelled children by (method, route, status), labels() takes a lock on every call
+    children = {}
+
+    async def middleware(request, handler):
+        match = router.get_match(request)
+        route = match.pattern if match and match.pattern else "other"
+        if isinstance(route, bytes):
+            route = route.decode()
+        status = 500
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            response = await handler(request)
+            status = response.status if response is not None else 204
+            return response
+        except HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            elapsed = time.perf_counter() - start
+            child = children.get((request.method, route, status))
+            if child is None:
+                child = children[(request.method, route, status)] = HTTP_REQUEST_SECONDS.labels(request.method, route, str(status))
+            child.observe(elapsed)
+    return middleware
+
+
+def render_metrics() -> tuple[bytes, bytes]:
+    """Content type and body of the Prometheus text exposition"""
+    return CONTENT_TYPE_LATEST.encode(), generate_latest()
@@ -0,0 +1,26 @@
+import redis.asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialWithJitterBackoff
+from utils.env import settings
+from utils.metrics import InstrumentedRedis, track_redis_pool
+
+
+def create_redis_client() -> redis.Redis:
+    """
+    Shared asyncio Redis client for the process.
+    BlockingConnectionPool makes callers wait for a free connection instead of erroring
+    when the pool is exhausted, which doubles as back-pressure under load.
+    Command latencies and pool usage are exported to /metrics (utils/metrics.py).
+    """
+    pool = redis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
+        retry=Retry(ExponentialWithJitterBackoff(base=0.05, cap=1.0), settings.REDIS_RETRIES),
+        decode_responses=False,
+    )
+    track_redis_pool(pool)
+    return InstrumentedRedis(connection_pool=pool)
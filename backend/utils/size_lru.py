@@ -0,0 +1,75 @@
+import time
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio as redis
+
+
+class SizeBoundedLRU:
+    """
+    Redis bookkeeping for a cache bounded by total size: a zset of key -> last access time, a hash
+    of key -> stored bytes and a running total. Entries unused for ttl seconds, then the least
+    recently used ones above max_bytes, are evicted. The caller stores the values themselves and
+    cleans them up through the on_remove hooks.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        prefix: str,
+        max_bytes: int,
+        ttl: int,
+        on_remove: Optional[Callable] = None,
+        after_remove: Optional[Callable[[list[str], list[int]], Awaitable[None]]] = None,
+    ):
+        self.redis_client = redis_client
+        self.lru_key = f"{prefix}lru"  # zset key -> last access time
+        self.sizes_key = f"{prefix}sizes"  # hash key -> stored bytes
+        self.total_bytes_key = f"{prefix}bytes"
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.on_remove = on_remove  # on_remove(pipe, keys), queued in the removal MULTI
+        self.after_remove = after_remove  # await after_remove(keys, sizes), once the index no longer has them
+
+    def is_fresh(self, last_access: Optional[float]) -> bool:
+        return last_access is not None and time.time() - last_access < self.ttl
+
+    def touch(self, pipe, key: str):
+        """Queue marking an existing entry as just used"""
+        pipe.zadd(self.lru_key, {key: time.time()}, xx=True)
+
+    async def add(self, key: str, size: int, on_add: Optional[Callable] = None):
+        """Index an entry of size bytes (on_add(pipe) queues the caller's writes in the same MULTI), then evict"""
+        # two writers can race on the same key, only count the size difference
+        previous_size = int(await self.redis_client.hget(self.sizes_key, key) or 0)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            if on_add:
+                on_add(pipe)
+            pipe.zadd(self.lru_key, {key: time.time()})
+            pipe.hset(self.sizes_key, key, size)
+            pipe.incrby(self.total_bytes_key, size - previous_size)
+            await pipe.execute()
+        await self.evict()
+
+    async def remove(self, keys: list[str]):
+        sizes = [int(size or 0) for size in await self.redis_client.hmget(self.sizes_key, keys)]
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            if self.on_remove:
+                self.on_remove(pipe, keys)
+            pipe.zrem(self.lru_key, *keys)
+            pipe.hdel(self.sizes_key, *keys)
+            pipe.decrby(self.total_bytes_key, sum(sizes))
+            await pipe.execute()
+        if self.after_remove:
+            await self.after_remove(keys, sizes)
+
+    async def evict(self):
+        """Drop expired entries, then least recently used ones until the cache fits its budget"""
+        expired = await self.redis_client.zrangebyscore(self.lru_key, "-inf", time.time() - self.ttl)
+        if expired:
+            await self.remove([key.decode() for key in expired])
+
+        while int(await self.redis_client.get(self.total_bytes_key) or 0) > self.max_bytes:
+            oldest = await self.redis_client.zpopmin(self.lru_key, 1)
+            if not oldest:
+                break
+            await self.remove([key.decode() for key, _ in oldest])
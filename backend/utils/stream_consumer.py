@@ -0,0 +1,129 @@
+import socket
+import uuid
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio as redis
+from postgrest.exceptions import APIError
+
+RECLAIM_IDLE_MS = 60_000  # entries a crashed instance read but never handled
+
+
+def is_rejected(error: Exception) -> bool:
+    """Postgres answered and refused the rows (bad data), as opposed to the call not getting through"""
+    return isinstance(error, APIError)
+
+
+class StreamConsumer:
+    """
+    One consumer of a Redis stream consumer group, read in batches.
+    Each batch holds this consumer's failed entries whose retry delay has passed, entries abandoned
+    by crashed instances, then new entries, so a failing entry never holds back the ones behind it.
+    Entries that keep failing go to a dead-letter stream once they were delivered max_attempts times.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        stream: str,
+        group: str,
+        dead_letter_stream: str,
+        batch_size: int,
+        max_attempts: int,
+        retry_idle_ms: int,
+        max_len: int = 100_000,
+    ):
+        self.redis_client = redis_client
+        self.stream = stream
+        self.group = group
+        self.dead_letter_stream = dead_letter_stream
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_idle_ms = retry_idle_ms
+        self.max_len = max_len
+        self.name = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+    async def ensure_group(self):
+        try:
+            await self.redis_client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read_batch(self) -> list:
+        entries = []
+        # our own failed entries, once they waited retry_idle_ms (claiming counts a delivery)
+        due = await self.redis_client.xpending_range(
+            self.stream, self.group, "-", "+", self.batch_size, consumername=self.name, idle=self.retry_idle_ms,
+        )
+        if due:
+            claimed = await self.redis_client.xclaim(
+                self.stream, self.group, self.name, self.retry_idle_ms, [item["message_id"] for item in due],
+            )
+            entries += [entry for entry in claimed if entry[1]]
+        if len(entries) < self.batch_size:
+            _, claimed, *_ = await self.redis_client.xautoclaim(
+                self.stream, self.group, self.name, RECLAIM_IDLE_MS, start_id="0-0", count=self.batch_size - len(entries),
+            )
+            seen = {entry_id for entry_id, _ in entries}
+            entries += [entry for entry in claimed if entry[1] and entry[0] not in seen]
+        if len(entries) < self.batch_size:
+            response = await self.redis_client.xreadgroup(
+                self.group, self.name, {self.stream: ">"}, count=self.batch_size - len(entries),
+            )
+            entries += [entry for _, stream_entries in response for entry in stream_entries]
+        return entries
+
+    def ack(self, pipe, entry_ids: list):
+        """Queue the ack (and removal) of handled entries on a MULTI pipeline"""
+        pipe.xack(self.stream, self.group, *entry_ids)
+        pipe.xdel(self.stream, *entry_ids)
+
+    async def apply_split(
+        self,
+        entries: list,
+        error: Exception,
+        apply: Callable[[list], Awaitable[None]],
+        on_dead_letter: Optional[Callable] = None,
+    ) -> int:
+        """
+        Handles a batch that apply() rejected with error by applying its halves separately, recursively,
+        so bad entries are isolated in about 2*log2(n) calls; apply must ack the entries it was given.
+        A rejected single entry stays pending for a retry, or goes to the dead-letter stream (with
+        on_dead_letter(pipe, fields) queued in the same MULTI) once its attempts are used up.
+        Errors other than a rejection (Postgres unreachable) are raised. Returns how many were handled.
+        """
+        if len(entries) == 1:
+            return await self._reject(entries[0], error, on_dead_letter)
+        handled = 0
+        for half in (entries[:len(entries) // 2], entries[len(entries) // 2:]):
+            try:
+                await apply(half)
+                handled += len(half)
+            except Exception as e:
+                if not is_rejected(e):
+                    raise
+                handled += await self.apply_split(half, e, apply, on_dead_letter)
+        return handled
+
+    async def _reject(self, entry: tuple, error: Exception, on_dead_letter: Optional[Callable]) -> int:
+        """Leaves a rejected entry pending for a retry (returns 0) or dead-letters it (returns 1)"""
+        entry_id, fields = entry
+        pending = await self.redis_client.xpending_range(
+            self.stream, self.group, entry_id, entry_id, 1, consumername=self.name,
+        )
+        attempts = pending[0]["times_delivered"] if pending else 1
+        if attempts < self.max_attempts:
+            print(f"{self.stream} entry {entry_id.decode()} rejected (attempt {attempts}), retrying later: {error}")
+            return 0
+        print(f"{self.stream} entry {entry_id.decode()} rejected {attempts} times, dead-lettering it: {error}")
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.xadd(
+                self.dead_letter_stream,
+                {**fields, "entry_id": entry_id, "attempts": attempts, "error": str(error)[:1000]},
+                maxlen=self.max_len, approximate=True,
+            )
+            if on_dead_letter:
+                on_dead_letter(pipe, fields)
+            self.ack(pipe, [entry_id])
+            await pipe.execute()
+        return 1
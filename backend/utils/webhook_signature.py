@@ -0,0 +1,36 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+
+def verify_webhook_signature(
+    secret: str,
+    message_id: Optional[str],
+    timestamp: Optional[str],
+    signature_header: Optional[str],
+    body: bytes,
+    tolerance: int = 300,
+) -> bool:
+    """
+    Check a Svix-style webhook signature (what Autumn sends): svix-signature holds space separated
+    "v1,<base64 HMAC-SHA256>" entries over "{svix-id}.{svix-timestamp}.{body}", keyed with the
+    base64 part of the whsec_ secret. Deliveries older or newer than tolerance seconds are rejected.
+    """
+    if not message_id or not timestamp or not signature_header:
+        return False
+    try:
+        if abs(time.time() - int(timestamp)) > tolerance:
+            return False
+        key = base64.b64decode(secret.removeprefix("whsec_"))
+    except ValueError:
+        return False
+
+    signed = f"{message_id}.{timestamp}.".encode() + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+    for entry in signature_header.split():
+        version, _, signature = entry.partition(",")
+        if version == "v1" and hmac.compare_digest(signature, expected):
+            return True
+    return False
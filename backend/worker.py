@@ -0,0 +1,55 @@
+import asyncio
+import signal
+
+from services.vertex_service import VertexService
+from services.storage_service import StorageService
+from services.job_service import JobService
+from services.job_events_service import JobEventsService
+from services.job_queue import JobQueue
+from services.frame_cache_service import FrameCacheService
+from services.job_worker import JobWorker
+from services.supabase_service import SupabaseService
+from services.credit_service import CreditService
+from services.profile_cache_service import ProfileCacheService
+from services.operation_poller import OperationPoller
+from utils.redis_pool import create_redis_client
+from utils.env import settings
+from prometheus_client import start_http_server
+
+
+async def main():
+    """Standalone video job worker, scales separately from the API (run with JOB_WORKER_EMBEDDED=false there)"""
+    redis_client = create_redis_client()
+    vertex_service = VertexService()
+    job_queue = JobQueue(redis_client)
+    storage_service = StorageService()
+    frame_cache_service = FrameCacheService(redis_client, storage_service)
+    # only refunds failed jobs here, the ledger is flushed to Postgres by the API's CreditReconciler
+    supabase_service = SupabaseService()
+    credit_service = CreditService(redis_client, supabase_service, ProfileCacheService(redis_client, supabase_service))
+    job_service = JobService(vertex_service, redis_client, JobEventsService(redis_client), job_queue, frame_cache_service, storage_service, credit_service)
+    job_worker = JobWorker(job_service, job_queue, settings.JOB_WORKER_CONCURRENCY)
+    operation_poller = OperationPoller(job_service, redis_client)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    if settings.WORKER_METRICS_PORT:
+        # the worker has no HTTP app, serve /metrics from prometheus_client's own thread
+        start_http_server(settings.WORKER_METRICS_PORT)
+    await job_worker.start()
+    await operation_poller.start()
+    print(f"Job worker {job_worker.consumer} started (concurrency {settings.JOB_WORKER_CONCURRENCY})")
+
+    await stop.wait()
+    print("Shutting down job worker, waiting for running jobs")
+    await job_worker.stop()
+    await operation_poller.stop()
+    job_service.image_normalizer.shutdown()
+    await redis_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,19 +3,76 @@ import Navbar from "../components/landing/Navbar";
 import Footer from "../components/landing/Footer";
 import { Zap, ArrowRight, Receipt, ChevronDown } from "lucide-react";
 import { useNavigate } from "react-router-dom";
-import { useState, useEffect } from "react";
+import { useState, useEffect, useCallback } from "react";
 import { useAuth } from "../contexts/AuthContext";
 
 const backend_url = import.meta.env.VITE_BACKEND_URL || "http://localhost:8000";
 
+type Transaction = {
+  transaction_log_id: number | string;
+  created_at: string;
+  transaction_type: string;
+  credit_usage: number;
+};
+
+// per transaction type totals, e.g. { video_gen: { credits: 120, count: 12 } }
+type TransactionSummary = Record<string, { credits: number; count: number }>;
+
+type TransactionPage = {
+  transactions: Transaction[];
+  next_cursor: string | null;
+  summary: TransactionSummary | null;
+};
+
 function Dashboard() {
   const navigate = useNavigate();
   const { session } = useAuth();
 
-  const [transactions, setTransactions] = useState([]);
+  const [transactions, setTransactions] = useState<Transaction[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [summary, setSummary] = useState<TransactionSummary | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [credits, setCredits] = useState<number | null>(null);
-  const [displayLimit, setDisplayLimit] = useState<number | "all">(20);
+  const [pageSize, setPageSize] = useState<number>(20);
+
+  // the log is keyset paginated, each page is fetched with the next_cursor of the previous one
+  const fetchTransactions = useCallback(
+    async (cursor: string | null): Promise<TransactionPage | null> => {
+      const token = session?.access_token;
+      if (!token) return null;
+      const params = new URLSearchParams({ limit: String(pageSize) });
+      if (cursor) params.set("cursor", cursor);
+      const res = await fetch(
+        `${backend_url}/api/supabase/transactions?${params}`,
+        {
+          method: "GET",
+          headers: {
+            "Content-Type": "application/json",
+            Authorization: `Bearer ${token}`,
+          },
+        },
+      );
+      return res.ok ? await res.json() : null;
+    },
+    [session, pageSize],
+  );
+
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchTransactions(nextCursor);
+      if (page) {
+        setTransactions((previous) => [...previous, ...page.transactions]);
+        setNextCursor(page.next_cursor);
+      }
+    } catch (err) {
+      console.error("Error fetching transactions:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   useEffect(() => {
     const fetchData = async () => {
@@ -39,22 +96,12 @@ function Dashboard() {
           }
         }
 
-        // Fetch transaction log
-        const transactionRes = await fetch(
-          `${backend_url}/api/supabase/transactions`,
-          {
-            method: "GET",
-            headers: {
-              "Content-Type": "application/json",
-              Authorization: `Bearer ${token}`,
-            },
-          },
-        );
-
-        if (transactionRes.ok) {
-          const transactionData = await transactionRes.json();
-          // [{created_at, credit_usage, transaction_log_id, transaction_type, user_id}, ...]
-          setTransactions(transactionData || []);
+        // Fetch the first page of the transaction log (+ per type totals)
+        const page = await fetchTransactions(null);
+        if (page) {
+          setTransactions(page.transactions);
+          setNextCursor(page.next_cursor);
+          setSummary(page.summary);
         }
       } catch (err) {
         console.error("Error fetching dashboard data:", err);
@@ -64,7 +111,7 @@ function Dashboard() {
     };
 
     fetchData();
-  }, [session]);
+  }, [session, fetchTransactions]);
 
   return (
     <Theme>
@@ -113,6 +160,28 @@ function Dashboard() {
                       ? `${credits} credits remaining`
                       : "Loading credits..."}
                   </p>
+                  {summary && (
+                    <div className="grid grid-cols-3 gap-4 mb-6 text-sm text-gray-600">
+                      <div>
+                        <div className="font-semibold text-gray-900">
+                          {summary.video_gen?.credits ?? 0}
+                        </div>
+                        spent on videos ({summary.video_gen?.count ?? 0})
+                      </div>
+                      <div>
+                        <div className="font-semibold text-gray-900">
+                          {summary.image_gen?.credits ?? 0}
+                        </div>
+                        spent on images ({summary.image_gen?.count ?? 0})
+                      </div>
+                      <div>
+                        <div className="font-semibold text-gray-900">
+                          {Math.abs(summary.credit_purchase?.credits ?? 0)}
+                        </div>
+                        purchased ({summary.credit_purchase?.count ?? 0})
+                      </div>
+                    </div>
+                  )}
 
                   <button
                     onClick={() => navigate("/pricing")}
@@ -144,27 +213,22 @@ function Dashboard() {
                           color="gray"
                           className="cursor-pointer"
                         >
-                          {displayLimit === "all"
-                            ? "All"
-                            : `Last ${displayLimit}`}
+                          {`${pageSize} per page`}
                           <ChevronDown className="w-4 h-4 ml-1" />
                         </Button>
                       </DropdownMenu.Trigger>
                       <DropdownMenu.Content>
-                        <DropdownMenu.Item onSelect={() => setDisplayLimit(10)}>
-                          Last 10
+                        <DropdownMenu.Item onSelect={() => setPageSize(10)}>
+                          10 per page
                         </DropdownMenu.Item>
-                        <DropdownMenu.Item onSelect={() => setDisplayLimit(20)}>
-                          Last 20
+                        <DropdownMenu.Item onSelect={() => setPageSize(20)}>
+                          20 per page
                         </DropdownMenu.Item>
-                        <DropdownMenu.Item onSelect={() => setDisplayLimit(50)}>
-                          Last 50
+                        <DropdownMenu.Item onSelect={() => setPageSize(50)}>
+                          50 per page
                         </DropdownMenu.Item>
-                        <DropdownMenu.Separator />
-                        <DropdownMenu.Item
-                          onSelect={() => setDisplayLimit("all")}
-                        >
-                          All
+                        <DropdownMenu.Item onSelect={() => setPageSize(100)}>
+                          100 per page
                         </DropdownMenu.Item>
                       </DropdownMenu.Content>
                     </DropdownMenu.Root>
@@ -199,12 +263,9 @@ function Dashboard() {
                         </tr>
                       </thead>
                       <tbody>
-                        {(displayLimit === "all"
-                          ? transactions
-                          : transactions.slice(0, displayLimit)
-                        ).map((transaction, index) => (
+                        {transactions.map((transaction) => (
                           <tr
-                            key={index}
+                            key={transaction.transaction_log_id}
                             className="border-b border-gray-100 hover:bg-gray-50/50 transition-colors"
                           >
                             <td className="py-3 px-4 text-gray-600">
@@ -245,12 +306,22 @@ function Dashboard() {
                   </div>
                 )}
                 {transactions.length > 0 && (
-                  <div className="mt-4 text-sm text-gray-500 text-center">
-                    Showing{" "}
-                    {displayLimit === "all"
-                      ? transactions.length
-                      : Math.min(displayLimit, transactions.length)}{" "}
-                    of {transactions.length} transactions
+                  <div className="mt-4 text-sm text-gray-500 text-center flex flex-col items-center gap-3">
+                    <span>
+                      Showing {transactions.length} transactions
+                      {nextCursor ? "" : " (all)"}
+                    </span>
+                    {nextCursor && (
+                      <Button
+                        variant="soft"
+                        color="gray"
+                        className="cursor-pointer"
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                      >
+                        {loadingMore ? "Loading..." : "Load more"}
+                      </Button>
+                    )}
                   </div>
                 )}
               </div>